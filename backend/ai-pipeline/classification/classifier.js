@@ -2,6 +2,8 @@
  * Clasificador de Documentos usando IA
  */
 
+const { spawn } = require('child_process');
+const path = require('path');
 const OpenAIClient = require('../ai/openai-client');
 const config = require('../config');
 const logger = require('../utils/logger');
@@ -23,6 +25,35 @@ class DocumentClassifier {
         ...metadata,
       });
 
+      // Los tipos obvios (ALTA, HOI, tax bill...) se resuelven localmente sin llamar a la IA
+      if (config.ENABLE_LOCAL_CLASSIFIER) {
+        const local = await this.classifyLocally(text).catch((error) => {
+          logger.warn('Local classification failed, falling back to AI', { error: error.message });
+          return null;
+        });
+
+        if (local && local.accepted) {
+          const duration = Date.now() - startTime;
+
+          logger.info('Classification completed locally', {
+            documentType: local.document_type,
+            confidence: local.confidence,
+            duration,
+          });
+
+          return {
+            document_type: local.document_type,
+            confidence: local.confidence,
+            reasoning: local.reasoning,
+            metadata: {
+              classifier: 'local',
+              scores: local.scores,
+              classification_duration_ms: duration,
+            },
+          };
+        }
+      }
+
       // Clasificar usando IA
       const result = await this.aiClient.classify(text);
       
@@ -70,6 +101,57 @@ class DocumentClassifier {
     }
   }
 
+  /**
+   * Clasificar con el clasificador local por palabras clave (document_classifier.py)
+   */
+  classifyLocally(text) {
+    const scriptPath = path.join(__dirname, '..', '..', '..', 'document_classifier.py');
+    const args = [scriptPath, '--threshold', String(config.LOCAL_CLASSIFICATION_THRESHOLD)];
+
+    return new Promise((resolve, reject) => {
+      const pythonProcess = spawn('python', args, {
+        env: { ...process.env, PYTHONIOENCODING: 'utf-8' }
+      });
+
+      let output = '';
+      let errorOutput = '';
+      const timeoutId = setTimeout(() => {
+        pythonProcess.kill('SIGTERM');
+        reject(new Error(`Local classifier timeout after ${config.LOCAL_CLASSIFIER_TIMEOUT}ms`));
+      }, config.LOCAL_CLASSIFIER_TIMEOUT);
+
+      pythonProcess.stdout.setEncoding('utf8');
+      pythonProcess.stdout.on('data', (data) => {
+        output += data;
+      });
+
+      pythonProcess.stderr.setEncoding('utf8');
+      pythonProcess.stderr.on('data', (data) => {
+        errorOutput += data;
+      });
+
+      pythonProcess.on('close', (code) => {
+        clearTimeout(timeoutId);
+        if (code !== 0) {
+          reject(new Error(`Local classifier exited with code ${code}: ${errorOutput}`));
+          return;
+        }
+        try {
+          resolve(JSON.parse(output));
+        } catch (error) {
+          reject(new Error(`Invalid local classifier output: ${error.message}`));
+        }
+      });
+
+      pythonProcess.on('error', (err) => {
+        clearTimeout(timeoutId);
+        reject(new Error(`Failed to start local classifier: ${err.message}`));
+      });
+
+      pythonProcess.stdin.end(text, 'utf8');
+    });
+  }
+
   /**
    * Clasificar múltiples documentos en batch
    */
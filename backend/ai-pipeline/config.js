@@ -33,6 +33,11 @@ module.exports = {
   MIN_CLASSIFICATION_CONFIDENCE: 0.7,
   MIN_EXTRACTION_CONFIDENCE: 0.6,
   
+  // Clasificador local (document_classifier.py): por encima del umbral no se llama a la IA
+  ENABLE_LOCAL_CLASSIFIER: process.env.ENABLE_LOCAL_CLASSIFIER !== 'false',
+  LOCAL_CLASSIFICATION_THRESHOLD: parseFloat(process.env.LOCAL_CLASSIFICATION_THRESHOLD || '0.85'),
+  LOCAL_CLASSIFIER_TIMEOUT: 10000, // 10 segundos
+  
   // Tipos de documentos soportados
   DOCUMENT_TYPES: {
     CLOSING_ALTA: 'closing_alta',
@@ -27,6 +27,12 @@ const pdfCache = new Map();
 // Timeout para el proceso de Python (30 segundos)
 const PYTHON_TIMEOUT = 30000;
 
+// Margen entre el plazo que se le da al extractor y el kill: así entrega lo resuelto antes de morir
+const PYTHON_DEADLINE_MARGIN = 5000;
+
+// Grupos del resultado en el orden en que los resuelve el extractor (GROUP_PRIORITY en Python)
+const RESULT_GROUPS = ['loan', 'property', 'financial', 'taxes', 'insurance', 'lease', 'lender', 'borrower'];
+
 /**
  * Calcula hash MD5 del contenido del PDF para cache
  */
@@ -35,24 +41,82 @@ function calculateHash(buffer) {
 }
 
 /**
- * Ejecuta el script de Python con timeout y manejo de errores robusto
+ * Junta los grupos recibidos en el JSON de siempre; si falta algo, _partial
+ * dice qué campos no se evaluaron y qué grupos no llegaron. Si otro PDF ya
+ * procesado tiene el mismo texto o uno parecido, _near_duplicate dice cuál
+ * y qué campos cambian respecto a su extracción
  */
-function executePythonScript(pdfText, scriptPath, timeout = PYTHON_TIMEOUT) {
+function assembleResult(groups, done, unresolvedFields, timedOut) {
+  const result = { ...groups };
+  if (done && done.near_duplicate) {
+    result._near_duplicate = done.near_duplicate;
+  }
+  if (!done || !done.complete) {
+    result._partial = {
+      complete: false,
+      timed_out: timedOut,
+      unresolved_fields: done ? done.unresolved_fields : unresolvedFields,
+      missing_groups: RESULT_GROUPS.filter(group => !(group in groups))
+    };
+  }
+  return result;
+}
+
+/**
+ * Ejecuta el script de Python con plazo y timeout.
+ *
+ * El script recibe --deadline-ms (timeout menos el margen) y escribe una
+ * línea JSON por grupo a medida que lo resuelve; si aun así se agota el
+ * timeout, se mata el proceso y se devuelve lo recibido hasta entonces.
+ * Con --fingerprints busca el PDF en el índice de huellas de cacheDir
+ * (document_fingerprints.py): si otro PDF ya procesado tiene el mismo texto
+ * devuelve su extracción; si es casi igual se extrae entero y se compara.
+ */
+function executePythonScript(pdfText, scriptPath, pdfHash, timeout = PYTHON_TIMEOUT) {
   return new Promise((resolve, reject) => {
-    const pythonProcess = spawn('python', [scriptPath], {
+    // --format compact: JSON Lines sin _debug (menos bytes por el pipe)
+    const deadline = Math.max(timeout - PYTHON_DEADLINE_MARGIN, Math.floor(timeout / 2));
+    const args = [scriptPath, '--format', 'compact', '--deadline-ms', String(deadline), '--fingerprints', cacheDir, '--key', pdfHash];
+    const pythonProcess = spawn('python', args, {
       env: { ...process.env, PYTHONIOENCODING: 'utf-8' }
     });
 
-    let extractedData = '';
+    const groups = {};
+    const unresolvedFields = [];
+    let done = null;
+    let pending = '';
     let errorData = '';
     let timeoutId;
     let killed = false;
 
-    // Configurar timeout
+    // Cada línea completa es un grupo resuelto (o el registro final "done");
+    // una línea inválida se anota sin perder las demás del mismo bloque
+    const consumeLine = (line) => {
+      if (!line.trim()) return;
+      let record;
+      try {
+        record = JSON.parse(line);
+      } catch (err) {
+        errorData += `Invalid output line: ${err.message}\n`;
+        return;
+      }
+      if (record.done) {
+        done = record;
+        return;
+      }
+      groups[record.group] = record.data;
+      unresolvedFields.push(...record.unresolved);
+    };
+
+    // Configurar timeout: se devuelve lo ya resuelto en lugar de descartarlo
     timeoutId = setTimeout(() => {
       killed = true;
       pythonProcess.kill('SIGTERM');
-      reject(new Error(`Python process timeout after ${timeout}ms`));
+      if (Object.keys(groups).length === 0) {
+        reject(new Error(`Python process timeout after ${timeout}ms`));
+        return;
+      }
+      resolve(assembleResult(groups, done, unresolvedFields, true));
     }, timeout);
 
     // Escribir datos al proceso Python con codificación UTF-8
@@ -65,10 +129,12 @@ function executePythonScript(pdfText, scriptPath, timeout = PYTHON_TIMEOUT) {
       return;
     }
 
-    // Capturar stdout con codificación UTF-8
+    // Capturar stdout con codificación UTF-8, línea a línea
     pythonProcess.stdout.setEncoding('utf8');
     pythonProcess.stdout.on('data', (data) => {
-      extractedData += data;
+      const lines = (pending + data).split('\n');
+      pending = lines.pop();
+      lines.forEach(consumeLine);
     });
 
     // Capturar stderr
@@ -80,17 +146,18 @@ function executePythonScript(pdfText, scriptPath, timeout = PYTHON_TIMEOUT) {
     // Manejar cierre del proceso
     pythonProcess.on('close', (code) => {
       clearTimeout(timeoutId);
+      consumeLine(pending);
 
       if (killed) {
-        return; // Ya se rechazó por timeout
+        return; // Ya se resolvió (o rechazó) por timeout
       }
 
-      if (code !== 0) {
+      if (code !== 0 || !done) {
         reject(new Error(`Python script exited with code ${code}: ${errorData}`));
         return;
       }
 
-      resolve(extractedData);
+      resolve(assembleResult(groups, done, unresolvedFields, false));
     });
 
     // Manejar errores del proceso
@@ -141,8 +208,9 @@ router.post('/extract-from-pdf', upload.single('file'), async (req, res) => {
     const pdfData = await pdf(dataBuffer);
     console.log(`📝 Extracted ${pdfData.text.length} characters`);
 
-    // Usar el script mejorado de Python
-    const pythonScriptPath = path.join(__dirname, '..', '..', 'extract_property_data_improved.py');
+
+    // Punto de entrada único: detecta cierre o formulario y responde siempre con el esquema closing
+    const pythonScriptPath = path.join(__dirname, '..', '..', 'extract_property_data_unified.py');
     
     // Verificar que el script existe
     if (!fs.existsSync(pythonScriptPath)) {
@@ -150,21 +218,25 @@ router.post('/extract-from-pdf', upload.single('file'), async (req, res) => {
     }
 
     console.log('🐍 Running Python extraction script...');
-    const extractedData = await executePythonScript(pdfData.text, pythonScriptPath);
+    const jsonData = await executePythonScript(pdfData.text, pythonScriptPath, pdfHash);
 
-    // Parsear JSON
-    const jsonData = JSON.parse(extractedData);
-    
-    console.log('✅ PDF data extracted successfully');
-    console.log('\n' + '═'.repeat(80));
-    console.log('📋 DATOS EXTRAÍDOS DEL PDF (JSON FORMATEADO):');
-    console.log('═'.repeat(80));
-    console.log(JSON.stringify(jsonData, null, 2));
-    console.log('═'.repeat(80) + '\n');
-
-    // Guardar en cache
-    pdfCache.set(pdfHash, jsonData);
-    console.log(`💾 Result cached (cache size: ${pdfCache.size})`);
+    if (jsonData._near_duplicate) {
+      const nearDuplicate = jsonData._near_duplicate;
+      console.log(nearDuplicate.identical
+        ? `🔁 Same text as PDF ${nearDuplicate.key}, reused its result`
+        : `🔁 Near duplicate of ${nearDuplicate.key} (similarity ${nearDuplicate.similarity}): ${nearDuplicate.changed_fields ? Object.keys(nearDuplicate.changed_fields).length : 'unknown'} fields changed`);
+    }
+
+    if (jsonData._partial) {
+      // Resultado parcial por plazo: se devuelve, pero no se cachea para reintentarlo completo
+      console.log(`⚠️ Partial extraction: unresolved ${jsonData._partial.unresolved_fields.join(', ') || 'none'}, missing groups ${jsonData._partial.missing_groups.join(', ') || 'none'}`);
+    } else {
+      console.log('✅ PDF data extracted successfully');
+
+      // Guardar en cache
+      pdfCache.set(pdfHash, jsonData);
+      console.log(`💾 Result cached (cache size: ${pdfCache.size})`);
+    }
 
     // Guardar en archivo para debugging
     const outputPath = path.join(cacheDir, `${pdfHash}.json`);
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de los extractores sobre el corpus real de documentos procesados
+Mide docs/seg, latencia p50/p99, latencia por campo y memoria pico de cada
+variante, y compara contra un baseline guardado para detectar regresiones
+"""
+
+import os
+import sys
+import math
+import json
+import glob
+import time
+import argparse
+import importlib
+import resource
+import tracemalloc
+import multiprocessing
+from queue import Empty
+from typing import Optional, Dict, Any, List, Tuple
+
+# Variantes del extractor (nombre corto -> módulo)
+VARIANTS = {
+    'base': 'extract_property_data',
+    'improved': 'extract_property_data_improved',
+    'old': 'extract_property_data_old',
+    'unified': 'extract_property_data_unified',
+}
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Documents', '*', 'processed', 'doc_*.json')
+DEFAULT_SIZES = '256k,1m,4m'
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+# Espera máxima por el resultado de cada variante en su proceso (los paquetes de 4 MB tardan minutos)
+DEFAULT_TIMEOUT_S = 1800
+
+# Lambda para tamaños tipo "256k" / "4m"
+parse_size = lambda val: int(float(val[:-1]) * {'k': 1024, 'm': 1024 ** 2}[val[-1].lower()]) if val[-1].lower() in 'km' else int(val)
+
+# Lambda para percentiles (rango más cercano)
+percentile = lambda values, pct: sorted(values)[max(0, math.ceil(pct / 100 * len(values)) - 1)] if values else None
+
+def load_corpus(pattern: str = DEFAULT_CORPUS) -> List[Tuple[str, str]]:
+    """Textos del corpus: raw_text de cada documento y sus páginas unidas por salto de línea"""
+    corpus = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, encoding='utf-8') as f:
+            doc = json.load(f)
+        name = os.path.basename(path)
+        if doc.get('raw_text'):
+            corpus.append((f"{name}:raw_text", doc['raw_text']))
+        if doc.get('pages'):
+            corpus.append((f"{name}:pages", '\n'.join(page.get('text', '') for page in doc['pages'])))
+    return corpus
+
+def scale_corpus(corpus: List[Tuple[str, str]], sizes: List[int]) -> List[Tuple[str, str]]:
+    """Paquetes sintéticos del tamaño pedido concatenando el corpus (simula closing packages grandes)"""
+    joined = '\n\f\n'.join(text for _, text in corpus)
+    if not joined:
+        return []
+    return [(f"synthetic:{size}", (joined * (size // len(joined) + 1))[:size]) for size in sizes]
+
+def field_latencies(module, texts: List[str]) -> Optional[Dict[str, float]]:
+    """Tiempo medio (ms) de cada patrón por separado, si la variante expone sus patrones compilados"""
+    patterns = getattr(module, 'COMPILED_PATTERNS', None)
+    normalize = getattr(module, 'normalize_text', lambda text: text)
+    if not patterns:
+        return None
+    normalized = [normalize(text) for text in texts]
+    timings = {}
+    for key, pattern in patterns.items():
+        started = time.perf_counter()
+        for text in normalized:
+            pattern.search(text)
+        timings[key] = round((time.perf_counter() - started) * 1000 / len(normalized), 4)
+    return timings
+
+def run_variant(variant: str, corpus_pattern: str, sizes: List[int], repeat: int) -> Dict[str, Any]:
+    """Ejecuta una variante sobre el corpus (y sus versiones escaladas) y devuelve sus métricas"""
+    module = importlib.import_module(VARIANTS[variant])
+    corpus = load_corpus(corpus_pattern)
+    documents = corpus + scale_corpus(corpus, sizes)
+
+    # Calentamiento: importación y compilación fuera de la medición
+    for _, text in corpus:
+        module.extract_data(text)
+
+    latencies: Dict[str, List[float]] = {}
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for name, text in documents:
+            doc_started = time.perf_counter()
+            module.extract_data(text)
+            latencies.setdefault(name, []).append((time.perf_counter() - doc_started) * 1000)
+    total = time.perf_counter() - started
+
+    # Pico de memoria Python en una pasada aparte (tracemalloc distorsiona los tiempos)
+    tracemalloc.start()
+    for _, text in documents:
+        module.extract_data(text)
+    _, peak_alloc = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    all_latencies = [ms for values in latencies.values() for ms in values]
+    return {
+        "variant": variant,
+        "module": VARIANTS[variant],
+        "documents": len(documents),
+        "runs": len(all_latencies),
+        "total_s": round(total, 4),
+        "docs_per_sec": round(len(all_latencies) / total, 2) if total else None,
+        "p50_ms": round(percentile(all_latencies, 50), 3),
+        "p99_ms": round(percentile(all_latencies, 99), 3),
+        "by_document": {
+            name: {"chars": len(text), "p50_ms": round(percentile(latencies[name], 50), 3),
+                   "p99_ms": round(percentile(latencies[name], 99), 3)}
+            for name, text in documents
+        },
+        "field_ms": field_latencies(module, [text for _, text in documents]),
+        "peak_alloc_mb": round(peak_alloc / 1024 ** 2, 2),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2),
+    }
+
+def _run_variant_child(args, queue) -> None:
+    try:
+        queue.put(run_variant(*args))
+    except Exception as e:
+        queue.put({"variant": args[0], "error": f"{type(e).__name__}: {e}"})
+
+def run_isolated(variant: str, corpus_pattern: str, sizes: List[int], repeat: int,
+                 timeout: float = DEFAULT_TIMEOUT_S) -> Dict[str, Any]:
+    """
+    Ejecuta la variante en un proceso nuevo para que el RSS pico sea solo suyo.
+    Si falla, muere sin resultado o pasa de timeout segundos devuelve
+    {"variant", "error"} en lugar de quedarse esperando
+    """
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_run_variant_child, args=((variant, corpus_pattern, sizes, repeat), queue))
+    process.start()
+    deadline = time.monotonic() + timeout
+    result = None
+    while result is None:
+        try:
+            result = queue.get(timeout=1)
+        except Empty:
+            if not process.is_alive():
+                # Lo escrito justo antes de salir puede tardar un instante en llegar
+                try:
+                    result = queue.get(timeout=1)
+                except Empty:
+                    result = {"variant": variant, "error": f"Benchmark process exited with code {process.exitcode}"}
+            elif time.monotonic() >= deadline:
+                process.terminate()
+                result = {"variant": variant, "error": f"Benchmark timed out after {timeout}s"}
+    process.join()
+    return result
+
+def compare_to_baseline(results: List[Dict[str, Any]], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Regresiones: menos docs/seg o más p99 que el baseline por encima del umbral"""
+    regressions = []
+    previous = {entry['variant']: entry for entry in baseline.get('results', [])}
+    for result in results:
+        base = previous.get(result['variant'])
+        if not base:
+            continue
+        if base['docs_per_sec'] and result['docs_per_sec'] < base['docs_per_sec'] * (1 - threshold):
+            regressions.append(f"{result['variant']}: docs/sec {result['docs_per_sec']} < baseline {base['docs_per_sec']}")
+        if base['p99_ms'] and result['p99_ms'] > base['p99_ms'] * (1 + threshold):
+            regressions.append(f"{result['variant']}: p99 {result['p99_ms']}ms > baseline {base['p99_ms']}ms")
+    return regressions
+
+def print_report(results: List[Dict[str, Any]]) -> None:
+    """Resumen legible en stderr"""
+    for result in results:
+        print(f"{result['variant']:>9}  {result['docs_per_sec']:>9} docs/s  p50 {result['p50_ms']:>9}ms  "
+              f"p99 {result['p99_ms']:>9}ms  rss {result['peak_rss_mb']}MB  alloc {result['peak_alloc_mb']}MB",
+              file=sys.stderr)
+        if result['field_ms']:
+            slowest = sorted(result['field_ms'].items(), key=lambda item: item[1], reverse=True)[:3]
+            print('           slowest fields: ' + ', '.join(f"{key} {ms}ms" for key, ms in slowest), file=sys.stderr)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark de las variantes de extract_data')
+    parser.add_argument('--variants', default=','.join(VARIANTS), help='Variantes separadas por coma')
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS, help='Glob de documentos procesados (raw_text/pages)')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='Tamaños de los paquetes sintéticos (p.ej. 256k,1m,4m)')
+    parser.add_argument('--repeat', type=int, default=3, help='Repeticiones sobre todo el corpus')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Archivo de baseline para comparar/guardar')
+    parser.add_argument('--save-baseline', action='store_true', help='Guarda los resultados como nuevo baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Regresión tolerada (0.25 = 25%%)')
+    parser.add_argument('--output', metavar='FILE', help='Escribe el JSON completo en este archivo')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT_S,
+                        help='Segundos máximos por variante antes de darla por fallida')
+    args = parser.parse_args()
+
+    sizes = [parse_size(size) for size in args.sizes.split(',') if size]
+    variants = [variant for variant in args.variants.split(',') if variant]
+    unknown = [variant for variant in variants if variant not in VARIANTS]
+    if unknown:
+        parser.error(f"Unknown variants: {', '.join(unknown)}")
+
+    results = [run_isolated(variant, args.corpus, sizes, args.repeat, args.timeout) for variant in variants]
+    errors = [result for result in results if 'error' in result]
+    results = [result for result in results if 'error' not in result]
+    report = {"created_at": time.strftime('%Y-%m-%dT%H:%M:%S'), "sizes": sizes, "repeat": args.repeat, "results": results}
+    print_report(results)
+    for error in errors:
+        print(f"ERROR {error['variant']}: {error['error']}", file=sys.stderr)
+    if errors:
+        report["errors"] = errors
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        if errors:
+            print("Baseline not saved: some variants failed", file=sys.stderr)
+            sys.exit(1)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}", file=sys.stderr)
+        sys.exit(0)
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare_to_baseline(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        sys.exit(1 if regressions or errors else 0)
+    sys.exit(1 if errors else 0)
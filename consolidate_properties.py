@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Consolidación de datos por propiedad a partir de los documentos procesados
+Recorre Documents/<propiedad>/processed/*.json documento a documento y
+resuelve cada campo por tipo de documento y confianza, guardando de qué
+documento sale cada valor. Solo se mantiene en memoria una propiedad a la vez
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import functools
+import multiprocessing
+from typing import Optional, Dict, Any, Iterator, Tuple, List
+
+# Orden de preferencia por defecto entre los tipos de backend/ai-pipeline/config.js: el cierre manda
+DEFAULT_TYPE_PRIORITY = (
+    'closing_alta', 'mortgage_statement', 'first_payment_letter', 'escrow_disclosure',
+    'home_owner_insurance', 'tax_bill', 'lease_agreement', 'exhibit_a', 'unknown',
+)
+
+# Lambda para una regla de campo: alguna de las palabras completas del nombre (separadas por _)
+field_words = lambda words: re.compile(r'(?:^|_)(?:' + words + r')(?:_|$)')
+
+# Campos cuyo documento de referencia no es el cierre (primera regla que coincide)
+TYPE_PRIORITY_RULES = [
+    (field_words(r'escrow'), ('escrow_disclosure', 'first_payment_letter', 'closing_alta')),
+    (field_words(r'insurance|hoi|policy|coverage|premium|deductible'), ('home_owner_insurance', 'escrow_disclosure', 'closing_alta')),
+    (field_words(r'tax|taxes|assessed|parcel|millage'), ('tax_bill', 'escrow_disclosure', 'closing_alta')),
+    (field_words(r'lease|tenant|rent|rental|income|management'), ('lease_agreement',)),
+    (field_words(r'legal_description'), ('exhibit_a', 'closing_alta')),
+    (field_words(r'first_payment|monthly_payment|piti'), ('first_payment_letter', 'mortgage_statement', 'closing_alta')),
+    (field_words(r'servicing|balance|next_payment_date|statement_date'), ('mortgage_statement', 'first_payment_letter', 'closing_alta')),
+]
+
+DEFAULT_MIN_CONFIDENCE = 0.7
+MAX_CONFLICTS = 5
+
+# Lambda para comparar valores sin que importen mayúsculas ni espacios
+value_key = lambda value: re.sub(r'\s+', ' ', str(value)).strip().lower()
+
+def type_priority(field: str) -> Dict[str, int]:
+    """Rango de cada tipo de documento para un campo (0 = más fiable)"""
+    preferred = next((types for pattern, types in TYPE_PRIORITY_RULES if pattern.search(field)), ())
+    order = list(preferred) + [doc_type for doc_type in DEFAULT_TYPE_PRIORITY if doc_type not in preferred]
+    return {doc_type: rank for rank, doc_type in enumerate(order)}
+
+# Rangos precalculados por campo (el conjunto de campos del pipeline es pequeño y fijo)
+_priority_cache: Dict[str, Dict[str, int]] = {}
+
+def candidate_rank(field: str, candidate: Dict[str, Any], min_confidence: float) -> Tuple:
+    """Clave de orden de un candidato: supera el umbral, tipo de documento, confianza, fecha"""
+    priorities = _priority_cache.get(field)
+    if priorities is None:
+        priorities = _priority_cache.setdefault(field, type_priority(field))
+    return (
+        candidate['confidence'] >= min_confidence,
+        -priorities.get(candidate['document_type'], len(priorities)),
+        candidate['confidence'],
+        candidate['processed_at'] or '',
+    )
+
+def iter_properties(root: str) -> Iterator[Tuple[str, List[str]]]:
+    """Propiedades del almacén: (nombre del directorio, rutas de sus documentos procesados)"""
+    with os.scandir(root) as entries:
+        for entry in sorted(entries, key=lambda e: e.name):
+            processed_dir = os.path.join(entry.path, 'processed')
+            if entry.is_dir() and os.path.isdir(processed_dir):
+                yield entry.name, sorted(
+                    os.path.join(processed_dir, name)
+                    for name in os.listdir(processed_dir)
+                    if name.endswith('.json')
+                )
+
+def iter_candidates(doc: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Valores no vacíos de extracted_data de un documento, con su procedencia"""
+    provenance = {
+        "document_id": doc.get('document_id'),
+        "document_type": doc.get('document_type') or 'unknown',
+        "filename": (doc.get('source') or {}).get('filename'),
+        "processed_at": (doc.get('processing') or {}).get('completed_at'),
+    }
+    for field, entry in (doc.get('extracted_data') or {}).items():
+        # Algunos extractores guardan el valor directamente en vez de {value, confidence}
+        if not isinstance(entry, dict):
+            entry = {"value": entry, "confidence": doc.get('extraction_confidence') or 0}
+        value = entry.get('value')
+        if value is None or value == '':
+            continue
+        yield field, {
+            "value": value,
+            "confidence": float(entry.get('confidence') or 0),
+            "source_text": entry.get('source_text') or '',
+            **provenance,
+        }
+
+def consolidate_property(name: str, paths: List[str], min_confidence: float = DEFAULT_MIN_CONFIDENCE) -> Dict[str, Any]:
+    """
+    Consolida los documentos de una propiedad leyéndolos uno a uno.
+
+    Por campo solo se guarda el mejor candidato y los valores distintos que
+    lo contradicen, así que la memoria depende de los campos, no del número
+    ni del tamaño de los documentos. Cada valor distinto (según value_key)
+    se reporta tal como apareció la primera vez, con el documento de donde
+    salió.
+    """
+    best: Dict[str, Dict[str, Any]] = {}
+    seen: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    documents = []
+    address_votes: Dict[str, int] = {}
+    errors = []
+
+    for path in paths:
+        try:
+            with open(path, encoding='utf-8') as f:
+                doc = json.load(f)
+        except (OSError, ValueError) as e:
+            errors.append({"path": path, "error": f"{type(e).__name__}: {e}"})
+            continue
+
+        documents.append({
+            "document_id": doc.get('document_id'),
+            "document_type": doc.get('document_type') or 'unknown',
+            "filename": (doc.get('source') or {}).get('filename'),
+            "classification_confidence": doc.get('classification_confidence'),
+        })
+        address = (doc.get('metadata') or {}).get('property_address')
+        if address:
+            address_votes[address] = address_votes.get(address, 0) + 1
+
+        for field, candidate in iter_candidates(doc):
+            values = seen.setdefault(field, {})
+            key = value_key(candidate['value'])
+            if key in values:
+                values[key]['count'] += 1
+            else:
+                values[key] = {"value": candidate['value'], "document_id": candidate['document_id'], "count": 1}
+            current = best.get(field)
+            if current is None or candidate_rank(field, candidate, min_confidence) > candidate_rank(field, current, min_confidence):
+                best[field] = candidate
+
+    fields = {}
+    for field, candidate in best.items():
+        winner = value_key(candidate['value'])
+        conflicts = [
+            {"value": value["value"], "document_id": value["document_id"]}
+            for key, value in seen[field].items() if key != winner
+        ][:MAX_CONFLICTS]
+        fields[field] = {
+            **{key: value for key, value in candidate.items() if key != 'processed_at'},
+            "low_confidence": candidate['confidence'] < min_confidence,
+            "candidates": sum(value["count"] for value in seen[field].values()),
+            "conflicts": conflicts,
+        }
+
+    result = {
+        "property": name,
+        "address": max(address_votes, key=address_votes.get) if address_votes else None,
+        "documents": documents,
+        "fields": fields,
+        "consolidated_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    if errors:
+        result["errors"] = errors
+    return result
+
+def _consolidate_item(item: Tuple[str, List[str]], root: str, min_confidence: float, write: bool) -> Dict[str, Any]:
+    name, paths = item
+    result = consolidate_property(name, paths, min_confidence)
+    if write:
+        output_path = os.path.join(root, name, 'property-consolidated.json')
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    return result
+
+def consolidate_store(root: str, writer, workers: Optional[int] = 1, min_confidence: float = DEFAULT_MIN_CONFIDENCE,
+                      write: bool = False) -> Dict[str, Any]:
+    """
+    Consolida todas las propiedades del almacén y escribe una línea JSON por
+    propiedad en writer. Con workers > 1 reparte propiedades entre procesos.
+    """
+    started = time.perf_counter()
+    stats = {"properties": 0, "documents": 0, "fields": 0, "low_confidence_fields": 0, "conflicting_fields": 0, "errors": 0}
+    task = functools.partial(_consolidate_item, root=root, min_confidence=min_confidence, write=write)
+
+    def record(result: Dict[str, Any]) -> None:
+        writer.write(json.dumps(result, ensure_ascii=True) + '\n')
+        stats["properties"] += 1
+        stats["documents"] += len(result["documents"])
+        stats["fields"] += len(result["fields"])
+        stats["low_confidence_fields"] += sum(1 for field in result["fields"].values() if field["low_confidence"])
+        stats["conflicting_fields"] += sum(1 for field in result["fields"].values() if field["conflicts"])
+        stats["errors"] += len(result.get("errors", ()))
+
+    if workers == 1:
+        for item in iter_properties(root):
+            record(task(item))
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            for result in pool.imap(task, iter_properties(root), chunksize=4):
+                record(result)
+
+    stats["elapsed_s"] = round(time.perf_counter() - started, 3)
+    return stats
+
+if __name__ == "__main__":
+    default_store = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Documents')
+    parser = argparse.ArgumentParser(description='Consolida por propiedad los campos de los documentos procesados')
+    parser.add_argument('root', nargs='?', default=default_store,
+                        help='Directorio con una carpeta por propiedad (cada una con processed/*.json)')
+    parser.add_argument('--min-confidence', type=float, default=DEFAULT_MIN_CONFIDENCE,
+                        help='Confianza mínima para que un valor gane por tipo de documento')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Procesos en paralelo (cada uno consolida propiedades completas)')
+    parser.add_argument('--output', metavar='FILE',
+                        help='Escribe el JSON Lines en este archivo en lugar de stdout')
+    parser.add_argument('--write', action='store_true',
+                        help='Guarda además property-consolidated.json en la carpeta de cada propiedad')
+    args = parser.parse_args()
+
+    with (open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout) as out:
+        stats = consolidate_store(args.root, out, args.workers, args.min_confidence, args.write)
+    print(json.dumps(stats), file=sys.stderr)
+    sys.exit(1 if stats["errors"] else 0)
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Clasificador local de documentos por palabras clave
+Puntúa los DOCUMENT_TYPES de backend/ai-pipeline/config.js con etiquetas y
+frases típicas de cada tipo en una sola pasada sobre el texto; por encima del
+umbral el pipeline puede saltarse la clasificación remota con IA
+"""
+
+import re
+import sys
+import json
+import argparse
+from typing import Dict, Any, List, Tuple
+
+# Mismos valores que config.DOCUMENT_TYPES del pipeline de Node
+DOCUMENT_TYPES = (
+    'closing_alta', 'first_payment_letter', 'escrow_disclosure', 'home_owner_insurance',
+    'exhibit_a', 'tax_bill', 'lease_agreement', 'mortgage_statement', 'unknown',
+)
+
+# Umbral por defecto para no llamar a la IA (config.MIN_CLASSIFICATION_CONFIDENCE es 0.7)
+DEFAULT_THRESHOLD = 0.85
+
+# Las etiquetas en la cabecera (título del documento) pesan más que en el cuerpo
+HEAD_CHARS = 1500
+HEAD_WEIGHT = 3
+
+# Suma de pesos (sin el extra de cabecera) a partir de la cual la confianza ya
+# no depende de cuántas pistas hay: unas pocas palabras sueltas no bastan
+SATURATION_SCORE = 12.0
+MIN_SCORE = 3.0
+
+# Rasgos por tipo: (frases separadas por "|", peso). Cada rasgo cuenta una sola vez por documento
+TYPE_FEATURES = {
+    'closing_alta': [
+        ('alta settlement statement', 6),
+        ('settlement statement', 4),
+        ('closing statement', 4),
+        ('closing disclosure', 4),
+        ('closing instructions', 3),
+        ('alta', 2),
+        ('settlement agent|escrow officer', 2),
+        ('disbursement date', 2),
+        ('cash to close|due from borrower|due to borrower|due to seller', 2),
+        ('title charges|loan charges|escrow charges', 2),
+        ('aggregate adjustment', 2),
+        ('debit credit', 2),
+        ('title insurance|title search|prepaid interest', 1),
+    ],
+    'first_payment_letter': [
+        ('first payment letter', 6),
+        ('first payment information|first payment notice|first payment notification', 5),
+        ('your first payment|your first monthly payment', 3),
+        ('first payment due|first payment is due', 3),
+        ('where to send your payment|where to send payments', 2),
+    ],
+    'escrow_disclosure': [
+        ('initial escrow account disclosure', 7),
+        ('escrow account disclosure', 5),
+        ('escrow account balance|escrow account projection|escrow account projections', 2),
+        ('anticipated disbursements|projected disbursements', 2),
+        ('initial deposit', 2),
+        ('cushion', 2),
+    ],
+    'home_owner_insurance': [
+        ('declarations page|declaration page|policy declarations', 5),
+        ('homeowners insurance|homeowner s insurance|homeowners policy', 3),
+        ('policy number|policy period', 2),
+        ('coverage a|dwelling', 2),
+        ('other structures|loss of use', 2),
+        ('deductible|deductibles', 2),
+        ('named insured', 2),
+        ('dp #|ho #', 2),
+        ('premium', 1),
+        ('hurricane|windstorm', 1),
+    ],
+    'exhibit_a': [
+        ('exhibit a', 4),
+        ('legal description', 3),
+        ('plat book', 3),
+        ('according to the plat|according to the map', 3),
+        ('lot #', 1),
+        ('block #', 1),
+        ('subdivision', 1),
+    ],
+    'tax_bill': [
+        ('property tax bill|real estate tax bill|tax notice', 5),
+        ('ad valorem', 4),
+        ('millage', 3),
+        ('tax collector', 3),
+        ('taxing authority', 3),
+        ('tax district', 2),
+        ('assessed value', 2),
+        ('taxable value', 2),
+        ('if paid by|if paid in', 2),
+        ('exemptions', 1),
+    ],
+    'lease_agreement': [
+        ('lease agreement', 5),
+        ('residential lease', 4),
+        ('monthly rent', 3),
+        ('lease term|term of the lease|term of this lease', 3),
+        ('landlord', 2),
+        ('tenant|tenants', 2),
+        ('lessee|lessor', 2),
+        ('security deposit', 2),
+        ('premises', 1),
+    ],
+    'mortgage_statement': [
+        ('mortgage statement', 5),
+        ('loan statement|billing statement', 3),
+        ('transaction activity|past payments breakdown', 3),
+        ('statement date', 2),
+        ('payment due date', 2),
+        ('principal balance|unpaid principal|outstanding principal', 2),
+        ('amount due', 1),
+        ('late charge|late fee', 1),
+    ],
+}
+
+# Palabras en minúsculas y números (todos como "#"), igual para el texto y las frases
+TOKEN_PATTERN = re.compile(r'[a-z]+|[0-9]+')
+
+# Lambda para tokenizar texto o frases
+tokenize = lambda text: ['#' if token[0] <= '9' else token for token in TOKEN_PATTERN.findall(text.lower())]
+
+# Rasgos aplanados (tipo, frase, peso) e índice frase -> rasgo para buscarlos token a token
+FEATURES: List[Tuple[str, str, int]] = [
+    (doc_type, phrases, weight)
+    for doc_type, features in TYPE_FEATURES.items()
+    for phrases, weight in features
+]
+PHRASE_INDEX: Dict[Tuple[str, ...], int] = {
+    tuple(tokenize(phrase)): index
+    for index, (_, phrases, _) in enumerate(FEATURES)
+    for phrase in phrases.split('|')
+}
+# Longitudes de frase posibles según su primera palabra (casi todos los tokens no inician ninguna)
+PHRASE_LENGTHS: Dict[str, Tuple[int, ...]] = {}
+for phrase in PHRASE_INDEX:
+    PHRASE_LENGTHS[phrase[0]] = tuple(sorted(set(PHRASE_LENGTHS.get(phrase[0], ())) | {len(phrase)}))
+
+def classify_document(text: str) -> Dict[str, Any]:
+    """
+    Clasifica un documento con el mismo formato que DocumentClassifier.classify:
+    document_type, confidence y reasoning (más las puntuaciones por tipo).
+
+    Una pasada de tokenización y otra sobre los tokens buscando frases en un
+    diccionario. Cada rasgo suma su peso una vez (multiplicado si aparece en
+    la cabecera); la confianza combina el margen sobre el segundo tipo con el
+    número de pistas, así que un documento con pocas no llega al umbral.
+    """
+    tokens = tokenize(text)
+    head_tokens = len(tokenize(text[:HEAD_CHARS]))
+    contributions: Dict[int, int] = {}
+    for position, token in enumerate(tokens):
+        lengths = PHRASE_LENGTHS.get(token)
+        if lengths is None:
+            continue
+        for length in lengths:
+            index = PHRASE_INDEX.get(tuple(tokens[position:position + length]))
+            if index is None:
+                continue
+            weight = FEATURES[index][2] * (HEAD_WEIGHT if position < head_tokens else 1)
+            if weight > contributions.get(index, 0):
+                contributions[index] = weight
+
+    scores = {doc_type: 0 for doc_type in TYPE_FEATURES}
+    evidence = dict(scores)
+    for index, weight in contributions.items():
+        scores[FEATURES[index][0]] += weight
+        evidence[FEATURES[index][0]] += FEATURES[index][2]
+
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    (best_type, best), (_, second) = ranked[0], ranked[1]
+    if best < MIN_SCORE:
+        return {
+            "document_type": 'unknown',
+            "confidence": 0.0,
+            "reasoning": 'No document type keywords found',
+            "scores": scores,
+        }
+
+    confidence = (0.5 + 0.5 * (best - second) / best) * min(1.0, evidence[best_type] / SATURATION_SCORE)
+    matched = [FEATURES[index][1].split('|')[0] for index in sorted(contributions) if FEATURES[index][0] == best_type]
+    return {
+        "document_type": best_type,
+        "confidence": round(confidence, 2),
+        "reasoning": f"Local keyword match ({len(matched)} features): " + ', '.join(matched[:5]),
+        "scores": scores,
+    }
+
+def classify_text(text: str) -> Tuple[str, float]:
+    """(tipo, confianza) para usar como clasificador en ingest_pipeline"""
+    result = classify_document(text)
+    return result["document_type"], result["confidence"]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Clasifica un documento (texto por stdin) sin llamar a la IA')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Confianza mínima para dar la clasificación por buena (accepted)')
+    args = parser.parse_args()
+
+    result = classify_document(sys.stdin.read())
+    result["accepted"] = result["document_type"] != 'unknown' and result["confidence"] >= args.threshold
+    print(json.dumps(result))
@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Huellas de similitud de los documentos procesados
+MinHash de shingles de palabras sobre el raw_text normalizado más el hash del
+texto exacto, guardados en Documents/.fingerprint_index (manifiesto JSON y
+una matriz de firmas que solo se amplía); con bandas LSH se encuentran los
+casi duplicados de un documento nuevo sin compararlo con todo el almacén
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import fcntl
+import argparse
+import contextlib
+from typing import Optional, Dict, Any, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+from consolidate_properties import iter_properties
+from document_index import TOKEN_PATTERN
+from extract_property_data_improved import GROUP_PRIORITY, clean_input, normalize_text
+from extract_property_data_unified import detect_format, iter_extract_progressive
+from reextract_processed import load_index, text_fingerprint, write_json_atomic
+
+INDEX_DIR = '.fingerprint_index'
+MANIFEST_NAME = 'manifest.json'
+SIGNATURES_NAME = 'signatures.u8'
+RESULTS_DIR = 'results'
+LOCK_NAME = '.lock'
+INDEX_VERSION = 1
+
+# Shingles de SHINGLE_SIZE palabras; NUM_PERM permutaciones en BANDS bandas de NUM_PERM // BANDS filas.
+# Una renovación anual de la póliza ronda 0.55-0.65 frente a la anterior (cambian fechas e importes por
+# todo el texto) y documentos distintos de la misma propiedad quedan por debajo de 0.05, así que el umbral
+# deja margen para el error del estimador (±0.045 con 128 permutaciones). Con 64 bandas de 2 filas, dos
+# documentos con Jaccard 0.4 comparten alguna banda con probabilidad > 99.99%; a cambio, uno de cada ~7
+# pares sin relación también la comparte y se compara firma a firma
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+BANDS = 64
+ROWS = NUM_PERM // BANDS
+DEFAULT_THRESHOLD = 0.4
+
+# Permutaciones (a·x + b) mod PRIME con PRIME > 2^32 (crc32 de cada shingle); a < 2^31 para no desbordar uint64
+PRIME = np.uint64((1 << 32) + 15)
+_permutations = np.random.default_rng(20240501)
+PERM_A = _permutations.integers(1, 1 << 31, NUM_PERM, dtype=np.uint64)
+PERM_B = _permutations.integers(0, 1 << 31, NUM_PERM, dtype=np.uint64)
+SIGNATURE_DTYPE = np.dtype('<u8')
+
+# Shingles por bloque al calcular la firma (limita la matriz temporal a ~4 MB)
+SHINGLE_CHUNK = 4096
+MAX_DELETED_RATIO = 0.25
+
+# Documentos añadidos desde la extracción del backend (clave = hash del PDF) que se conservan con su
+# resultado; por encima se olvidan los usados hace más tiempo (entrada, firma y resultado)
+MAX_UPLOADED_DOCUMENTS = 2000
+
+# Lambda para las claves LSH de una firma: (banda, bytes de sus filas)
+band_keys = lambda signature: [(band, signature[band * ROWS:(band + 1) * ROWS].tobytes()) for band in range(BANDS)]
+
+def text_signature(text: str, normalized: bool = False) -> Tuple[Optional[np.ndarray], str]:
+    """
+    (firma MinHash, hash del texto normalizado) de un documento.
+
+    El hash es el de reextract_processed sobre el mismo texto que recibe el
+    extractor, así que dos documentos con igual hash dan la misma extracción.
+    Sin palabras (PDF escaneado sin OCR) la firma es None: no se compara.
+    """
+    if not normalized:
+        text = normalize_text(clean_input(text))
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    if not tokens:
+        return None, text_fingerprint(text)
+    shingles = {' '.join(tokens[i:i + SHINGLE_SIZE]) for i in range(max(1, len(tokens) - SHINGLE_SIZE + 1))}
+    hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles), np.uint64, len(shingles))
+    signature = np.full(NUM_PERM, PRIME, dtype=np.uint64)
+    for start in range(0, len(hashes), SHINGLE_CHUNK):
+        chunk = hashes[start:start + SHINGLE_CHUNK, None]
+        np.minimum(signature, ((chunk * PERM_A + PERM_B) % PRIME).min(axis=0), out=signature)
+    return signature.astype(SIGNATURE_DTYPE), text_fingerprint(text)
+
+def estimate_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Jaccard estimado de los shingles de dos documentos: fracción de permutaciones con igual mínimo"""
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+@contextlib.contextmanager
+def index_lock(root: str) -> Iterator[None]:
+    """Bloqueo exclusivo del índice de un almacén entre procesos (leer, añadir y guardar sin pisarse)"""
+    directory = os.path.join(root, INDEX_DIR)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LOCK_NAME), 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+class FingerprintIndex:
+    """
+    Índice de huellas de un almacén Documents/<propiedad>/processed/*.json.
+
+    El manifiesto guarda, por clave (ruta relativa al almacén, o absoluta
+    para documentos añadidos con add desde fuera del almacén), la fila de su
+    firma con su mtime, tamaño y hash de texto. Las filas de documentos
+    modificados o borrados quedan como borradas hasta la compactación; las
+    bandas LSH se reconstruyen en memoria al abrir.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.directory = os.path.join(root, INDEX_DIR)
+        self.manifest_path = os.path.join(self.directory, MANIFEST_NAME)
+        self.signatures_path = os.path.join(self.directory, SIGNATURES_NAME)
+        manifest = load_index(self.manifest_path)
+        # Firmas de otra configuración no son comparables: se recalcula todo
+        if (manifest.get('version'), manifest.get('num_perm'), manifest.get('shingle_size')) != (INDEX_VERSION, NUM_PERM, SHINGLE_SIZE):
+            manifest = {}
+        self.documents: Dict[str, Dict[str, Any]] = manifest.get('documents', {})
+        self.deleted = set(manifest.get('deleted', []))
+        self.signatures = self._load_signatures(manifest.get('rows', 0))
+        self.pending: List[np.ndarray] = []
+        self.loaded_stamp = self._manifest_stamp()
+        self._build_lookups()
+
+    def _manifest_stamp(self) -> Optional[Tuple[int, int]]:
+        """(inode, mtime) del manifiesto: write_json_atomic lo reemplaza, así que cambia con cada escritura"""
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def changed_on_disk(self) -> bool:
+        """Otro proceso guardó el índice después de que este lo cargara (o guardara)"""
+        return self._manifest_stamp() != self.loaded_stamp
+
+    def _load_signatures(self, rows: int) -> np.ndarray:
+        """Firmas guardadas; lo escrito después del último manifiesto (escritura interrumpida) se descarta"""
+        if not rows:
+            return np.empty((0, NUM_PERM), dtype=SIGNATURE_DTYPE)
+        with open(self.signatures_path, 'rb') as f:
+            data = f.read(rows * NUM_PERM * SIGNATURE_DTYPE.itemsize)
+        return np.frombuffer(data, dtype=SIGNATURE_DTYPE).reshape(rows, NUM_PERM)
+
+    def _build_lookups(self) -> None:
+        self.by_row = {entry['row']: key for key, entry in self.documents.items() if entry['row'] is not None}
+        self.by_text: Dict[str, List[str]] = {}
+        self.buckets: Dict[Tuple[int, bytes], List[int]] = {}
+        for key, entry in self.documents.items():
+            self.by_text.setdefault(entry['text_hash'], []).append(key)
+            if entry['row'] is not None:
+                for band_key in band_keys(self.signature(entry['row'])):
+                    self.buckets.setdefault(band_key, []).append(entry['row'])
+
+    @property
+    def rows(self) -> int:
+        return len(self.signatures) + len(self.pending)
+
+    def signature(self, row: int) -> np.ndarray:
+        return self.signatures[row] if row < len(self.signatures) else self.pending[row - len(self.signatures)]
+
+    def key_for(self, path: str) -> str:
+        """Clave de un archivo: ruta relativa si está dentro del almacén, absoluta si no"""
+        path = os.path.abspath(path)
+        root = os.path.abspath(self.root)
+        return os.path.relpath(path, root) if path.startswith(root + os.sep) else path
+
+    def save(self) -> None:
+        """Añade las firmas nuevas al archivo y reescribe el manifiesto"""
+        os.makedirs(self.directory, exist_ok=True)
+        if self.pending:
+            with open(self.signatures_path, 'r+b' if os.path.exists(self.signatures_path) else 'wb') as f:
+                f.truncate(len(self.signatures) * NUM_PERM * SIGNATURE_DTYPE.itemsize)
+                f.seek(0, os.SEEK_END)
+                f.write(np.stack(self.pending).tobytes())
+            self.signatures = np.concatenate([self.signatures, np.stack(self.pending)])
+            self.pending = []
+        write_json_atomic(self.manifest_path, {
+            "version": INDEX_VERSION,
+            "num_perm": NUM_PERM,
+            "shingle_size": SHINGLE_SIZE,
+            "rows": len(self.signatures),
+            "deleted": sorted(self.deleted),
+            "documents": self.documents,
+            "updated_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }, indent=2)
+        self.loaded_stamp = self._manifest_stamp()
+
+    def checkpoint(self) -> None:
+        """Guarda el índice, compactándolo antes si las filas borradas pasan de MAX_DELETED_RATIO de las vivas"""
+        if self.deleted and len(self.deleted) > MAX_DELETED_RATIO * max(len(self.by_row), 1):
+            self.compact()
+        else:
+            self.save()
+
+    def compact(self) -> None:
+        """Reescribe la matriz solo con las filas vivas y renumera los documentos"""
+        live = sorted(self.by_row)
+        signatures = np.stack([self.signature(row) for row in live]) if live else np.empty((0, NUM_PERM), SIGNATURE_DTYPE)
+        renumber = {row: index for index, row in enumerate(live)}
+        for entry in self.documents.values():
+            if entry['row'] is not None:
+                entry['row'] = renumber[entry['row']]
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self.signatures_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(signatures.tobytes())
+        os.replace(tmp_path, self.signatures_path)
+        self.signatures, self.pending, self.deleted = signatures, [], set()
+        self.save()
+        self._build_lookups()
+
+    def result_path(self, key: str) -> str:
+        return os.path.join(self.directory, RESULTS_DIR, f"{text_fingerprint(key)}.json")
+
+    def save_result(self, key: str, result: Dict[str, Any]) -> None:
+        """Guarda la extracción de un documento para reutilizarla con los de su mismo texto"""
+        os.makedirs(os.path.join(self.directory, RESULTS_DIR), exist_ok=True)
+        write_json_atomic(self.result_path(key), {"key": key, "result": result})
+
+    def load_result(self, key: str) -> Optional[Dict[str, Any]]:
+        """Extracción guardada con save_result, o None"""
+        stored = load_index(self.result_path(key))
+        return stored.get('result') if stored.get('key') == key else None
+
+    def evict_uploaded(self, limit: int = MAX_UPLOADED_DOCUMENTS) -> int:
+        """Olvida los documentos con used_at (los de iter_extract_reusing) menos recientes por encima de limit"""
+        uploaded = sorted((entry['used_at'], key) for key, entry in self.documents.items() if entry.get('used_at') is not None)
+        evicted = uploaded[:max(0, len(uploaded) - limit)]
+        for _, key in evicted:
+            self.remove(key)
+        return len(evicted)
+
+    def remove(self, key: str) -> None:
+        entry = self.documents.pop(key, None)
+        if entry is None:
+            return
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.result_path(key))
+        self.by_text[entry['text_hash']].remove(key)
+        if entry['row'] is not None:
+            self.deleted.add(entry['row'])
+            del self.by_row[entry['row']]
+
+    def add(self, key: str, signature: Optional[np.ndarray], text_hash: str, **meta) -> None:
+        """Añade (o reemplaza) un documento con su firma; meta va tal cual al manifiesto"""
+        self.remove(key)
+        row = None
+        if signature is not None:
+            row = self.rows
+            self.pending.append(signature)
+            self.by_row[row] = key
+            for band_key in band_keys(signature):
+                self.buckets.setdefault(band_key, []).append(row)
+        self.documents[key] = {"row": row, "text_hash": text_hash, **meta}
+        self.by_text.setdefault(text_hash, []).append(key)
+
+    def query(self, signature: Optional[np.ndarray], text_hash: str, threshold: float = DEFAULT_THRESHOLD,
+              exclude: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Documentos indexados casi iguales a una firma, de más a menos
+        parecido: los de igual texto normalizado (identical, similitud 1.0)
+        y los que comparten alguna banda LSH con Jaccard estimado >= threshold.
+        exclude deja fuera la clave del propio documento; los añadidos como
+        copia de otro (duplicate_of) no se devuelven, se devuelve el original.
+        """
+        is_match = lambda key: key != exclude and not self.documents[key].get('duplicate_of')
+        matches = {key: 1.0 for key in self.by_text.get(text_hash, ()) if is_match(key)}
+        if signature is not None:
+            candidates = {
+                row
+                for band_key in band_keys(signature)
+                for row in self.buckets.get(band_key, ())
+                if row in self.by_row
+            }
+            for row in candidates:
+                key = self.by_row[row]
+                if key in matches or not is_match(key):
+                    continue
+                similarity = estimate_similarity(signature, self.signature(row))
+                if similarity >= threshold:
+                    matches[key] = similarity
+        return [
+            {
+                "key": key,
+                "document_id": self.documents[key].get('document_id'),
+                "property": self.documents[key].get('property'),
+                "similarity": round(similarity, 3),
+                "identical": self.documents[key]['text_hash'] == text_hash,
+            }
+            for key, similarity in sorted(matches.items(), key=lambda item: (-item[1], item[0]))
+        ]
+
+    def update(self, rebuild: bool = False) -> Dict[str, Any]:
+        """Calcula las huellas de los documentos nuevos o modificados del almacén; con rebuild, de todos"""
+        started = time.perf_counter()
+        if rebuild:
+            for key in list(self.documents):
+                self.remove(key)
+
+        stats = {"documents": 0, "fingerprinted": 0, "removed": 0, "errors": 0}
+        seen = set()
+        for name, paths in iter_properties(self.root):
+            for path in paths:
+                key = os.path.relpath(path, self.root)
+                seen.add(key)
+                stats["documents"] += 1
+                try:
+                    stat = os.stat(path)
+                    entry = self.documents.get(key)
+                    if entry and entry.get('mtime_ns') == stat.st_mtime_ns and entry.get('size') == stat.st_size:
+                        continue
+                    with open(path, encoding='utf-8') as f:
+                        doc = json.load(f)
+                except (OSError, ValueError) as e:
+                    stats["errors"] += 1
+                    print(json.dumps({"path": path, "error": f"{type(e).__name__}: {e}"}), file=sys.stderr)
+                    continue
+                signature, text_hash = text_signature(doc.get('raw_text') or '')
+                self.add(key, signature, text_hash, document_id=doc.get('document_id'), property=name,
+                         mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+                stats["fingerprinted"] += 1
+
+        # Las claves de update (con mtime) desaparecen con su documento; las de fuera del almacén
+        # (add desde la ingesta) mientras exista su archivo, y el resto (hashes de PDF) se mantienen
+        for key in [key for key in self.documents if key not in seen]:
+            if self.documents[key].get('mtime_ns') is not None or (os.path.isabs(key) and not os.path.exists(key)):
+                self.remove(key)
+                stats["removed"] += 1
+        # Una copia cuyo original ya no está pasa a ser el original
+        for entry in self.documents.values():
+            if entry.get('duplicate_of') and entry['duplicate_of'] not in self.documents:
+                entry['duplicate_of'] = None
+
+        self.checkpoint()
+        stats["elapsed_s"] = round(time.perf_counter() - started, 3)
+        return stats
+
+    def clusters(self, threshold: float = DEFAULT_THRESHOLD) -> List[List[Dict[str, Any]]]:
+        """Grupos de documentos indexados casi duplicados entre sí (componentes conexas), de mayor a menor"""
+        parent = {key: key for key in self.documents}
+
+        def find(key: str) -> str:
+            while parent[key] != key:
+                parent[key] = parent[parent[key]]
+                key = parent[key]
+            return key
+
+        for key, entry in self.documents.items():
+            signature = self.signature(entry['row']) if entry['row'] is not None else None
+            for match in self.query(signature, entry['text_hash'], threshold, exclude=key):
+                parent[find(match['key'])] = find(key)
+
+        groups: Dict[str, List[str]] = {}
+        for key in self.documents:
+            groups.setdefault(find(key), []).append(key)
+        return sorted(
+            ([{"key": key, **{name: self.documents[key].get(name) for name in ('document_id', 'property', 'text_hash')}}
+              for key in sorted(keys)] for keys in groups.values() if len(keys) > 1),
+            key=len, reverse=True,
+        )
+
+def check_paths(index: FingerprintIndex, paths: Iterable[str], threshold: float = DEFAULT_THRESHOLD) -> Iterable[Dict[str, Any]]:
+    """
+    Informe previo a una carga: para cada archivo, sus casi duplicados en el
+    índice y entre los archivos anteriores de la misma carga (sin guardarlos).
+    duplicate marca los que tienen el mismo texto normalizado que otro: su
+    extracción ya existe. Los casi duplicados (una renovación) solo se listan,
+    porque sus valores cambian
+    """
+    from ingest_pipeline import load_document, property_of
+
+    for path in paths:
+        key = index.key_for(path)
+        try:
+            signature, text_hash = text_signature(load_document(path)["text"])
+        except Exception as e:
+            yield {"path": path, "error": f"{type(e).__name__}: {e}"}
+            continue
+        matches = index.query(signature, text_hash, threshold, exclude=key)
+        duplicate = bool(matches) and matches[0]["identical"]
+        index.add(key, signature, text_hash, property=property_of(path), duplicate_of=matches[0]["key"] if duplicate else None)
+        yield {"path": path, "duplicate": duplicate, "matches": matches}
+
+def diff_results(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Campos "grupo.clave" con distinto valor entre dos extracciones"""
+    changed = {}
+    for group in GROUP_PRIORITY:
+        before, after = previous.get(group) or {}, current.get(group) or {}
+        for key in sorted(set(before) | set(after)):
+            if before.get(key) != after.get(key):
+                changed[f"{group}.{key}"] = {"previous": before.get(key), "current": after.get(key)}
+    return changed
+
+def iter_extract_reusing(text: str, deadline: float, root: str, key: str,
+                         threshold: float = DEFAULT_THRESHOLD) -> Iterator[Dict[str, Any]]:
+    """
+    Esquema closing por grupos (ver iter_extract_progressive) con el índice
+    de huellas de root como caché de extracciones.
+
+    Si algún documento del índice (la propia clave incluida) tiene el mismo
+    texto normalizado y su extracción guardada, se devuelve esa sin extraer
+    nada: el mismo texto da la misma extracción. Si no, se extrae entero; con
+    un casi duplicado, el registro done lleva near_duplicate (clave,
+    similitud y, si la extracción está completa, los campos que cambian
+    respecto a la suya, ver diff_results). Al terminar, el documento queda
+    en el índice con la clave key y, si está completo, con su extracción.
+    Estos documentos se olvidan por antigüedad de uso por encima de
+    MAX_UPLOADED_DOCUMENTS, y el índice se compacta cuando hace falta.
+    """
+    text = clean_input(text)
+    signature, text_hash = text_signature(text)
+    with index_lock(root):
+        index = FingerprintIndex(root)
+        matches = index.query(signature, text_hash, threshold)
+        identical = next((
+            (match, stored)
+            for match in matches if match['identical']
+            for stored in [index.load_result(match['key'])]
+            if stored
+        ), None)
+        near = next((match for match in matches if not match['identical']), None)
+        previous = index.load_result(near['key']) if near and not identical else None
+
+    if identical:
+        match, stored = identical
+        records = [{"group": group, "data": stored[group], "unresolved": [], "elapsed_ms": 0.0}
+                   for group in GROUP_PRIORITY]
+        records.append({"done": True, "complete": True, "unresolved_fields": [], "elapsed_ms": 0.0,
+                        "near_duplicate": {**match, "changed_fields": {}}})
+    else:
+        records = iter_extract_progressive(text, deadline, detect_format(text))
+
+    result: Dict[str, Any] = {}
+    complete = False
+    for record in records:
+        if record.get("done"):
+            complete = record["complete"]
+            if near and not identical:
+                record["near_duplicate"] = {
+                    **near,
+                    "changed_fields": diff_results(previous, result) if complete and previous else None,
+                }
+        elif not record["group"].startswith('_'):
+            result[record["group"]] = record["data"]
+        yield record
+
+    with index_lock(root):
+        # Solo se vuelve a leer el índice si otro proceso lo guardó mientras se extraía
+        if index.changed_on_disk():
+            index = FingerprintIndex(root)
+        entry = index.documents.get(key)
+        if entry is None or entry['text_hash'] != text_hash:
+            index.add(key, signature, text_hash)
+            entry = index.documents[key]
+        if complete and not (identical and identical[0]['key'] == key):
+            index.save_result(key, result)
+        entry['used_at'] = time.time()
+        index.evict_uploaded(MAX_UPLOADED_DOCUMENTS)
+        index.checkpoint()
+
+if __name__ == "__main__":
+    default_store = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Documents')
+    parser = argparse.ArgumentParser(description='Huellas MinHash de los documentos procesados para detectar casi duplicados')
+    parser.add_argument('root', nargs='?', default=default_store,
+                        help='Directorio con una carpeta por propiedad (cada una con processed/*.json)')
+    parser.add_argument('--rebuild', action='store_true', help='Recalcula todas las huellas desde cero')
+    parser.add_argument('--check', nargs='+', metavar='PATH',
+                        help='Antes de una carga: informa qué archivos (.pdf, .txt, processed/*.json) ya están procesados o se repiten')
+    parser.add_argument('--clusters', action='store_true', help='Lista los grupos de casi duplicados del almacén')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Jaccard estimado mínimo de los shingles para considerar dos documentos casi duplicados')
+    args = parser.parse_args()
+    if not 0 < args.threshold <= 1:
+        parser.error('--threshold must be in (0, 1]')
+
+    index = FingerprintIndex(args.root)
+    if args.check:
+        summary = {"files": len(args.check), "duplicates": 0, "near_duplicates": 0, "errors": 0}
+        for record in check_paths(index, args.check, args.threshold):
+            if "error" in record:
+                summary["errors"] += 1
+            elif record["duplicate"]:
+                summary["duplicates"] += 1
+            elif record["matches"]:
+                summary["near_duplicates"] += 1
+            print(json.dumps(record, ensure_ascii=False))
+        print(json.dumps(summary), file=sys.stderr)
+    elif args.clusters:
+        for group in index.clusters(args.threshold):
+            print(json.dumps(group, ensure_ascii=False))
+    else:
+        stats = index.update(args.rebuild)
+        print(json.dumps(stats, indent=2))
+        sys.exit(1 if stats["errors"] else 0)
@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Índice invertido persistente sobre los documentos procesados
+Tokens de raw_text/pages y valores de extracted_data -> (documento, página,
+offset), guardado en Documents/.document_index en segmentos inmutables que se
+abren con mmap; cada actualización solo indexa los documentos nuevos o
+modificados y los segmentos se compactan cuando se acumulan
+"""
+
+import os
+import re
+import sys
+import json
+import mmap
+import time
+import heapq
+import bisect
+import struct
+import argparse
+from array import array
+from itertools import chain
+from typing import Optional, Dict, Any, Iterable, Iterator, List, Set, Tuple
+
+from consolidate_properties import iter_properties, value_key
+from reextract_processed import load_index, write_json_atomic
+
+INDEX_DIR = '.document_index'
+MANIFEST_NAME = 'manifest.json'
+INDEX_VERSION = 1
+
+# Formato de segmento (little endian):
+#   cabecera | postings (doc, página, offset) | directorio de términos | términos utf-8
+# El directorio va ordenado por los bytes del término para buscar por bisección
+MAGIC = b'OIQIDX01'
+HEADER = struct.Struct('<8sIIQQ')   # magic, nº de términos, reservado, offset del directorio, offset de los términos
+TERM_ENTRY = struct.Struct('<IIQI')  # offset del término, longitud, primer posting, nº de postings
+POSTING = struct.Struct('<III')      # documento, página (0 = raw_text sin páginas), offset en la página
+
+NO_OFFSET = 0xFFFFFFFF
+FIELD_PREFIX = '@'
+
+# Documentos por segmento al indexar y segmentos tolerados antes de compactar
+SEGMENT_DOCS = 500
+MAX_SEGMENTS = 8
+MAX_DELETED_RATIO = 0.25
+
+# Huecos permitidos entre dos tokens seguidos de una frase (espacios, guiones, puntuación)
+MAX_PHRASE_GAP = 3
+
+TOKEN_PATTERN = re.compile(r'[^\W_]{2,}')
+
+# Lambda para el término de un valor extraído: "@campo=valor normalizado"
+field_term = lambda field, value: f"{FIELD_PREFIX}{field}={value_key(value)}"
+
+def document_postings(doc: Dict[str, Any]) -> Dict[str, List[Tuple[int, int]]]:
+    """Término -> [(página, offset)] de un documento procesado: texto por página y valores extraídos"""
+    pages = [(page.get('page_number') or number, page.get('text') or '')
+             for number, page in enumerate(doc.get('pages') or [], 1)]
+    if not pages:
+        pages = [(0, doc.get('raw_text') or '')]
+
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    for number, text in pages:
+        # Se pasa a minúsculas la página entera (salvo casos raros de Unicode, los offsets no cambian)
+        for match in TOKEN_PATTERN.finditer(text.lower()):
+            term = match.group()
+            locations = postings.get(term)
+            if locations is None:
+                postings[term] = [(number, match.start())]
+            else:
+                locations.append((number, match.start()))
+
+    for field, entry in (doc.get('extracted_data') or {}).items():
+        value = entry.get('value') if isinstance(entry, dict) else entry
+        if value is None or value == '' or isinstance(value, (dict, list)):
+            continue
+        # Se ubica el valor en el texto por su source_text (o el propio valor) si aparece
+        needle = (entry.get('source_text') if isinstance(entry, dict) else None) or str(value)
+        location = next(((number, text.find(needle)) for number, text in pages if needle in text), (0, NO_OFFSET))
+        postings.setdefault(field_term(field, value), []).append(location)
+    return postings
+
+def write_segment(path: str, terms: Iterable[Tuple[bytes, Iterable[Tuple[int, int, int]]]]) -> int:
+    """
+    Escribe un segmento a partir de (término en bytes, postings) en orden de
+    término. Los postings se vuelcan a disco según llegan; en memoria solo
+    queda el directorio. Devuelve el número de términos.
+    """
+    directory = []
+    blob = bytearray()
+    posting_count = 0
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, 0, 0, 0, 0))
+        for term, postings in terms:
+            start = posting_count
+            # array('I') vuelca los postings de golpe (el formato es little endian)
+            packed = array('I', chain.from_iterable(postings))
+            if sys.byteorder == 'big':
+                packed.byteswap()
+            packed.tofile(f)
+            posting_count += len(packed) // 3
+            if posting_count > start:
+                directory.append(TERM_ENTRY.pack(len(blob), len(term), start, posting_count - start))
+                blob += term
+        directory_offset = f.tell()
+        f.write(b''.join(directory))
+        terms_offset = f.tell()
+        f.write(blob)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, len(directory), 0, directory_offset, terms_offset))
+    os.replace(tmp_path, path)
+    return len(directory)
+
+class Segment:
+    """Segmento abierto con mmap: búsqueda de términos por bisección sin cargarlo en memoria"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, _, self.directory_offset, self.terms_offset = HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            raise ValueError(f"Not a document index segment: {path}")
+
+    def _entry(self, index: int) -> Tuple[int, int, int, int]:
+        return TERM_ENTRY.unpack_from(self.data, self.directory_offset + index * TERM_ENTRY.size)
+
+    def _term(self, index: int) -> bytes:
+        offset, length, _, _ = self._entry(index)
+        start = self.terms_offset + offset
+        return self.data[start:start + length]
+
+    def lookup(self, term: bytes) -> Tuple[int, int]:
+        """(primer posting, nº de postings) de un término; (0, 0) si no está en el segmento"""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._term(middle) < term:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.count or self._term(low) != term:
+            return 0, 0
+        _, _, start, count = self._entry(low)
+        return start, count
+
+    def _doc_at(self, index: int) -> int:
+        return POSTING.unpack_from(self.data, HEADER.size + index * POSTING.size)[0]
+
+    def postings(self, term: bytes, docs: Optional[List[int]] = None) -> List[Tuple[int, int, int]]:
+        """
+        Postings de un término. Con pocos docs (ordenados) solo se leen los de
+        esos documentos, por bisección dentro de la lista del término, así que
+        un término muy frecuente no cuesta más que uno raro.
+        """
+        start, count = self.lookup(term)
+        if not count:
+            return []
+        if docs is None or len(docs) * 16 >= count:
+            offset = HEADER.size + start * POSTING.size
+            postings = POSTING.iter_unpack(self.data[offset:offset + count * POSTING.size])
+            if docs is None:
+                return list(postings)
+            wanted = set(docs)
+            return [posting for posting in postings if posting[0] in wanted]
+        postings = []
+        end = start + count
+        for doc in docs:
+            low, high = start, end
+            while low < high:
+                middle = (low + high) // 2
+                if self._doc_at(middle) < doc:
+                    low = middle + 1
+                else:
+                    high = middle
+            while low < end and self._doc_at(low) == doc:
+                postings.append(POSTING.unpack_from(self.data, HEADER.size + low * POSTING.size))
+                low += 1
+            start = low
+        return postings
+
+    def iter_terms(self) -> Iterator[Tuple[bytes, List[Tuple[int, int, int]]]]:
+        """Todos los términos con sus postings, en orden (para compactar)"""
+        for index in range(self.count):
+            _, _, start, count = self._entry(index)
+            offset = HEADER.size + start * POSTING.size
+            yield self._term(index), list(POSTING.iter_unpack(self.data[offset:offset + count * POSTING.size]))
+
+    def close(self) -> None:
+        self.data.close()
+
+def merge_segments(segments: List[Segment], deleted: Set[int]) -> Iterator[Tuple[bytes, List[Tuple[int, int, int]]]]:
+    """Mezcla los términos de varios segmentos en orden, sin los documentos borrados"""
+    current, merged = None, []
+    for term, postings in heapq.merge(*(segment.iter_terms() for segment in segments), key=lambda item: item[0]):
+        if term != current:
+            if merged:
+                yield current, sorted(merged)
+            current, merged = term, []
+        merged.extend(posting for posting in postings if posting[0] not in deleted)
+    if merged:
+        yield current, sorted(merged)
+
+class DocumentIndex:
+    """
+    Índice de un almacén Documents/<propiedad>/processed/*.json.
+
+    El manifiesto guarda, por ruta relativa, el número interno del documento
+    con su mtime y tamaño; un documento modificado recibe un número nuevo y
+    el anterior queda como borrado hasta la siguiente compactación.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.directory = os.path.join(root, INDEX_DIR)
+        self.manifest_path = os.path.join(self.directory, MANIFEST_NAME)
+        manifest = load_index(self.manifest_path)
+        if manifest.get('version') != INDEX_VERSION:
+            manifest = {}
+        self.documents: Dict[str, Dict[str, Any]] = manifest.get('documents', {})
+        self.segment_names: List[str] = manifest.get('segments', [])
+        self.deleted: Set[int] = set(manifest.get('deleted', []))
+        self.next_doc: int = manifest.get('next_doc', 0)
+        self.segments = [Segment(os.path.join(self.directory, name)) for name in self.segment_names]
+        self.by_number = {entry['doc']: (path, entry) for path, entry in self.documents.items()}
+
+    def close(self) -> None:
+        for segment in self.segments:
+            segment.close()
+
+    def save(self) -> None:
+        write_json_atomic(self.manifest_path, {
+            "version": INDEX_VERSION,
+            "next_doc": self.next_doc,
+            "segments": self.segment_names,
+            "deleted": sorted(self.deleted),
+            "documents": self.documents,
+            "updated_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }, indent=2)
+
+    def _new_segment_name(self) -> str:
+        number = max((int(name[4:10]) for name in self.segment_names), default=-1) + 1
+        return f"seg_{number:06d}.idx"
+
+    def _flush(self, pending: Dict[str, List[Tuple[int, int, int]]]) -> None:
+        name = self._new_segment_name()
+        path = os.path.join(self.directory, name)
+        encoded = sorted((term.encode('utf-8'), postings) for term, postings in pending.items())
+        write_segment(path, encoded)
+        self.segment_names.append(name)
+        self.segments.append(Segment(path))
+        pending.clear()
+
+    def compact(self) -> None:
+        """Funde todos los segmentos en uno y descarta los postings de documentos borrados"""
+        name = self._new_segment_name()
+        path = os.path.join(self.directory, name)
+        write_segment(path, merge_segments(self.segments, self.deleted))
+        self.close()
+        for old_name in self.segment_names:
+            os.remove(os.path.join(self.directory, old_name))
+        self.segment_names = [name]
+        self.segments = [Segment(path)]
+        self.deleted.clear()
+
+    def update(self, rebuild: bool = False) -> Dict[str, Any]:
+        """Indexa los documentos nuevos o modificados; con rebuild, todo desde cero"""
+        started = time.perf_counter()
+        os.makedirs(self.directory, exist_ok=True)
+        if rebuild:
+            self.deleted.update(entry['doc'] for entry in self.documents.values())
+            self.documents = {}
+
+        stats = {"documents": 0, "indexed": 0, "removed": 0, "errors": 0}
+        pending: Dict[str, List[Tuple[int, int, int]]] = {}
+        pending_docs = 0
+        seen = set()
+        for _, paths in iter_properties(self.root):
+            for path in paths:
+                rel_path = os.path.relpath(path, self.root)
+                seen.add(rel_path)
+                stats["documents"] += 1
+                try:
+                    stat = os.stat(path)
+                    entry = self.documents.get(rel_path)
+                    if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+                        continue
+                    with open(path, encoding='utf-8') as f:
+                        doc = json.load(f)
+                except (OSError, ValueError) as e:
+                    stats["errors"] += 1
+                    print(json.dumps({"path": path, "error": f"{type(e).__name__}: {e}"}), file=sys.stderr)
+                    continue
+
+                if entry:
+                    self.deleted.add(entry['doc'])
+                number = self.next_doc
+                self.next_doc += 1
+                for term, locations in document_postings(doc).items():
+                    pending.setdefault(term, []).extend([(number, page, offset) for page, offset in locations])
+                self.documents[rel_path] = {
+                    "doc": number,
+                    "document_id": doc.get('document_id'),
+                    "mtime_ns": stat.st_mtime_ns,
+                    "size": stat.st_size,
+                }
+                stats["indexed"] += 1
+                pending_docs += 1
+                if pending_docs >= SEGMENT_DOCS:
+                    self._flush(pending)
+                    pending_docs = 0
+
+        if pending:
+            self._flush(pending)
+        for rel_path in [rel_path for rel_path in self.documents if rel_path not in seen]:
+            self.deleted.add(self.documents.pop(rel_path)['doc'])
+            stats["removed"] += 1
+
+        live = len(self.documents)
+        if len(self.segments) > MAX_SEGMENTS or (self.deleted and len(self.deleted) > MAX_DELETED_RATIO * max(live, 1)):
+            self.compact()
+        self.save()
+        self.by_number = {entry['doc']: (path, entry) for path, entry in self.documents.items()}
+
+        stats["segments"] = len(self.segments)
+        stats["elapsed_s"] = round(time.perf_counter() - started, 3)
+        return stats
+
+    def postings(self, term: str, docs: Optional[List[int]] = None) -> List[Tuple[int, int, int]]:
+        """Postings vivos de un término en todos los segmentos (opcionalmente solo de docs)"""
+        encoded = term.encode('utf-8')
+        return [
+            posting
+            for segment in self.segments
+            for posting in segment.postings(encoded, docs)
+            if posting[0] not in self.deleted
+        ]
+
+    def frequency(self, term: str) -> int:
+        """Nº de postings de un término (incluidos los de documentos borrados), sin leerlos"""
+        encoded = term.encode('utf-8')
+        return sum(segment.lookup(encoded)[1] for segment in self.segments)
+
+    def search(self, query: str) -> List[Tuple[int, int, int]]:
+        """
+        Apariciones de una frase: los tokens de la consulta seguidos en la
+        misma página (con hasta MAX_PHRASE_GAP caracteres entre ellos).
+        Devuelve (documento, página, offset) del primer token.
+        """
+        tokens = [token.lower() for token in TOKEN_PATTERN.findall(query)]
+        if not tokens:
+            return []
+        # Se empieza por el token más raro; del resto solo se leen los documentos candidatos
+        rarest = min(set(tokens), key=self.frequency)
+        postings = {rarest: self.postings(rarest)}
+        docs = sorted({posting[0] for posting in postings[rarest]})
+        for token in set(tokens) - {rarest}:
+            if not docs:
+                break
+            postings[token] = self.postings(token, docs)
+            docs = sorted({posting[0] for posting in postings[token]})
+        if not docs:
+            return []
+        hits = [(doc, page, offset, offset) for doc, page, offset in postings[tokens[0]]]
+        for previous, token in zip(tokens, tokens[1:]):
+            by_page: Dict[Tuple[int, int], List[int]] = {}
+            for doc, page, offset in postings[token]:
+                by_page.setdefault((doc, page), []).append(offset)
+            matched = []
+            for doc, page, start, last in hits:
+                offsets = by_page.get((doc, page))
+                if not offsets:
+                    continue
+                end = last + len(previous)
+                position = bisect.bisect_left(offsets, end)
+                if position < len(offsets) and offsets[position] <= end + MAX_PHRASE_GAP:
+                    matched.append((doc, page, start, offsets[position]))
+            hits = matched
+        return [(doc, page, start) for doc, page, start, _ in hits]
+
+    def field(self, name: str, value: Any) -> List[Tuple[int, int, int]]:
+        """Documentos cuyo extracted_data tiene ese valor en ese campo"""
+        return self.postings(field_term(name, value))
+
+    def describe(self, hits: List[Tuple[int, int, int]], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Agrupa los postings por documento con su ruta y document_id"""
+        grouped: Dict[int, List[List[Optional[int]]]] = {}
+        for doc, page, offset in hits:
+            grouped.setdefault(doc, []).append([page, None if offset == NO_OFFSET else offset])
+        results = []
+        for doc, locations in grouped.items():
+            path, entry = self.by_number[doc]
+            results.append({
+                "document_id": entry['document_id'],
+                "path": path,
+                "property": path.split(os.sep)[0],
+                "hits": len(locations),
+                "locations": locations[:limit] if limit else locations,
+            })
+        return results
+
+if __name__ == "__main__":
+    default_store = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Documents')
+    parser = argparse.ArgumentParser(description='Índice invertido de los documentos procesados (actualiza o consulta)')
+    parser.add_argument('root', nargs='?', default=default_store,
+                        help='Directorio con una carpeta por propiedad (cada una con processed/*.json)')
+    parser.add_argument('--rebuild', action='store_true', help='Reindexa todo desde cero')
+    parser.add_argument('--search', metavar='QUERY', help='Busca una palabra o frase en el texto de los documentos')
+    parser.add_argument('--field', metavar='NAME=VALUE', help='Busca documentos con ese valor extraído, p.ej. policy_number=FPH5621941')
+    parser.add_argument('--limit', type=int, default=10, help='Ubicaciones (página, offset) listadas por documento')
+    args = parser.parse_args()
+
+    index = DocumentIndex(args.root)
+    if args.search is None and args.field is None:
+        stats = index.update(args.rebuild)
+        index.close()
+        print(json.dumps(stats, indent=2))
+        sys.exit(1 if stats["errors"] else 0)
+
+    if args.field is not None and '=' not in args.field:
+        parser.error('--field expects NAME=VALUE')
+    started = time.perf_counter()
+    if args.search is not None:
+        hits = index.search(args.search)
+    else:
+        hits = index.field(*args.field.split('=', 1))
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    for result in index.describe(hits, args.limit):
+        print(json.dumps(result, ensure_ascii=False))
+    print(json.dumps({"documents": len({hit[0] for hit in hits}), "hits": len(hits), "elapsed_ms": round(elapsed_ms, 3)}), file=sys.stderr)
+    index.close()
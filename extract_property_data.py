@@ -8,9 +8,13 @@ Usa lambdas, comprehensions y técnicas modernas de Python
 import re
 import json
 import sys
+import argparse
 from datetime import datetime
 from typing import Optional, Dict, Any
 
+# Motor de anclas compartido con extract_property_data_improved (mismos patrones y mismo recorrido)
+from extract_property_data_improved import FIELD_PATTERNS, PATTERN_FLAGS, scan_fields
+
 # Lambdas para limpieza de texto
 clean_whitespace = lambda text: re.sub(r'\s+', ' ', text).strip()
 remove_line_breaks = lambda text: re.sub(r'-\s*\n\s*', '', text)
@@ -31,7 +35,7 @@ parse_int = lambda val: int(float(val)) if val and str(val).replace('.', '').isd
 
 def extract_with_context(text: str, pattern: str, group: int = 1) -> Optional[str]:
     """Extrae usando regex con contexto"""
-    match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE | re.DOTALL)
+    match = re.search(pattern, text, PATTERN_FLAGS)
     return clean_whitespace(match.group(group)) if match else None
 
 def parse_address_components(address_str: str) -> Dict[str, Optional[str]]:
@@ -59,36 +63,21 @@ def parse_address_components(address_str: str) -> Dict[str, Optional[str]]:
         'zip': None
     }
 
-def extract_data(text: str) -> Dict[str, Any]:
+def extract_data(text: str, engine: str = 'compiled') -> Dict[str, Any]:
     """
     Extrae datos del PDF usando técnicas modernas de Python
+
+    engine='legacy' usa la ruta original (un re.search por campo) para comparar
     """
     # Normalizar texto
     text = normalize_text(text)
     
-    # Patrones de extracción usando dict comprehension
-    patterns = {
-        'loan_number': r'Loan\s+No\.?\s*[:\-]?\s*(\d+)',
-        'loan_amount': r'Loan\s+Amount\s+of\s+\$?([\d,]+\.?\d*)',
-        'lender_name': r'from\s+([^(]+?)\s*\((?:â€œ)?Lender',
-        'borrower_name': r'to\s+([^(]+?)\s*\((?:â€œ)?Borrower',
-        'property_address': r'Property\s+(?:Address|Location)\s*[:\-]?\s*([^\n]+?)(?=\n|$)',
-        'property_type': r'Property\s+Type\s*[:\-]?\s*([^\n]+)',
-        'purchase_price': r'Purchase\s+Price\s*[:\-]?\s*\$?([\d,]+\.?\d*)',
-        'closing_date': r'Closing\s+Date\s*[:\-]?\s*(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4})',
-        'interest_rate': r'Interest\s+Rate\s*[:\-]?\s*([\d.]+)\s*%?',
-        'term_years': r'Term\s*[:\-]?\s*(\d+)\s*(?:years?|yrs?)',
-        'monthly_payment': r'Monthly\s+Payment\s*[:\-]?\s*\$?([\d,]+\.?\d*)',
-        'property_tax': r'Property\s+Tax(?:es)?\s*[:\-]?\s*\$?([\d,]+\.?\d*)',
-        'insurance': r'Insurance\s*[:\-]?\s*\$?([\d,]+\.?\d*)',
-        'monthly_rent': r'(?:Monthly\s+)?Rent\s*[:\-]?\s*\$?([\d,]+\.?\d*)',
-    }
-    
-    # Extraer todos los campos usando dict comprehension
-    extracted = {
-        key: extract_with_context(text, pattern)
-        for key, pattern in patterns.items()
-    }
+    # Extraer todos los campos (motor compilado de una pasada o ruta por campo)
+    extracted = (
+        {key: extract_with_context(text, pattern) for key, pattern in FIELD_PATTERNS.items()}
+        if engine == 'legacy'
+        else scan_fields(text)
+    )
     
     # Parsear dirección en componentes
     addr_components = parse_address_components(extracted.get('property_address', ''))
@@ -137,6 +126,11 @@ def extract_data(text: str) -> Dict[str, Any]:
     }
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Extrae datos de PDFs de cierre de propiedades')
+    parser.add_argument('--engine', choices=('compiled', 'legacy'), default='compiled',
+                        help='compiled: una sola pasada con patrones precompilados; legacy: un re.search por campo')
+    args = parser.parse_args()
+
     # Configurar stdout con manejo de errores
     sys.stdout.reconfigure(encoding='utf-8', errors='replace') if hasattr(sys.stdout, 'reconfigure') else None
     
@@ -145,7 +139,7 @@ if __name__ == "__main__":
     pdf_text = pdf_text.encode('utf-8', errors='ignore').decode('utf-8', errors='ignore')
     
     # Extraer datos
-    result = extract_data(pdf_text)
+    result = extract_data(pdf_text, engine=args.engine)
     
     # Imprimir JSON
     print(json.dumps(result, ensure_ascii=True, indent=2))
\ No newline at end of file
@@ -6,15 +6,34 @@ Usa lambdas, comprehensions y técnicas modernas de Python
 """
 
 import re
+import io
+import os
 import json
 import sys
+import signal
+import atexit
+import argparse
+import functools
+import contextlib
+import heapq
+import hashlib
+import time
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+from collections import defaultdict
+import socketserver
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable, Iterator, Tuple, List, TextIO, Iterable, Sequence
+
+from extraction_cache import ExtractionCache, DEFAULT_MAX_BYTES
 
 # Lambdas para limpieza de texto
-clean_whitespace = lambda text: re.sub(r'\s+', ' ', text).strip()
+collapse_whitespace = lambda text: re.sub(r'\s+', ' ', text)
+clean_whitespace = lambda text: collapse_whitespace(text).strip()
 remove_line_breaks = lambda text: re.sub(r'-\s*\n\s*', '', text)
 normalize_text = lambda text: clean_whitespace(remove_line_breaks(text))
+clean_input = lambda text: text.encode('utf-8', errors='ignore').decode('utf-8', errors='ignore')
 
 # Lambda para parsear moneda
 parse_currency = lambda val: (
@@ -29,11 +48,504 @@ parse_percentage = lambda val: parse_currency(val.replace('%', '')) if val else
 # Lambda para parsear enteros
 parse_int = lambda val: int(float(val)) if val and str(val).replace('.', '').isdigit() else None
 
+# Patrones de extracción por campo
+FIELD_PATTERNS = {
+    'loan_number': r'Loan\s+No\.?\s*[:\-]?\s*(\d+)',
+    'loan_amount': r'Loan\s+Amount\s+of\s+\$?([\d,]+\.?\d*)',
+    'lender_name': r'from\s+([^(]+?)\s*\((?:â€œ)?Lender',
+    'borrower_name': r'to\s+([^(]+?)\s*\((?:â€œ)?Borrower',
+    'property_address': r'Property\s+(?:Address|Location)\s*[:\-]?\s*([^\n]+?)(?=\n|$)',
+    'property_type': r'Property\s+Type\s*[:\-]?\s*([^\n]+)',
+    'purchase_price': r'Purchase\s+Price\s*[:\-]?\s*\$?([\d,]+\.?\d*)',
+    'closing_date': r'Closing\s+Date\s*[:\-]?\s*(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4})',
+    'interest_rate': r'Interest\s+Rate\s*[:\-]?\s*([\d.]+)\s*%?',
+    'term_years': r'Term\s*[:\-]?\s*(\d+)\s*(?:years?|yrs?)',
+    'monthly_payment': r'Monthly\s+Payment\s*[:\-]?\s*\$?([\d,]+\.?\d*)',
+    'property_tax': r'Property\s+Tax(?:es)?\s*[:\-]?\s*\$?([\d,]+\.?\d*)',
+    'insurance': r'Insurance\s*[:\-]?\s*\$?([\d,]+\.?\d*)',
+    'monthly_rent': r'(?:Monthly\s+)?Rent\s*[:\-]?\s*\$?([\d,]+\.?\d*)',
+}
+
+PATTERN_FLAGS = re.IGNORECASE | re.MULTILINE | re.DOTALL
+
+# Versión del extractor para el cache: el hash cambia solo al tocar cualquier patrón;
+# RESULT_SCHEMA_VERSION se sube a mano al cambiar el post-procesado o el JSON de salida
+RESULT_SCHEMA_VERSION = 1
+EXTRACTOR_VERSION = f"{RESULT_SCHEMA_VERSION}." + hashlib.sha256(
+    json.dumps(FIELD_PATTERNS, sort_keys=True).encode('utf-8')
+).hexdigest()[:12]
+
+# Lambda para la variante de cache de un motor: el modo seguro recorta matches largos y sus
+# resultados se cachean aparte; legacy y compiled dan el mismo resultado y comparten entradas
+cache_variant = lambda engine: '.safe' if engine == 'safe' else ''
+
+# Huella de cada patrón (patrón + flags) para re-extraer solo los campos cuyo patrón cambió
+pattern_fingerprint = lambda pattern: hashlib.sha256(f"{PATTERN_FLAGS}\0{pattern}".encode('utf-8')).hexdigest()[:12]
+FIELD_FINGERPRINTS = {key: pattern_fingerprint(pattern) for key, pattern in FIELD_PATTERNS.items()}
+
+# Patrones compilados una sola vez al importar
+COMPILED_PATTERNS = {key: re.compile(pattern, PATTERN_FLAGS) for key, pattern in FIELD_PATTERNS.items()}
+
+# Palabra con la que empieza cualquier match de cada campo
+FIELD_ANCHORS = {
+    'loan_number': ('loan',),
+    'loan_amount': ('loan',),
+    'lender_name': ('from',),
+    'borrower_name': ('to',),
+    'property_address': ('property',),
+    'property_type': ('property',),
+    'purchase_price': ('purchase',),
+    'closing_date': ('closing',),
+    'interest_rate': ('interest',),
+    'term_years': ('term',),
+    'monthly_payment': ('monthly',),
+    'property_tax': ('property',),
+    'insurance': ('insurance',),
+    'monthly_rent': ('monthly', 'rent'),
+}
+
+# Grupos del JSON de salida -> campos que necesita cada uno (en orden de salida)
+FIELD_GROUPS = {
+    'loan': ('loan_number', 'loan_amount', 'interest_rate', 'term_years', 'monthly_payment'),
+    'lender': ('lender_name',),
+    'borrower': ('borrower_name',),
+    'property': ('property_address', 'property_type'),
+    'financial': ('purchase_price', 'closing_date'),
+    'taxes': ('property_tax',),
+    'insurance': ('insurance',),
+    'lease': ('monthly_rent',),
+}
+
+# Ancla -> campos que pueden empezar en ella (en el orden de FIELD_PATTERNS)
+ANCHOR_FIELDS = {
+    anchor: tuple(key for key in FIELD_PATTERNS if anchor in FIELD_ANCHORS[key])
+    for anchor in dict.fromkeys(a for anchors in FIELD_ANCHORS.values() for a in anchors)
+}
+
+# Máximo de caracteres que puede abarcar el match de cada campo en modo seguro
+# (cada intento se corta ahí, así que un patrón sin terminador no recorre todo el texto)
+FIELD_MAX_SPAN = {
+    'loan_number': 80,
+    'loan_amount': 80,
+    'lender_name': 400,
+    'borrower_name': 400,
+    'property_address': 300,
+    'property_type': 200,
+    'purchase_price': 80,
+    'closing_date': 80,
+    'interest_rate': 80,
+    'term_years': 80,
+    'monthly_payment': 80,
+    'property_tax': 80,
+    'insurance': 80,
+    'monthly_rent': 80,
+}
+
+# Tiempo máximo acumulado en regex por campo en modo seguro
+DEFAULT_FIELD_BUDGET_MS = 50.0
+
+# Orden de evaluación con plazo (--deadline-ms): primero importe y tipo del préstamo y
+# la dirección; _debug va siempre al final
+GROUP_PRIORITY = ('loan', 'property', 'financial', 'taxes', 'insurance', 'lease', 'lender', 'borrower')
+
+# Por debajo de este tamaño (texto normalizado) repartir un documento entre procesos no compensa el IPC
+PARALLEL_MIN_CHARS = 100_000
+
+# Con plazo el texto se normaliza en bloques de este tamaño (el plazo se comprueba entre bloques)
+NORMALIZE_WINDOW_CHARS = 262_144
+
+# partition_fields estima el coste de cada campo contando anclas solo en este prefijo del texto
+PARTITION_SAMPLE_CHARS = 200_000
+
+# Escáner de anclas de respaldo (respeta el case folding completo de re.IGNORECASE)
+ANCHOR_SCANNER = re.compile(
+    '(?=[' + ''.join(dict.fromkeys(anchor[0] for anchor in ANCHOR_FIELDS)) + '])(?:'
+    + '|'.join(f'(?P<{anchor}>{anchor})' for anchor in ANCHOR_FIELDS) + ')',
+    re.IGNORECASE
+)
+
+# Únicos caracteres que re.IGNORECASE iguala a letras de las anclas y que
+# str.lower() no convierte a esas letras (İ además cambia la longitud)
+CASE_FOLD_EXCEPTIONS = re.compile('[\u0130\u0131\u017f]')
+
+def fields_for_groups(groups: Optional[Iterable[str]] = None) -> Tuple[str, ...]:
+    """Campos necesarios para los grupos pedidos (todos si groups es None)"""
+    if groups is None:
+        return tuple(FIELD_PATTERNS)
+    unknown = [group for group in groups if group not in FIELD_GROUPS]
+    if unknown:
+        raise ValueError(f"Unknown field groups: {', '.join(unknown)} (valid: {', '.join(FIELD_GROUPS)})")
+    return tuple(key for group in groups for key in FIELD_GROUPS[group])
+
+# Lambda para las anclas que necesitan unos campos
+anchors_for = lambda keys: {anchor for key in keys for anchor in FIELD_ANCHORS[key]}
+
+def iter_anchor_positions(text: str, anchors: Optional[Iterable[str]] = None) -> Iterator[Tuple[int, str]]:
+    """Recorre en orden las posiciones donde empieza alguna palabra ancla (de anchors, o todas)"""
+    anchors = ANCHOR_FIELDS if anchors is None else set(anchors)
+    if CASE_FOLD_EXCEPTIONS.search(text):
+        return (
+            (match.start(), match.lastgroup)
+            for match in ANCHOR_SCANNER.finditer(text)
+            if match.lastgroup in anchors
+        )
+
+    # Sin esos caracteres basta con buscar sobre el texto en minúsculas (str.find es mucho más rápido)
+    lowered = text.lower()
+
+    def positions(anchor: str) -> Iterator[Tuple[int, str]]:
+        pos = lowered.find(anchor)
+        while pos != -1:
+            yield pos, anchor
+            pos = lowered.find(anchor, pos + 1)
+
+    return heapq.merge(*(positions(anchor) for anchor in anchors))
+
+class ExtractionMetrics:
+    """
+    Instrumentación opcional de una extracción: tiempo de normalización,
+    tiempo total y, por campo, tiempo en regex, intentos y span del match
+    """
+
+    def __init__(self):
+        self.normalize_ms = 0.0
+        self.scan_ms = 0.0
+        self.fields = {key: {"time_ms": 0.0, "attempts": 0, "matched": False, "span": None} for key in FIELD_PATTERNS}
+
+    def record(self, key: str, elapsed: float, match: Optional[re.Match]) -> None:
+        field = self.fields[key]
+        field["time_ms"] += elapsed * 1000
+        field["attempts"] += 1
+        if match:
+            field["matched"], field["span"] = True, list(match.span(1))
+
+    def as_dict(self, total_ms: float, cache_hit: bool = False) -> Dict[str, Any]:
+        return {
+            "total_ms": round(total_ms, 4),
+            "normalize_ms": round(self.normalize_ms, 4),
+            "scan_ms": round(self.scan_ms, 4),
+            "cache_hit": cache_hit,
+            "fields": {
+                key: {**field, "time_ms": round(field["time_ms"], 4)}
+                for key, field in self.fields.items()
+            },
+        }
+
+def scan_fields(text: str, found: Optional[Dict[str, str]] = None,
+                defer_from: Optional[int] = None,
+                metrics: Optional[ExtractionMetrics] = None,
+                keys: Sequence[str] = tuple(FIELD_PATTERNS)) -> Dict[str, Optional[str]]:
+    """
+    Busca todos los campos en una sola pasada sobre el texto.
+
+    Cada patrón solo se prueba en las posiciones donde aparece su palabra
+    ancla; la primera posición que hace match es la misma que devolvería
+    re.search, así que el resultado es idéntico a la ruta por campo.
+
+    found acumula campos ya resueltos (no se vuelven a buscar). Con defer_from,
+    un campo cuyo match empieza en esa posición o después queda sin resolver
+    para reintentarlo con más contexto (ventana siguiente en modo streaming).
+    Con metrics se mide cada intento de match por campo. keys limita la
+    búsqueda a esos campos (y a sus anclas).
+    """
+    found = {} if found is None else found
+    deferred = set()
+    wanted = set(keys)
+    started = time.perf_counter()
+    for pos, anchor in iter_anchor_positions(text, anchors_for(wanted)):
+        for key in ANCHOR_FIELDS[anchor]:
+            if key in found or key in deferred or key not in wanted:
+                continue
+            if metrics is None:
+                match = COMPILED_PATTERNS[key].match(text, pos)
+            else:
+                match_started = time.perf_counter()
+                match = COMPILED_PATTERNS[key].match(text, pos)
+                metrics.record(key, time.perf_counter() - match_started, match)
+            if not match:
+                continue
+            if defer_from is not None and pos >= defer_from:
+                deferred.add(key)
+            else:
+                found[key] = clean_whitespace(match.group(1))
+        if len(wanted.intersection(found)) + len(deferred) == len(wanted):
+            break
+    if metrics is not None:
+        metrics.scan_ms += (time.perf_counter() - started) * 1000
+    return {key: found.get(key) for key in keys}
+
+def scan_fields_safe(text: str, budget_ms: float = DEFAULT_FIELD_BUDGET_MS,
+                     metrics: Optional[ExtractionMetrics] = None,
+                     keys: Sequence[str] = tuple(FIELD_PATTERNS)) -> Tuple[Dict[str, Optional[str]], List[str]]:
+    """
+    Variante acotada de scan_fields para documentos problemáticos.
+
+    Cada patrón solo se ejecuta donde aparece su palabra ancla y cada intento
+    se limita a FIELD_MAX_SPAN caracteres desde ahí. Si un campo agota su
+    presupuesto de tiempo deja de buscarse y se devuelve como timed out,
+    sin perder el resto de campos.
+    """
+    found: Dict[str, str] = {}
+    wanted = set(keys)
+    spent = dict.fromkeys(keys, 0.0)
+    timed_out: List[str] = []
+    budget = budget_ms / 1000
+    started = time.perf_counter()
+    for pos, anchor in iter_anchor_positions(text, anchors_for(wanted)):
+        for key in ANCHOR_FIELDS[anchor]:
+            if key in found or key in timed_out or key not in wanted:
+                continue
+            match_started = time.perf_counter()
+            match = COMPILED_PATTERNS[key].match(text, pos, pos + FIELD_MAX_SPAN[key])
+            elapsed = time.perf_counter() - match_started
+            if metrics is not None:
+                metrics.record(key, elapsed, match)
+            if match:
+                found[key] = clean_whitespace(match.group(1))
+                continue
+            spent[key] += elapsed
+            if spent[key] > budget:
+                timed_out.append(key)
+        if len(found) + len(timed_out) == len(wanted):
+            break
+    if metrics is not None:
+        metrics.scan_ms += (time.perf_counter() - started) * 1000
+    return {key: found.get(key) for key in keys}, timed_out
+
+def partition_fields(text: str, keys: Sequence[str], parts: int) -> List[Tuple[str, ...]]:
+    """
+    Reparte los campos en como mucho `parts` grupos de coste parecido.
+
+    Los campos que comparten ancla van juntos (se recorren las mismas
+    posiciones una sola vez); el coste estimado de cada bloque es el número
+    de apariciones de sus anclas en los primeros PARTITION_SAMPLE_CHARS
+    caracteres por el de campos, así que el coste en el padre no crece con
+    el documento. Mismo texto, mismo reparto.
+    """
+    sample = text[:PARTITION_SAMPLE_CHARS].lower()
+    blocks: List[List[str]] = []
+    for key in keys:
+        joined = [block for block in blocks if anchors_for(block) & set(FIELD_ANCHORS[key])]
+        merged = [k for block in joined for k in block] + [key]
+        blocks = [block for block in blocks if block not in joined] + [merged]
+    # Lambda para el coste estimado de un bloque de campos
+    cost = lambda block: len(block) * (1 + sum(sample.count(anchor) for anchor in anchors_for(block)))
+    loads = [(0, index, []) for index in range(min(parts, len(blocks)))]
+    for block in sorted(blocks, key=cost, reverse=True):
+        load, index, assigned = min(loads)
+        loads[index] = (load + cost(block), index, assigned + block)
+    order = {key: position for position, key in enumerate(keys)}
+    return [tuple(sorted(assigned, key=order.get)) for _, _, assigned in loads if assigned]
+
+def scan_shared_fields(name: str, size: int, keys: Sequence[str]) -> Dict[str, Optional[str]]:
+    """
+    Worker de SharedTextScanner: lee el texto del bloque de memoria compartida y busca sus campos.
+
+    Los patrones son de str, así que cada worker decodifica su propia copia
+    del texto. Medido sobre un cierre de 3.5 MB: ~0.5 ms por MB al
+    decodificar frente a ~500 ms por MB de escaneo; escanear el buffer con
+    patrones de bytes evita la copia pero localizar las anclas sin
+    str.lower() lo hace unas cinco veces más lento.
+    """
+    shm = shared_memory.SharedMemory(name)
+    try:
+        with shm.buf[:size] as view:
+            text = str(view, 'utf-8')
+    finally:
+        shm.close()
+    return scan_fields(text, keys=keys)
+
+class SharedTextScanner:
+    """
+    Motor compilado repartido entre procesos para documentos muy grandes.
+
+    El texto normalizado se escribe una vez en multiprocessing.shared_memory
+    y cada worker lee de ahí su grupo de campos (ver partition_fields), así
+    que el texto no se serializa por tarea. Cada campo es independiente de
+    los demás en scan_fields, por lo que juntar los grupos da exactamente el
+    mismo resultado que la pasada serie; repartir por páginas no lo
+    garantizaría (un match puede cruzar el corte). Los textos de menos de
+    min_chars se escanean en el propio proceso.
+    """
+
+    def __init__(self, workers: Optional[int] = None, min_chars: int = PARALLEL_MIN_CHARS):
+        self.workers = workers or os.cpu_count() or 1
+        self.min_chars = min_chars
+        self.pool = None
+        # --serve --socket atiende cada conexión en su hilo: solo uno debe crear el pool
+        self.pool_lock = threading.Lock()
+
+    def __call__(self, text: str, keys: Sequence[str] = tuple(FIELD_PATTERNS)) -> Dict[str, Optional[str]]:
+        partitions = partition_fields(text, keys, self.workers) if len(text) >= self.min_chars and self.workers > 1 else []
+        if len(partitions) < 2:
+            return scan_fields(text, keys=keys)
+        data = text.encode('utf-8')
+        shm = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+        try:
+            shm.buf[:len(data)] = data
+            # El pool se crea después del primer bloque: así los workers heredan el resource_tracker del padre
+            with self.pool_lock:
+                if self.pool is None:
+                    self.pool = multiprocessing.Pool(self.workers)
+            # starmap devuelve los grupos en orden: la fusión no depende de qué worker acaba antes
+            found: Dict[str, Optional[str]] = {}
+            for partial in self.pool.starmap(scan_shared_fields, [(shm.name, len(data), part) for part in partitions]):
+                found.update(partial)
+        finally:
+            shm.close()
+            shm.unlink()
+        return {key: found[key] for key in keys}
+
+    def close(self) -> None:
+        with self.pool_lock:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool.join()
+                self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def normalize_until(text: str, deadline: float) -> Optional[str]:
+    """
+    normalize_text por bloques de NORMALIZE_WINDOW_CHARS (ver
+    iter_normalized_windows), comprobando el plazo entre uno y otro.
+    Devuelve None si el plazo se agota antes de terminar.
+    """
+    pieces = []
+    for piece in iter_normalized_windows(io.StringIO(text), NORMALIZE_WINDOW_CHARS):
+        if time.perf_counter() >= deadline:
+            return None
+        pieces.append(piece)
+    return ''.join(pieces)
+
+def iter_group_scan(text: str, deadline: float,
+                    groups: Sequence[str]) -> Iterator[Tuple[str, Dict[str, Optional[str]], List[str]]]:
+    """
+    Resuelve los campos de todos los grupos en una sola pasada con plazo.
+
+    En cada posición los campos se prueban en el orden de groups, y se
+    produce (grupo, valores, unresolved) en cuanto todos los campos de un
+    grupo tienen match y, al acabar el texto o llegar al plazo, los grupos
+    que faltan (también en ese orden). Mientras queda tiempo los valores son
+    los de scan_fields. El plazo se comprueba antes de cada intento de match
+    y, si se agota, los campos sin match de los grupos pendientes salen en
+    unresolved.
+    """
+    found: Dict[str, str] = {}
+    pending = list(groups)
+    rank = {key: index for index, group in enumerate(groups) for key in FIELD_GROUPS[group]}
+    wanted = set(rank)
+    anchor_keys = {
+        anchor: sorted((key for key in ANCHOR_FIELDS[anchor] if key in rank), key=rank.get)
+        for anchor in anchors_for(wanted)
+    }
+    timed_out = False
+    # Lambda para los valores de un grupo con lo encontrado hasta ahora
+    values_of = lambda group: {key: found.get(key) for key in FIELD_GROUPS[group]}
+
+    for pos, anchor in iter_anchor_positions(text, anchor_keys):
+        matched = False
+        for key in anchor_keys[anchor]:
+            if key in found:
+                continue
+            if time.perf_counter() >= deadline:
+                timed_out = True
+                break
+            match = COMPILED_PATTERNS[key].match(text, pos)
+            if match:
+                found[key] = clean_whitespace(match.group(1))
+                matched = True
+        if timed_out:
+            break
+        if matched:
+            for group in [group for group in pending if all(key in found for key in FIELD_GROUPS[group])]:
+                pending.remove(group)
+                yield group, values_of(group), []
+            if not pending:
+                return
+
+    for group in pending:
+        unresolved = [key for key in FIELD_GROUPS[group] if key not in found] if timed_out else []
+        yield group, values_of(group), unresolved
+
+def iter_progressive(text: str, deadline: float, fields: Optional[Iterable[str]] = None,
+                     debug: bool = False, normalized: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Extracción con plazo que entrega los grupos a medida que se resuelven.
+
+    El texto se normaliza por bloques y se recorre una sola vez para todos
+    los grupos de GROUP_PRIORITY (solo los de fields, si se pasa), con el
+    plazo comprobado entre bloques y antes de cada intento de match (ver
+    iter_group_scan). Produce un registro por grupo en cuanto se resuelve:
+    {"group", "data", "unresolved", "elapsed_ms"}, donde unresolved son los
+    campos (claves de FIELD_PATTERNS) que no se llegaron a evaluar; si el
+    plazo se agota al normalizar, todos los grupos salen vacíos con todos sus
+    campos en unresolved. Con debug y tiempo de
+    sobra sigue un registro {"group": "_debug"}, y el último es
+    {"done": true, "complete", "unresolved_fields", "elapsed_ms"}.
+    """
+    started = time.perf_counter()
+    groups = [group for group in GROUP_PRIORITY if fields is None or group in fields]
+    text = text if normalized else normalize_until(text, deadline)
+    # Lambda para los milisegundos desde el inicio
+    elapsed_ms = lambda: round((time.perf_counter() - started) * 1000, 3)
+
+    if text is None:
+        scanned = ((group, dict.fromkeys(FIELD_GROUPS[group]), list(FIELD_GROUPS[group])) for group in groups)
+    else:
+        scanned = iter_group_scan(text, deadline, groups)
+
+    extracted: Dict[str, Optional[str]] = {}
+    unresolved_fields: List[str] = []
+    for group, values, unresolved in scanned:
+        extracted.update(values)
+        unresolved_fields += unresolved
+        yield {
+            "group": group,
+            "data": ExtractionResult(values, (group,)).as_dict()[group],
+            "unresolved": unresolved,
+            "elapsed_ms": elapsed_ms(),
+        }
+
+    if debug and time.perf_counter() < deadline:
+        yield {
+            "group": "_debug",
+            "data": {
+                "text_length": len(text),
+                "text_sample": text[:500] + "..." if len(text) > 500 else text,
+                "extracted_fields": {key: value for key, value in extracted.items() if value},
+            },
+            "unresolved": [],
+            "elapsed_ms": elapsed_ms(),
+        }
+    yield {"done": True, "complete": not unresolved_fields, "unresolved_fields": unresolved_fields, "elapsed_ms": elapsed_ms()}
+
 def extract_with_context(text: str, pattern: str, group: int = 1) -> Optional[str]:
     """Extrae usando regex con contexto"""
-    match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE | re.DOTALL)
+    match = re.search(pattern, text, PATTERN_FLAGS)
     return clean_whitespace(match.group(group)) if match else None
 
+def search_fields(text: str, metrics: Optional[ExtractionMetrics] = None,
+                  keys: Sequence[str] = tuple(FIELD_PATTERNS)) -> Dict[str, Optional[str]]:
+    """Ruta original: un re.search por campo sobre todo el texto"""
+    if metrics is None:
+        return {key: extract_with_context(text, FIELD_PATTERNS[key]) for key in keys}
+
+    extracted = {}
+    started = time.perf_counter()
+    for key in keys:
+        pattern = FIELD_PATTERNS[key]
+        match_started = time.perf_counter()
+        match = re.search(pattern, text, PATTERN_FLAGS)
+        metrics.record(key, time.perf_counter() - match_started, match)
+        extracted[key] = clean_whitespace(match.group(1)) if match else None
+    metrics.scan_ms += (time.perf_counter() - started) * 1000
+    return extracted
+
 def parse_address_components(address_str: str) -> Dict[str, Optional[str]]:
     """Parsea dirección completa en componentes usando lambdas"""
     if not address_str:
@@ -59,93 +571,586 @@ def parse_address_components(address_str: str) -> Dict[str, Optional[str]]:
         'zip': None
     }
 
-def extract_data(text: str) -> Dict[str, Any]:
+def extract_data(text: str, engine: str = 'compiled', cache: Optional[ExtractionCache] = None,
+                 instrument: bool = False, field_budget_ms: float = DEFAULT_FIELD_BUDGET_MS,
+                 fields: Optional[Iterable[str]] = None, debug: Optional[bool] = None,
+                 normalized: bool = False,
+                 scanner: Optional[Callable[..., Dict[str, Optional[str]]]] = None) -> Dict[str, Any]:
     """
     Extrae datos del PDF usando técnicas modernas de Python
+
+    engine='legacy' usa la ruta original (un re.search por campo) para comparar;
+    engine='safe' acota cada campo (ver scan_fields_safe) y lista en
+    _debug.timed_out_fields los que agotaron field_budget_ms.
+    Con cache, un texto normalizado ya extraído con esta versión no se vuelve a procesar.
+    Con instrument, añade _debug.metrics (ver ExtractionMetrics).
+
+    fields limita la salida a esos grupos (p.ej. ['loan', 'taxes']) y solo
+    evalúa sus patrones. _debug se construye por defecto en la extracción
+    completa y no con fields, salvo que se pida con debug=True.
+    Con normalized, text ya viene de normalize_text y no se vuelve a normalizar.
+    scanner sustituye a scan_fields en el motor compilado sin instrumentar
+    (p.ej. un SharedTextScanner); su resultado es el mismo.
     """
+    started = time.perf_counter()
+    groups = tuple(fields) if fields is not None else None
+    keys = fields_for_groups(groups)
+    debug = (groups is None) if debug is None else debug
+    metrics = ExtractionMetrics() if instrument else None
+    if metrics is not None:
+        debug = True
+
     # Normalizar texto
-    text = normalize_text(text)
-    
-    # Patrones de extracción usando dict comprehension
-    patterns = {
-        'loan_number': r'Loan\s+No\.?\s*[:\-]?\s*(\d+)',
-        'loan_amount': r'Loan\s+Amount\s+of\s+\$?([\d,]+\.?\d*)',
-        'lender_name': r'from\s+([^(]+?)\s*\((?:â€œ)?Lender',
-        'borrower_name': r'to\s+([^(]+?)\s*\((?:â€œ)?Borrower',
-        'property_address': r'Property\s+(?:Address|Location)\s*[:\-]?\s*([^\n]+?)(?=\n|$)',
-        'property_type': r'Property\s+Type\s*[:\-]?\s*([^\n]+)',
-        'purchase_price': r'Purchase\s+Price\s*[:\-]?\s*\$?([\d,]+\.?\d*)',
-        'closing_date': r'Closing\s+Date\s*[:\-]?\s*(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4})',
-        'interest_rate': r'Interest\s+Rate\s*[:\-]?\s*([\d.]+)\s*%?',
-        'term_years': r'Term\s*[:\-]?\s*(\d+)\s*(?:years?|yrs?)',
-        'monthly_payment': r'Monthly\s+Payment\s*[:\-]?\s*\$?([\d,]+\.?\d*)',
-        'property_tax': r'Property\s+Tax(?:es)?\s*[:\-]?\s*\$?([\d,]+\.?\d*)',
-        'insurance': r'Insurance\s*[:\-]?\s*\$?([\d,]+\.?\d*)',
-        'monthly_rent': r'(?:Monthly\s+)?Rent\s*[:\-]?\s*\$?([\d,]+\.?\d*)',
-    }
-    
-    # Extraer todos los campos usando dict comprehension
-    extracted = {
-        key: extract_with_context(text, pattern)
-        for key, pattern in patterns.items()
-    }
+    text = text if normalized else normalize_text(text)
+    if metrics is not None:
+        metrics.normalize_ms = (time.perf_counter() - started) * 1000
+
+    # El cache guarda extracciones completas; de ahí se sirven también los subconjuntos
+    cached = cache.get(text, cache_variant(engine)) if cache is not None else None
+    if cached is not None and (not debug or "_debug" in cached):
+        result = {group: cached[group] for group in (groups or FIELD_GROUPS)}
+        if debug:
+            result["_debug"] = cached["_debug"]
+        if metrics is not None:
+            result["_debug"]["metrics"] = metrics.as_dict((time.perf_counter() - started) * 1000, cache_hit=True)
+        return result
     
-    # Parsear dirección en componentes
-    addr_components = parse_address_components(extracted.get('property_address', ''))
+    # Extraer los campos (motor compilado de una pasada, acotado o ruta por campo)
+    timed_out: List[str] = []
+    if engine == 'legacy':
+        extracted = search_fields(text, metrics, keys)
+    elif engine == 'safe':
+        extracted, timed_out = scan_fields_safe(text, field_budget_ms, metrics, keys)
+    elif scanner is not None and metrics is None:
+        extracted = scanner(text, keys=keys)
+    else:
+        extracted = scan_fields(text, metrics=metrics, keys=keys)
     
-    # Construir JSON estructurado usando dict comprehension y lambdas
-    return {
-        "loan": {
-            "number": extracted.get('loan_number'),
-            "amount": parse_currency(extracted.get('loan_amount')),
-            "interest_rate": parse_percentage(extracted.get('interest_rate')),
-            "term_years": parse_int(extracted.get('term_years')),
-            "monthly_payment": parse_currency(extracted.get('monthly_payment')),
-        },
-        "lender": {
-            "name": extracted.get('lender_name'),
-        },
-        "borrower": {
-            "name": extracted.get('borrower_name'),
-        },
-        "property": {
-            "full_address": extracted.get('property_address'),
-            "address": addr_components['address'],
-            "city": addr_components['city'],
-            "state": addr_components['state'],
-            "zip": addr_components['zip'],
-            "type": extracted.get('property_type'),
-        },
-        "financial": {
-            "purchase_price": parse_currency(extracted.get('purchase_price')),
-            "closing_date": extracted.get('closing_date'),
-        },
-        "taxes": {
-            "annual_amount": parse_currency(extracted.get('property_tax')),
-        },
-        "insurance": {
-            "annual_premium": parse_currency(extracted.get('insurance')),
-        },
-        "lease": {
-            "monthly_rent": parse_currency(extracted.get('monthly_rent')),
-        },
-        "_debug": {
-            "text_length": len(text),
-            "text_sample": text[:500] + "..." if len(text) > 500 else text,
+    result = build_result(
+        extracted,
+        len(text),
+        (text[:500] + "..." if len(text) > 500 else text) if debug else '',
+        groups,
+        debug
+    )
+    if engine == 'safe' and debug:
+        result["_debug"]["timed_out_fields"] = timed_out
+    # Un resultado con campos cortados por tiempo no es determinista: no se cachea
+    if cache is not None and groups is None and not timed_out:
+        cache.put(text, result, cache_variant(engine))
+    if metrics is not None:
+        result["_debug"]["metrics"] = metrics.as_dict((time.perf_counter() - started) * 1000)
+    return result
+
+# Grupo del JSON -> (clave de salida, atributo de ExtractionResult), en orden de salida
+RESULT_LAYOUT = {
+    "loan": (
+        ("number", "loan_number"),
+        ("amount", "loan_amount"),
+        ("interest_rate", "loan_interest_rate"),
+        ("term_years", "loan_term_years"),
+        ("monthly_payment", "loan_monthly_payment"),
+    ),
+    "lender": (("name", "lender_name"),),
+    "borrower": (("name", "borrower_name"),),
+    "property": (
+        ("full_address", "property_full_address"),
+        ("address", "property_address"),
+        ("city", "property_city"),
+        ("state", "property_state"),
+        ("zip", "property_zip"),
+        ("type", "property_type"),
+    ),
+    "financial": (
+        ("purchase_price", "purchase_price"),
+        ("closing_date", "closing_date"),
+    ),
+    "taxes": (("annual_amount", "tax_annual_amount"),),
+    "insurance": (("annual_premium", "insurance_annual_premium"),),
+    "lease": (("monthly_rent", "monthly_rent"),),
+}
+
+class ExtractionResult:
+    """
+    Resultado tipado de una extracción, con __slots__ y sin dicts intermedios.
+
+    Solo se parsean los grupos pedidos (los demás atributos quedan en None);
+    as_dict() construye el JSON de salida al serializar.
+    """
+
+    __slots__ = ('groups',) + tuple(attr for layout in RESULT_LAYOUT.values() for _, attr in layout)
+
+    groups: Tuple[str, ...]
+    loan_number: Optional[str]
+    loan_amount: Optional[float]
+    loan_interest_rate: Optional[float]
+    loan_term_years: Optional[int]
+    loan_monthly_payment: Optional[float]
+    lender_name: Optional[str]
+    borrower_name: Optional[str]
+    property_full_address: Optional[str]
+    property_address: Optional[str]
+    property_city: Optional[str]
+    property_state: Optional[str]
+    property_zip: Optional[str]
+    property_type: Optional[str]
+    purchase_price: Optional[float]
+    closing_date: Optional[str]
+    tax_annual_amount: Optional[float]
+    insurance_annual_premium: Optional[float]
+    monthly_rent: Optional[float]
+
+    def __init__(self, extracted: Dict[str, Optional[str]], groups: Optional[Sequence[str]] = None):
+        self.groups = tuple(groups or FIELD_GROUPS)
+        for attr in self.__slots__[1:]:
+            setattr(self, attr, None)
+        get = extracted.get
+        wanted = self.groups
+
+        if 'loan' in wanted:
+            self.loan_number = get('loan_number')
+            self.loan_amount = parse_currency(get('loan_amount'))
+            self.loan_interest_rate = parse_percentage(get('interest_rate'))
+            self.loan_term_years = parse_int(get('term_years'))
+            self.loan_monthly_payment = parse_currency(get('monthly_payment'))
+        if 'lender' in wanted:
+            self.lender_name = get('lender_name')
+        if 'borrower' in wanted:
+            self.borrower_name = get('borrower_name')
+        if 'property' in wanted:
+            # Parsear dirección en componentes
+            addr_components = parse_address_components(get('property_address', ''))
+            self.property_full_address = get('property_address')
+            self.property_address = addr_components['address']
+            self.property_city = addr_components['city']
+            self.property_state = addr_components['state']
+            self.property_zip = addr_components['zip']
+            self.property_type = get('property_type')
+        if 'financial' in wanted:
+            self.purchase_price = parse_currency(get('purchase_price'))
+            self.closing_date = get('closing_date')
+        if 'taxes' in wanted:
+            self.tax_annual_amount = parse_currency(get('property_tax'))
+        if 'insurance' in wanted:
+            self.insurance_annual_premium = parse_currency(get('insurance'))
+        if 'lease' in wanted:
+            self.monthly_rent = parse_currency(get('monthly_rent'))
+
+    def as_dict(self) -> Dict[str, Any]:
+        """JSON de salida de los grupos pedidos (mismo formato que build_result)"""
+        return {
+            group: {key: getattr(self, attr) for key, attr in RESULT_LAYOUT[group]}
+            for group in self.groups
+        }
+
+def build_result(extracted: Dict[str, Optional[str]], text_length: int, text_sample: str,
+                 groups: Optional[Sequence[str]] = None, debug: bool = True) -> Dict[str, Any]:
+    """Construye el JSON estructurado a partir de los campos extraídos (solo los grupos pedidos)"""
+    result = ExtractionResult(extracted, groups).as_dict()
+    if debug:
+        result["_debug"] = {
+            "text_length": text_length,
+            "text_sample": text_sample,
             "extracted_fields": {k: v for k, v in extracted.items() if v}
         }
-    }
+    return result
+
+# Formatos de salida: pretty (JSON indentado, el de siempre), compact (JSON
+# minificado en UTF-8) y msgpack (binario, requiere el paquete msgpack)
+OUTPUT_FORMATS = ('pretty', 'compact', 'msgpack')
+
+def encode_result(result: Any, output_format: str = 'pretty') -> bytes:
+    """Serializa un resultado (o respuesta) para enviarlo al proceso padre"""
+    if output_format == 'msgpack':
+        import msgpack
+        return msgpack.packb(result, use_bin_type=True)
+    if output_format == 'compact':
+        return json.dumps(result, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return json.dumps(result, ensure_ascii=True, indent=2).encode('utf-8')
+
+def write_result(result: Any, output_format: str = 'pretty', writer=None) -> None:
+    """Escribe un resultado en stdout (binario) en el formato pedido; los JSON terminan en salto de línea"""
+    writer = writer or sys.stdout.buffer
+    data = encode_result(result, output_format)
+    writer.write(data if output_format == 'msgpack' else data + b'\n')
+    writer.flush()
+
+def trailing_break_start(raw: str) -> int:
+    """
+    Inicio de la cola de guiones/espacios (lo que casaría [\s-]*\Z) al final
+    de un bloque: se pasa al bloque siguiente para que remove_line_breaks y
+    el colapso de espacios nunca corten un tramo. Se recorre desde el final
+    (str.isspace es el mismo criterio que \s): con re.search el coste
+    crecería con el bloque entero.
+    """
+    cut = len(raw)
+    while cut and (raw[cut - 1] == '-' or raw[cut - 1].isspace()):
+        cut -= 1
+    return cut
+
+def iter_normalized_windows(reader: TextIO, window_size: int) -> Iterator[str]:
+    """
+    Lee el texto por bloques de window_size caracteres y los devuelve
+    normalizados; concatenados equivalen a normalize_text del texto completo
+    """
+    pending = ''
+    first = True
+    while True:
+        chunk = reader.read(window_size)
+        if not chunk:
+            break
+        raw = pending + clean_input(chunk)
+        cut = trailing_break_start(raw)
+        raw, pending = raw[:cut], raw[cut:]
+        if not raw:
+            continue
+        piece = collapse_whitespace(remove_line_breaks(raw))
+        if first:
+            piece, first = piece.lstrip(), False
+        yield piece
+
+    last_piece = collapse_whitespace(remove_line_breaks(pending))
+    last_piece = last_piece.strip() if first else last_piece.rstrip()
+    if last_piece:
+        yield last_piece
+
+def extract_stream(reader: TextIO, window_size: int = 65536, overlap: int = 4096,
+                   fields: Optional[Iterable[str]] = None, debug: Optional[bool] = None) -> Dict[str, Any]:
+    """
+    Extrae datos leyendo el texto por ventanas solapadas, con memoria acotada.
+
+    Cada ventana es la cola de la anterior (overlap caracteres normalizados)
+    más el bloque nuevo. Un campo cuyo match empieza en esa cola se aplaza a la
+    ventana siguiente, así que los campos de hasta overlap caracteres salen
+    igual que con extract_data; los más largos se recortan a la ventana.
+    Deja de leer en cuanto todos los campos (o los de fields) están resueltos.
+    """
+    groups = tuple(fields) if fields is not None else None
+    keys = fields_for_groups(groups)
+    debug = (groups is None) if debug is None else debug
+    found: Dict[str, str] = {}
+    carry = ''
+    sample = ''
+    text_length = 0
+    windows_read = 0
+
+    windows = iter_normalized_windows(reader, window_size)
+    piece = next(windows, None)
+    while piece is not None:
+        # Leer un bloque por adelantado para saber si esta es la última ventana
+        next_piece = next(windows, None)
+        final = next_piece is None
+
+        window = carry + piece
+        windows_read += 1
+        text_length += len(piece)
+        if len(sample) <= 500:
+            sample += piece[:501 - len(sample)]
+
+        tail_start = max(0, len(window) - overlap)
+        scan_fields(window, found, None if final else tail_start, keys=keys)
+        if len(found) == len(keys):
+            break
+
+        carry = window[tail_start:]
+        piece = next_piece
+
+    extracted = {key: found.get(key) for key in keys}
+    result = build_result(extracted, text_length, sample[:500] + "..." if len(sample) > 500 else sample, groups, debug)
+    if debug:
+        result["_debug"]["streaming"] = {
+            "windows": windows_read,
+            "stopped_early": piece is not None and next_piece is not None,
+        }
+    return result
+
+def emit_metrics(result: Dict[str, Any], sink: TextIO, **labels) -> None:
+    """Saca _debug.metrics del resultado y lo escribe como una línea JSON en sink (p.ej. stderr)"""
+    metrics = result.get("_debug", {}).pop("metrics", None)
+    if metrics is not None:
+        sink.write(json.dumps({"type": "metrics", **labels, **metrics}, ensure_ascii=True) + '\n')
+        sink.flush()
+
+def handle_request(line: str, extractor: Callable[[str], Dict[str, Any]] = extract_data,
+                   metrics_sink: Optional[TextIO] = None) -> Dict[str, Any]:
+    """
+    Procesa una petición NDJSON {"id": ..., "text": ..., "fields"?: [...]} y
+    devuelve la respuesta con el mismo id (las métricas, si hay sink, van aparte)
+    """
+    try:
+        request = json.loads(line)
+    except json.JSONDecodeError as e:
+        return {"id": None, "ok": False, "error": f"Invalid JSON request: {e}"}
+
+    if not isinstance(request, dict):
+        return {"id": None, "ok": False, "error": "Request must be a JSON object"}
+
+    request_id = request.get('id')
+    text = request.get('text')
+    if not isinstance(text, str):
+        return {"id": request_id, "ok": False, "error": "Missing 'text' field"}
+
+    fields = request.get('fields')
+    if fields is not None and not (isinstance(fields, list) and all(isinstance(f, str) for f in fields)):
+        return {"id": request_id, "ok": False, "error": "'fields' must be a list of group names"}
+
+    try:
+        result = extractor(clean_input(text)) if fields is None else extractor(clean_input(text), fields=fields)
+    except Exception as e:
+        return {"id": request_id, "ok": False, "error": str(e)}
+
+    if metrics_sink is not None:
+        emit_metrics(result, metrics_sink, id=request_id)
+    return {"id": request_id, "ok": True, "result": result}
+
+def serve_stream(reader, writer, extractor: Callable[[str], Dict[str, Any]] = extract_data,
+                 metrics_sink: Optional[TextIO] = None) -> None:
+    """Atiende peticiones NDJSON línea a línea hasta EOF (una respuesta por línea)"""
+    for line in reader:
+        if not line.strip():
+            continue
+        writer.write(json.dumps(handle_request(line, extractor, metrics_sink), ensure_ascii=True) + '\n')
+        writer.flush()
+
+class ExtractionRequestHandler(socketserver.StreamRequestHandler):
+    """Handler de conexión para el modo worker sobre Unix socket"""
+    extractor = staticmethod(extract_data)
+    metrics_sink: Optional[TextIO] = None
+
+    def handle(self):
+        reader = io.TextIOWrapper(self.rfile, encoding='utf-8', errors='ignore')
+        writer = io.TextIOWrapper(self.wfile, encoding='utf-8', write_through=True)
+        serve_stream(reader, writer, self.extractor, self.metrics_sink)
+
+def serve_socket(socket_path: str, extractor: Callable[[str], Dict[str, Any]] = extract_data,
+                 metrics_sink: Optional[TextIO] = None) -> None:
+    """Worker persistente escuchando NDJSON en un Unix socket"""
+    handler = type('Handler', (ExtractionRequestHandler,), {
+        'extractor': staticmethod(extractor),
+        'metrics_sink': metrics_sink,
+    })
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    # PM2/Node terminan el worker con SIGTERM: salir limpio para borrar el socket
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    with socketserver.ThreadingUnixStreamServer(socket_path, handler) as server:
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(socket_path)
+
+def load_document_text(path: str) -> str:
+    """Lee el texto de un documento: JSON procesado (raw_text) o texto plano"""
+    if path.endswith('.json'):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f).get('raw_text') or ''
+    with open(path, encoding='utf-8', errors='ignore') as f:
+        return f.read()
+
+def collect_batch_paths(source: str) -> List[str]:
+    """
+    Documentos a procesar: si source es un directorio, todos los .txt y los
+    processed/*.json que contiene; si no, un manifiesto con una ruta por línea
+    """
+    if os.path.isdir(source):
+        return sorted(
+            os.path.join(root, name)
+            for root, _, files in os.walk(source)
+            for name in files
+            if name.endswith('.txt') or (name.endswith('.json') and os.path.basename(root) == 'processed')
+        )
+
+    # Las rutas relativas del manifiesto son relativas al propio manifiesto
+    base_dir = os.path.dirname(source)
+    with open(source, encoding='utf-8') as f:
+        return [
+            os.path.join(base_dir, line.strip())
+            for line in f
+            if line.strip() and not line.lstrip().startswith('#')
+        ]
+
+def process_document(path: str, extractor: Callable[[str], Dict[str, Any]] = extract_data) -> Dict[str, Any]:
+    """Extrae un documento del lote y devuelve su registro con tiempo o error"""
+    started = time.perf_counter()
+    try:
+        record = {"path": path, "ok": True, "result": extractor(clean_input(load_document_text(path)))}
+    except Exception as e:
+        record = {"path": path, "ok": False, "error": f"{type(e).__name__}: {e}"}
+    record["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+    # Con instrumentación, las métricas van al nivel del registro para agregarlas en run_batch
+    metrics = record.get("result", {}).get("_debug", {}).pop("metrics", None)
+    if metrics is not None:
+        record["metrics"] = metrics
+    return record
+
+def slowest_patterns(totals: Dict[str, Dict[str, Any]], limit: int = 10) -> List[Dict[str, Any]]:
+    """Informe de los patrones más lentos a partir de los totales agregados del lote"""
+    report = [
+        {
+            "field": key,
+            "total_ms": round(total["time_ms"], 3),
+            "mean_ms": round(total["time_ms"] / total["documents"], 4),
+            "max_ms": round(total["max_ms"], 4),
+            "max_path": total["max_path"],
+            "attempts": total["attempts"],
+            "matched_documents": total["matched"],
+        }
+        for key, total in totals.items()
+    ]
+    return sorted(report, key=lambda row: row["total_ms"], reverse=True)[:limit]
+
+def run_batch(paths: List[str], writer: TextIO, workers: Optional[int] = None,
+              extractor: Callable[[str], Dict[str, Any]] = extract_data) -> Dict[str, Any]:
+    """
+    Reparte los documentos en un pool de procesos y escribe un registro
+    JSON Lines por documento en orden de finalización
+    """
+    started = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    stats = {"total": len(paths), "ok": 0, "errors": 0}
+    totals = defaultdict(lambda: {"time_ms": 0.0, "max_ms": 0.0, "max_path": None, "attempts": 0, "matched": 0, "documents": 0})
+
+    # Lotes pequeños para repartir bien la carga sin pagar IPC por cada documento
+    chunksize = max(1, len(paths) // (workers * 32))
+    with multiprocessing.Pool(workers) as pool:
+        for record in pool.imap_unordered(functools.partial(process_document, extractor=extractor), paths, chunksize):
+            writer.write(json.dumps(record, ensure_ascii=True) + '\n')
+            stats["ok" if record["ok"] else "errors"] += 1
+            for key, field in record.get("metrics", {}).get("fields", {}).items():
+                total = totals[key]
+                total["time_ms"] += field["time_ms"]
+                total["attempts"] += field["attempts"]
+                total["matched"] += field["matched"]
+                total["documents"] += 1
+                if field["time_ms"] >= total["max_ms"]:
+                    total["max_ms"], total["max_path"] = field["time_ms"], record["path"]
+
+    elapsed = time.perf_counter() - started
+    stats["elapsed_s"] = round(elapsed, 3)
+    stats["docs_per_sec"] = round(len(paths) / elapsed, 2) if elapsed else None
+    if totals:
+        stats["slowest_patterns"] = slowest_patterns(totals)
+    return stats
 
 if __name__ == "__main__":
+    PROCESS_STARTED = time.perf_counter()
+    parser = argparse.ArgumentParser(description='Extrae datos de PDFs de cierre de propiedades')
+    parser.add_argument('--serve', action='store_true',
+                        help='Modo worker: lee peticiones NDJSON {"id", "text"} y responde una línea JSON por petición')
+    parser.add_argument('--socket', metavar='PATH',
+                        help='Con --serve, escucha en este Unix socket en lugar de stdin/stdout')
+    parser.add_argument('--engine', choices=('compiled', 'legacy', 'safe'), default='compiled',
+                        help='compiled: una sola pasada con patrones precompilados; legacy: un re.search por campo; '
+                             'safe: como compiled pero con span y tiempo acotados por campo')
+    parser.add_argument('--field-budget-ms', type=float, default=DEFAULT_FIELD_BUDGET_MS,
+                        help='Con --engine safe, tiempo máximo en regex por campo antes de marcarlo como timed out')
+    parser.add_argument('--batch', metavar='SOURCE',
+                        help='Procesa un directorio (.txt y processed/*.json) o un manifiesto con una ruta por línea')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Con --batch, número de procesos del pool (por defecto, todos los cores)')
+    parser.add_argument('--output', metavar='FILE',
+                        help='Con --batch, escribe el JSON Lines en este archivo en lugar de stdout')
+    parser.add_argument('--stream', action='store_true',
+                        help='Lee stdin por ventanas solapadas con memoria acotada y para al resolver todos los campos')
+    parser.add_argument('--window', type=int, default=65536,
+                        help='Con --stream, tamaño de cada bloque leído (caracteres)')
+    parser.add_argument('--overlap', type=int, default=4096,
+                        help='Con --stream, caracteres normalizados que se arrastran entre ventanas')
+    parser.add_argument('--cache', metavar='PATH',
+                        help='Cache sqlite en disco (texto normalizado + versión del extractor) compartido entre procesos')
+    parser.add_argument('--cache-max-mb', type=float, default=DEFAULT_MAX_BYTES / (1024 * 1024),
+                        help='Con --cache, tamaño máximo antes de desalojar por LRU')
+    parser.add_argument('--cache-stats', action='store_true',
+                        help='Con --cache, imprime entradas, bytes y aciertos/fallos y termina')
+    parser.add_argument('--metrics', choices=('debug', 'stderr'),
+                        help='Instrumentación por campo: en _debug.metrics o como una línea JSON por extracción en stderr '
+                             '(con --batch se agrega en un informe de patrones más lentos; no con --stream ni --deadline-ms)')
+    parser.add_argument('--parallel', type=int, default=None, metavar='N',
+                        help='Reparte los campos de un mismo documento entre N procesos (texto en memoria compartida); '
+                             f'solo para textos de al menos {PARALLEL_MIN_CHARS} caracteres y el motor compiled')
+    parser.add_argument('--deadline-ms', type=float, default=None,
+                        help='Plazo de la extracción: escribe un registro JSON Lines por grupo a medida que se resuelve '
+                             '(préstamo y dirección primero) y marca como unresolved los campos sin evaluar')
+    parser.add_argument('--fields', metavar='GROUPS',
+                        help=f"Grupos a extraer separados por coma (solo evalúa sus patrones): {','.join(FIELD_GROUPS)}")
+    parser.add_argument('--debug', action=argparse.BooleanOptionalAction, default=None,
+                        help='Incluye (o no) el bloque _debug; por defecto solo en la extracción completa con --format pretty')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='pretty',
+                        help='Salida del resultado: pretty (JSON indentado), compact (JSON minificado sin _debug) '
+                             'o msgpack (binario, requiere el paquete msgpack)')
+    args = parser.parse_args()
+
+    if args.format == 'msgpack':
+        try:
+            import msgpack  # noqa: F401
+        except ImportError:
+            parser.error('--format msgpack requires the msgpack package (pip install msgpack)')
+    # Los formatos de transporte omiten _debug salvo que se pida con --debug
+    debug = args.debug if args.debug is not None or args.format == 'pretty' else False
+
+    fields = [group for group in args.fields.split(',') if group] if args.fields else None
+    unknown = [group for group in fields or () if group not in FIELD_GROUPS]
+    if unknown:
+        parser.error(f"Unknown field groups: {', '.join(unknown)} (valid: {', '.join(FIELD_GROUPS)})")
+
+    cache = ExtractionCache(args.cache, EXTRACTOR_VERSION, int(args.cache_max_mb * 1024 * 1024)) if args.cache else None
+    if cache is not None:
+        # Los aciertos se guardan por lotes: se vacían también al salir (SIGTERM en --serve incluido)
+        atexit.register(cache.close)
+    if args.cache_stats:
+        print(json.dumps(cache.stats() if cache else {"error": "--cache-stats requires --cache"}, indent=2))
+        sys.exit(0 if cache else 2)
+
+    if args.deadline_ms is not None and (args.batch or args.stream or args.serve or args.cache or args.engine != 'compiled'):
+        parser.error('--deadline-ms only applies to single documents with --engine compiled (no --cache)')
+    if args.parallel is not None and (args.batch or args.stream or args.engine != 'compiled' or args.parallel < 1):
+        parser.error('--parallel N (N >= 1) only applies to single documents and --serve with --engine compiled')
+    if args.metrics and (args.stream or args.deadline_ms is not None):
+        parser.error('--metrics does not apply to --stream or --deadline-ms')
+    scanner = SharedTextScanner(args.parallel) if args.parallel else None
+
+    extractor = functools.partial(extract_data, engine=args.engine, cache=cache, instrument=bool(args.metrics),
+                                  field_budget_ms=args.field_budget_ms, fields=fields, debug=debug, scanner=scanner)
+    metrics_sink = sys.stderr if args.metrics == 'stderr' else None
+
     # Configurar stdout con manejo de errores
     sys.stdout.reconfigure(encoding='utf-8', errors='replace') if hasattr(sys.stdout, 'reconfigure') else None
-    
+
+    if args.serve:
+        sys.stdin.reconfigure(encoding='utf-8', errors='ignore') if hasattr(sys.stdin, 'reconfigure') else None
+        with scanner or contextlib.nullcontext():
+            serve_socket(args.socket, extractor, metrics_sink) if args.socket else serve_stream(sys.stdin, sys.stdout, extractor, metrics_sink)
+        sys.exit(0)
+
+    if args.batch:
+        paths = collect_batch_paths(args.batch)
+        with (open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout) as out:
+            stats = run_batch(paths, out, args.workers, extractor)
+        print(json.dumps(stats), file=sys.stderr)
+        sys.exit(1 if stats["errors"] else 0)
+
+    if args.stream:
+        sys.stdin.reconfigure(encoding='utf-8', errors='ignore') if hasattr(sys.stdin, 'reconfigure') else None
+        write_result(extract_stream(sys.stdin, args.window, args.overlap, fields, debug), args.format)
+        sys.exit(0)
+
     # Leer y limpiar texto
-    pdf_text = sys.stdin.read()
-    pdf_text = pdf_text.encode('utf-8', errors='ignore').decode('utf-8', errors='ignore')
+    pdf_text = clean_input(sys.stdin.read())
+
+    if args.deadline_ms is not None:
+        # El plazo cuenta desde el arranque del proceso; cada registro se escribe (y vacía) al resolverse
+        deadline = PROCESS_STARTED + args.deadline_ms / 1000
+        for record in iter_progressive(pdf_text, deadline, fields, fields is None if debug is None else debug):
+            write_result(record, 'msgpack' if args.format == 'msgpack' else 'compact')
+        sys.exit(0)
     
     # Extraer datos
-    result = extract_data(pdf_text)
+    result = extractor(pdf_text)
+    if scanner is not None:
+        scanner.close()
+    if metrics_sink is not None:
+        emit_metrics(result, metrics_sink)
     
-    # Imprimir JSON
-    print(json.dumps(result, ensure_ascii=True, indent=2))
\ No newline at end of file
+    # Imprimir JSON (o el formato de transporte pedido)
+    write_result(result, args.format)
\ No newline at end of file
@@ -1,97 +1,183 @@
 import re
 import json
 import sys
+import argparse
 
-def extract_data(text):
-    # Define regex patterns for each field
-    patterns = {
-        "owner_name": r"OWNER NAME\s*(.*)",
-        "owner_principal_address": r"OWNER PRINCIPAL ADDRESS\s*(.*)",
-        "owner_phone_number": r"OWNER PHONE NUMBER\s*(.*)",
-        "owner_email_address": r"OWNER EMAIL ADDRESS\s*(.*)",
-        "company_name": r"COMPANY NAME\s*(.*)",
-        "company_address": r"COMPANY ADDRESS\s*(.*)",
-        "company_phone_number": r"COMPANY PHONE NUMBER\s*(.*)",
-        "company_email_address": r"COMPANY EMAIL ADDRESS\s*(.*)",
-        "property_address": r"PROPERTY ADDRESS\s*(.*)",
-        "city": r"CITY\s*(.*)",
-        "state": r"STATE\s*(.*)",
-        "zip_code": r"ZIP CODE\s*(.*)",
-        "property_address_legal_description": r"PROPERTY ADDRESS LEGAL DESCRIPTION\s*(.*)",
-        "property_type": r"PROPERTY TYPE\s*(.*)",
-        "property_sqf": r"PROPERTY SQF\s*(.*)",
-        "construction_year": r"CONSTRUCTION YEAR\s*(.*)",
-        "property_owner": r"PROPERTY OWNER\s*(.*)",
-        "property_type_2": r"PROPERTY TYPE 2\s*(.*)",
-        "title_company": r"TITLE COMPANY\s*(.*)",
-        "title_company_contact": r"TITLE COMPANY CONTACT\s*(.*)",
-        "title_company_phone_number": r"TITLE COMPANY PHONE NUMBER\s*(.*)",
-        "title_company_email_address": r"TITLE COMPANY EMAIL ADDRESS\s*(.*)",
-        "purchase_price": r"PURCHASE PRICE / REFINANCE PRICE\s*(.*)",
-        "purchase_closing_date": r"PURCHASE/REFINANCE CLOSING DATE\s*(.*)",
-        "lender_mortgage_name": r"LENDER MORTGAGE NAME\s*(.*)",
-        "lender_mortgage_address": r"LENDER MORTGAGE ADDRESS\s*(.*)",
-        "lender_mortgage_phone": r"LENDER MORTGAGE PHONE\s*(.*)",
-        "lender_mortgage_web_page": r"LENDER MORTGAGE WEB PAGE\s*(.*)",
-        "mortgage_servicing_company": r"MORTGAGE SERVICING COMPANY\s*(.*)",
-        "mortgage_servicing_company_address": r"MORTGAGE SERVICING COMPANY ADDRESS\s*(.*)",
-        "mortgage_servicing_company_phone_number": r"MORTGAGE SERVICING COMPANY PHONE NUMBER\s*(.*)",
-        "lender_web_page": r"LENDER WEB PAGE\s*(.*)",
-        "loan_number": r"LOAN NUMBER\s*(.*)",
-        "loan_amount": r"LOAN AMOUNT\s*(.*)",
-        "interest_rate": r"INTEREST RATE\s*(.*)",
-        "term_years": r"TERM -YEARS\s*(.*)",
-        "monthly_payment_principal_interest": r"MONHLY PAYMENT PRICIPAL \+ INTEREST\s*(.*)",
-        "escrow_property_tax": r"ESCROW - PROPERTY TAX\s*(.*)",
-        "escrow_home_owner_insurance": r"ESCROW - HOME OWNER INSURANCE\s*(.*)",
-        "total_monthly_payment_piti": r"TOTAL MONTLY PAYMENT P.I.T.I\s*(.*)",
-        "home_owner_insurance_initial_escrow": r"HOME OWNER INSURANCE INITIAL ESCROW\s*(.*)",
-        "property_taxes_initial_escrow": r"PROPERTY TAXES INITIAL ESCROW\s*(.*)",
-        "first_payment_date": r"FIRST PAYMENT DATE\s*(.*)",
-        "pre_payment_penalty": r"PRE-PAYMENT PENALTY\s*(.*)",
-        "pre_payment_penalty_year_1": r"YEAR 1\s*(.*)",
-        "pre_payment_penalty_year_2": r"YEAR 2\s*(.*)",
-        "pre_payment_penalty_year_3": r"YEAR 3\s*(.*)",
-        "pre_payment_penalty_year_4": r"YEAR 4\s*(.*)",
-        "pre_payment_penalty_year_5": r"YEAR 5\s*(.*)",
-        "property_tax_county": r"PROPERTY TAX COUNTY\s*(.*)",
-        "tax_authority": r"TAX AUTHORITY\s*(.*)",
-        "tax_authority_web_page": r"TAX AUTHORITY WEB PAGE\s*(.*)",
-        "account_number": r"ACCOUNT NUMBER\s*(.*)",
-        "assesed_value": r"ASSESED VALUE\s*(.*)",
-        "taxes_paid_last_year": r"TAXES PAID LAST YEAR\s*(.*)",
-        "property_tax_percent": r"PROPERTY TAX %\s*(.*)",
-        "home_owner_insurance_initial_premium": r"HOME OWNER INSURANCE INITIAL PREMIUM\s*(.*)",
-        "insurance_company": r"INSURANCE COMPANY\s*(.*)",
-        "insurance_agent_name": r"INUSRARANCE AGENT NAME\s*(.*)",
-        "insurance_agent_contact": r"INSURANCE AGENT CONTACT\s*(.*)",
-        "insurance_agent_phone_number": r"INSURANCE AGENT PHONE NUMBER\s*(.*)",
-        "insurance_agent_email_address": r"INSURANCE AGENT EMAIL ADDRESS\s*(.*)",
-        "hoi_effective_date": r"H.O.I EFFECTIVE DATE\s*(.*)",
-        "hoi_expiration_date": r"H.O.I EXPIRATION DATE\s*(.*)",
-        "policy_number": r"POLICY NUMBER\s*(.*)",
-        "coverage_a_dwelling": r"COVERGAE A - DWELLING\s*(.*)",
-        "coverage_b_other_structures": r"COVERAGE B - OTHER STRUCTURES\s*(.*)",
-        "coverage_c_personal_property": r"COVERAGE C - PERSONAL PROPERTY\s*(.*)",
-        "coverage_d_fair_rental_value": r"COVERAGE D - FAIR RENTAL VALUE\s*(.*)",
-        "coverage_e_additional_living_expenses": r"COVERAGE E - ADDITIONAL LIVING EXPENSES\s*(.*)",
-        "initial_lease_tenant_name": r"INITIAL LEASE - TENANT NAME\s*(.*)",
-        "lease_effective_date": r"LEASE EFFCETIVE DATE\s*(.*)",
-        "lease_termination_date": r"LEASE TERMINATION DATE\s*(.*)",
-        "gross_monthly_income_rent": r"GROSS MONTHLY INCOME \(RENT\)\s*(.*)",
-        "property_management_percent": r"PROPERTY MANAGEMENT %\s*(.*)",
-        "property_management_amount": r"PROPERTY MANAGEMENT AMOUNT\s*(.*)",
-        "net_monthly_income": r"NET MONTHLY INCOME\s*(.*)",
-    }
+# Labels of the OwnerIQ intake form (field -> label as printed on the form)
+FORM_LABELS = {
+    "owner_name": "OWNER NAME",
+    "owner_principal_address": "OWNER PRINCIPAL ADDRESS",
+    "owner_phone_number": "OWNER PHONE NUMBER",
+    "owner_email_address": "OWNER EMAIL ADDRESS",
+    "company_name": "COMPANY NAME",
+    "company_address": "COMPANY ADDRESS",
+    "company_phone_number": "COMPANY PHONE NUMBER",
+    "company_email_address": "COMPANY EMAIL ADDRESS",
+    "property_address": "PROPERTY ADDRESS",
+    "city": "CITY",
+    "state": "STATE",
+    "zip_code": "ZIP CODE",
+    "property_address_legal_description": "PROPERTY ADDRESS LEGAL DESCRIPTION",
+    "property_type": "PROPERTY TYPE",
+    "property_sqf": "PROPERTY SQF",
+    "construction_year": "CONSTRUCTION YEAR",
+    "property_owner": "PROPERTY OWNER",
+    "property_type_2": "PROPERTY TYPE 2",
+    "title_company": "TITLE COMPANY",
+    "title_company_contact": "TITLE COMPANY CONTACT",
+    "title_company_phone_number": "TITLE COMPANY PHONE NUMBER",
+    "title_company_email_address": "TITLE COMPANY EMAIL ADDRESS",
+    "purchase_price": "PURCHASE PRICE / REFINANCE PRICE",
+    "purchase_closing_date": "PURCHASE/REFINANCE CLOSING DATE",
+    "lender_mortgage_name": "LENDER MORTGAGE NAME",
+    "lender_mortgage_address": "LENDER MORTGAGE ADDRESS",
+    "lender_mortgage_phone": "LENDER MORTGAGE PHONE",
+    "lender_mortgage_web_page": "LENDER MORTGAGE WEB PAGE",
+    "mortgage_servicing_company": "MORTGAGE SERVICING COMPANY",
+    "mortgage_servicing_company_address": "MORTGAGE SERVICING COMPANY ADDRESS",
+    "mortgage_servicing_company_phone_number": "MORTGAGE SERVICING COMPANY PHONE NUMBER",
+    "lender_web_page": "LENDER WEB PAGE",
+    "loan_number": "LOAN NUMBER",
+    "loan_amount": "LOAN AMOUNT",
+    "interest_rate": "INTEREST RATE",
+    "term_years": "TERM -YEARS",
+    "monthly_payment_principal_interest": "MONHLY PAYMENT PRICIPAL + INTEREST",
+    "escrow_property_tax": "ESCROW - PROPERTY TAX",
+    "escrow_home_owner_insurance": "ESCROW - HOME OWNER INSURANCE",
+    "total_monthly_payment_piti": "TOTAL MONTLY PAYMENT P.I.T.I",
+    "home_owner_insurance_initial_escrow": "HOME OWNER INSURANCE INITIAL ESCROW",
+    "property_taxes_initial_escrow": "PROPERTY TAXES INITIAL ESCROW",
+    "first_payment_date": "FIRST PAYMENT DATE",
+    "pre_payment_penalty": "PRE-PAYMENT PENALTY",
+    "pre_payment_penalty_year_1": "YEAR 1",
+    "pre_payment_penalty_year_2": "YEAR 2",
+    "pre_payment_penalty_year_3": "YEAR 3",
+    "pre_payment_penalty_year_4": "YEAR 4",
+    "pre_payment_penalty_year_5": "YEAR 5",
+    "property_tax_county": "PROPERTY TAX COUNTY",
+    "tax_authority": "TAX AUTHORITY",
+    "tax_authority_web_page": "TAX AUTHORITY WEB PAGE",
+    "account_number": "ACCOUNT NUMBER",
+    "assesed_value": "ASSESED VALUE",
+    "taxes_paid_last_year": "TAXES PAID LAST YEAR",
+    "property_tax_percent": "PROPERTY TAX %",
+    "home_owner_insurance_initial_premium": "HOME OWNER INSURANCE INITIAL PREMIUM",
+    "insurance_company": "INSURANCE COMPANY",
+    "insurance_agent_name": "INUSRARANCE AGENT NAME",
+    "insurance_agent_contact": "INSURANCE AGENT CONTACT",
+    "insurance_agent_phone_number": "INSURANCE AGENT PHONE NUMBER",
+    "insurance_agent_email_address": "INSURANCE AGENT EMAIL ADDRESS",
+    "hoi_effective_date": "H.O.I EFFECTIVE DATE",
+    "hoi_expiration_date": "H.O.I EXPIRATION DATE",
+    "policy_number": "POLICY NUMBER",
+    "coverage_a_dwelling": "COVERGAE A - DWELLING",
+    "coverage_b_other_structures": "COVERAGE B - OTHER STRUCTURES",
+    "coverage_c_personal_property": "COVERAGE C - PERSONAL PROPERTY",
+    "coverage_d_fair_rental_value": "COVERAGE D - FAIR RENTAL VALUE",
+    "coverage_e_additional_living_expenses": "COVERAGE E - ADDITIONAL LIVING EXPENSES",
+    "initial_lease_tenant_name": "INITIAL LEASE - TENANT NAME",
+    "lease_effective_date": "LEASE EFFCETIVE DATE",
+    "lease_termination_date": "LEASE TERMINATION DATE",
+    "gross_monthly_income_rent": "GROSS MONTHLY INCOME (RENT)",
+    "property_management_percent": "PROPERTY MANAGEMENT %",
+    "property_management_amount": "PROPERTY MANAGEMENT AMOUNT",
+    "net_monthly_income": "NET MONTHLY INCOME",
+}
+
+def build_label_scanner(labels):
+    """
+    Build one regex over all labels, factored as a trie so each position only
+    follows the branches that match its next character (Aho-Corasick style).
+    A longer label is always tried before its prefix, so the longest label wins.
+    Case-sensitive: the form prints its labels in upper case, so a label word
+    inside a value ("INSURANCE COMPANY State Farm") does not split the field.
+    """
+    trie = {}
+    for label in labels:
+        node = trie
+        for char in label.upper():
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def to_regex(node):
+        branches = [re.escape(char) + to_regex(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # A complete label that is also a prefix: try the longer continuation first
+        return "(?:" + body + ")?" if "" in node else body
+
+    # Whole words only: "STATE" is not a label inside "ESTATE", nor "YEAR 1" inside "YEAR 10"
+    return re.compile(r"\b(?:" + to_regex(trie) + r")(?!\w)")
+
+# Label text (upper case) -> field
+LABEL_FIELDS = {label.upper(): key for key, label in FORM_LABELS.items()}
+LABEL_SCANNER = build_label_scanner(FORM_LABELS.values())
+
+def iter_labels(text):
+    """Find labels in one pass over the text: yields (start, end, field) in text order"""
+    for match in LABEL_SCANNER.finditer(text):
+        key = LABEL_FIELDS.get(match.group(0))
+        if key:
+            yield match.start(), match.end(), key
 
-    # Extract raw data
+# Same value rule as the original "LABEL\s*(.*)" patterns, applied between two labels
+VALUE_PATTERN = re.compile(r"\s*(.*)")
+
+def slice_value(text, start, end):
+    """Value between a label and the next one, limited to its first line"""
+    return VALUE_PATTERN.match(text, start, end).group(1).strip()
+
+def extract_raw_fields(text):
+    """
+    Value of each field = text after its first label, up to the next label,
+    limited to the first line (same as the original "LABEL\\s*(.*)" patterns).
+    Stops scanning once every field of the form has been sliced.
+    """
     raw_data = {}
-    for key, pattern in patterns.items():
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            raw_data[key] = match.group(1).strip()
+    pending = None
+    for start, end, key in iter_labels(text):
+        if pending:
+            raw_data[pending[0]] = slice_value(text, pending[1], start)
+            pending = None
+            if len(raw_data) == len(FORM_LABELS):
+                break
+        if key not in raw_data:
+            pending = (key, end)
+    if pending:
+        raw_data[pending[0]] = slice_value(text, pending[1], len(text))
+    return raw_data
+
+# The original per-label patterns ("LABEL\s*(.*)", first match anywhere, any case)
+BASELINE_PATTERNS = {key: re.compile(re.escape(label) + r"\s*(.*)", re.IGNORECASE) for key, label in FORM_LABELS.items()}
+
+def label_regressions(text):
+    """
+    Fields where the label index loses a value the original patterns found:
+    both place the label at the same position, but the sliced value is not a
+    non-empty prefix of the original one. A value that stops at the next
+    label on the same line ("CITY x STATE y") is expected, not a regression.
+    """
+    raw_data = extract_raw_fields(text)
+    starts = {}
+    for start, _, key in iter_labels(text):
+        starts.setdefault(key, start)
+    regressions = []
+    for key, pattern in BASELINE_PATTERNS.items():
+        match = pattern.search(text)
+        if not match or not match.group(1).strip() or starts.get(key) != match.start():
+            continue
+        baseline, value = match.group(1).strip(), raw_data.get(key, "")
+        if not value or not baseline.startswith(value):
+            regressions.append({"field": key, "baseline": baseline, "value": value})
+    return regressions
 
-    # Transform to structured JSON format
+def extract_data(text):
+    # Extract raw data from the label index
+    return build_form_result(extract_raw_fields(text), text)
+
+def build_form_result(raw_data, text):
+    """Structured intake-form JSON from raw field values (text decides purchase vs refinance)"""
     structured_data = {
         "owner": {
             "individuals": [],
@@ -240,7 +326,16 @@ def extract_prepay_steps(raw_data):
     return steps if steps else None
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Extract the intake form (text on stdin)')
+    parser.add_argument('--check', action='store_true',
+                        help='Compare the label index against the original per-label patterns and list regressions')
+    args = parser.parse_args()
+
     # Read text from stdin
     pdf_text = sys.stdin.read()
+    if args.check:
+        regressions = label_regressions(pdf_text)
+        print(json.dumps(regressions, indent=4))
+        sys.exit(1 if regressions else 0)
     extracted_data = extract_data(pdf_text)
     print(json.dumps(extracted_data, indent=4))
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Punto de entrada único de extracción
+Detecta en la cabecera si el texto es un documento de cierre (prosa) o el
+formulario de alta con etiquetas en mayúsculas, lo extrae con un solo motor
+y devuelve el esquema pedido: closing (extract_property_data_improved) o
+form (extract_property_data_old)
+"""
+
+import re
+import sys
+import time
+import argparse
+import contextlib
+from typing import Optional, Dict, Any, Iterator
+
+from extract_property_data_improved import (
+    GROUP_PRIORITY,
+    OUTPUT_FORMATS,
+    SharedTextScanner,
+    build_result,
+    clean_input,
+    extract_data as extract_closing,
+    iter_progressive,
+    normalize_text,
+    parse_address_components,
+    scan_fields,
+    write_result,
+)
+from extract_property_data_old import LABEL_SCANNER, LABEL_FIELDS, build_form_result, extract_raw_fields
+
+SOURCE_FORMATS = ('closing', 'form')
+SCHEMAS = ('closing', 'form')
+
+# La detección solo mira el principio del texto
+DETECT_CHARS = 4000
+MIN_FORM_LABELS = 4
+
+# Etiqueta del formulario al principio de una línea (con espacios delante)
+LINE_START = re.compile(r'(?:^|\n)[ \t]*\Z')
+
+# Campo del motor de cierre -> campo del formulario con el mismo dato
+CLOSING_TO_FORM = {
+    'loan_number': 'loan_number',
+    'loan_amount': 'loan_amount',
+    'lender_name': 'lender_mortgage_name',
+    'borrower_name': 'owner_name',
+    'property_address': 'property_address',
+    'property_type': 'property_type',
+    'purchase_price': 'purchase_price',
+    'closing_date': 'purchase_closing_date',
+    'interest_rate': 'interest_rate',
+    'term_years': 'term_years',
+    'monthly_payment': 'monthly_payment_principal_interest',
+    'property_tax': 'taxes_paid_last_year',
+    'insurance': 'home_owner_insurance_initial_premium',
+    'monthly_rent': 'gross_monthly_income_rent',
+}
+
+def detect_format(text: str) -> str:
+    """
+    'form' si la cabecera tiene al menos MIN_FORM_LABELS etiquetas distintas
+    del formulario escritas en mayúsculas al principio de línea; si no, 'closing'.
+    Los documentos de cierre usan las mismas palabras, pero en prosa.
+    """
+    head = text[:DETECT_CHARS]
+    labels = set()
+    for match in LABEL_SCANNER.finditer(head):
+        label = match.group(0)
+        if LINE_START.search(head, max(0, match.start() - 16), match.start()):
+            labels.add(LABEL_FIELDS[label])
+            if len(labels) >= MIN_FORM_LABELS:
+                return 'form'
+    return 'closing'
+
+def form_to_closing(raw_data: Dict[str, str]) -> Dict[str, Optional[str]]:
+    """Campos del formulario con las claves del motor de cierre (dirección completa incluida)"""
+    extracted = {key: raw_data.get(form_key) or None for key, form_key in CLOSING_TO_FORM.items()}
+    city, state, zip_code = (raw_data.get(key) for key in ('city', 'state', 'zip_code'))
+    if extracted['property_address'] and city and state:
+        extracted['property_address'] = f"{extracted['property_address']}, {city}, {state}" + (f" {zip_code}" if zip_code else '')
+    return extracted
+
+def closing_to_form(extracted: Dict[str, Optional[str]]) -> Dict[str, str]:
+    """Campos del motor de cierre con las claves del formulario (la dirección, en componentes)"""
+    raw_data = {form_key: extracted[key] for key, form_key in CLOSING_TO_FORM.items() if extracted.get(key)}
+    if extracted.get('property_address'):
+        components = parse_address_components(extracted['property_address'])
+        raw_data.update({
+            key: components[component]
+            for key, component in (('property_address', 'address'), ('city', 'city'), ('state', 'state'), ('zip_code', 'zip'))
+            if components[component]
+        })
+    return raw_data
+
+def extract_data(text: str, schema: str = 'closing', source_format: Optional[str] = None,
+                 debug: Optional[bool] = None, scanner: Optional[SharedTextScanner] = None) -> Dict[str, Any]:
+    """
+    Extrae un documento con el motor de su formato y lo devuelve en el esquema pedido.
+
+    source_format fuerza el motor ('closing' o 'form'); por defecto se
+    detecta. El texto del cierre se normaliza una sola vez y el motor
+    recibe normalized=True; el formulario se lee tal cual porque cada valor
+    termina en su salto de línea. En el esquema closing, _debug (por
+    defecto incluido) lleva además el formato detectado. scanner reparte los
+    campos del cierre entre procesos (mismo resultado, ver SharedTextScanner).
+    """
+    text = clean_input(text)
+    source_format = source_format or detect_format(text)
+    debug = True if debug is None else debug
+
+    if source_format == 'form':
+        raw_data = extract_raw_fields(text)
+        if schema == 'form':
+            return build_form_result(raw_data, text)
+        extracted = form_to_closing(raw_data)
+        result = build_result(extracted, len(text), (text[:500] + "..." if len(text) > 500 else text) if debug else '', None, debug)
+    else:
+        normalized = normalize_text(text)
+        if schema == 'form':
+            return build_form_result(closing_to_form((scanner or scan_fields)(normalized)), normalized)
+        result = extract_closing(normalized, debug=debug, normalized=True, scanner=scanner)
+
+    if debug:
+        result["_debug"]["format"] = source_format
+    return result
+
+def iter_extract_progressive(text: str, deadline: float, source_format: Optional[str] = None,
+                             debug: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Esquema closing por grupos con plazo (ver iter_progressive). El
+    formulario se extrae de una sola pasada y se entrega igualmente grupo a
+    grupo; el registro _debug lleva el formato detectado.
+    """
+    started = time.perf_counter()
+    text = clean_input(text)
+    source_format = source_format or detect_format(text)
+    if source_format == 'form':
+        result = extract_data(text, 'closing', 'form', debug)
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 3)
+        records = [
+            {"group": group, "data": result[group], "unresolved": [], "elapsed_ms": elapsed_ms}
+            for group in GROUP_PRIORITY + (('_debug',) if debug else ())
+        ]
+        records.append({"done": True, "complete": True, "unresolved_fields": [], "elapsed_ms": elapsed_ms})
+    else:
+        records = iter_progressive(text, deadline, debug=debug)
+    for record in records:
+        if record.get("group") == '_debug':
+            record["data"]["format"] = source_format
+        yield record
+
+if __name__ == "__main__":
+    process_started = time.perf_counter()
+    parser = argparse.ArgumentParser(description='Extrae un documento (texto por stdin) detectando su formato')
+    parser.add_argument('--schema', choices=SCHEMAS, default='closing',
+                        help='Esquema de salida: closing (loan/lender/property/...) o form (owner/company/loan/...)')
+    parser.add_argument('--source-format', choices=('auto',) + SOURCE_FORMATS, default='auto',
+                        help='Motor a usar; auto lo detecta en la cabecera del texto')
+    parser.add_argument('--debug', action=argparse.BooleanOptionalAction, default=None,
+                        help='Incluye (o no) _debug en el esquema closing; por defecto solo con --format pretty')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='pretty',
+                        help='Salida: pretty (JSON indentado), compact (JSON minificado) o msgpack')
+    parser.add_argument('--parallel', type=int, default=None, metavar='N',
+                        help='Reparte los campos de un documento de cierre grande entre N procesos')
+    parser.add_argument('--deadline-ms', type=float, default=None,
+                        help='Plazo desde el arranque: un registro JSON Lines por grupo (préstamo y dirección primero) '
+                             'con los campos sin evaluar marcados como unresolved')
+    parser.add_argument('--fingerprints', metavar='DIR',
+                        help='Con --deadline-ms y --key: reutiliza la extracción de un texto idéntico del '
+                             'índice de huellas de DIR y, si solo hay uno parecido, indica qué campos cambian '
+                             '(ver document_fingerprints.py)')
+    parser.add_argument('--key', help='Clave del documento en el índice de --fingerprints (p.ej. el hash del PDF)')
+    args = parser.parse_args()
+    if args.deadline_ms is not None and (args.schema != 'closing' or args.parallel):
+        parser.error('--deadline-ms only supports --schema closing without --parallel')
+    if args.fingerprints and (args.deadline_ms is None or not args.key):
+        parser.error('--fingerprints requires --deadline-ms and --key')
+
+    if args.format == 'msgpack':
+        try:
+            import msgpack  # noqa: F401
+        except ImportError:
+            parser.error('--format msgpack requires the msgpack package (pip install msgpack)')
+    debug = args.debug if args.debug is not None or args.format == 'pretty' else False
+
+    if args.fingerprints:
+        from document_fingerprints import iter_extract_reusing
+        records = iter_extract_reusing(sys.stdin.read(), process_started + args.deadline_ms / 1000,
+                                       args.fingerprints, args.key)
+        for record in records:
+            write_result(record, 'msgpack' if args.format == 'msgpack' else 'compact')
+        sys.exit(0)
+
+    if args.deadline_ms is not None:
+        records = iter_extract_progressive(sys.stdin.read(), process_started + args.deadline_ms / 1000,
+                                           None if args.source_format == 'auto' else args.source_format,
+                                           True if debug is None else debug)
+        for record in records:
+            write_result(record, 'msgpack' if args.format == 'msgpack' else 'compact')
+        sys.exit(0)
+
+    with SharedTextScanner(args.parallel) if args.parallel else contextlib.nullcontext() as scanner:
+        result = extract_data(sys.stdin.read(), args.schema, None if args.source_format == 'auto' else args.source_format,
+                              debug, scanner)
+    write_result(result, args.format)
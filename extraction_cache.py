@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache en disco de resultados de extracción
+Clave = hash del texto normalizado + versión del extractor, guardado en sqlite
+con desalojo LRU por tamaño y contadores de aciertos/fallos
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Optional, Dict, Any, List
+
+# Tamaño máximo por defecto del cache (bytes de JSON guardado)
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO counters (name, value) VALUES ('hits', 0), ('misses', 0), ('evictions', 0), ('total_bytes', 0);
+"""
+
+# Lecturas (aciertos, fallos y last_access) acumuladas en memoria antes de escribirlas en una transacción
+FLUSH_EVERY = 64
+FLUSH_INTERVAL_S = 5.0
+
+# Lambda para la clave: la versión va dentro del hash, así un cambio de patrones invalida todo
+cache_key = lambda version, text: hashlib.sha256(f"{version}\0{text}".encode('utf-8', errors='ignore')).hexdigest()
+
+class ExtractionCache:
+    """
+    Cache compartido entre procesos (workers, lotes) sobre un archivo sqlite.
+
+    La conexión se abre de forma perezosa en cada hilo (el servidor por
+    socket atiende cada cliente en su hilo) y en cada proceso, así que la
+    instancia se puede pasar a un pool de multiprocessing. Una lectura no
+    escribe: aciertos, fallos y last_access se acumulan y se guardan juntos
+    cada FLUSH_EVERY lecturas o FLUSH_INTERVAL_S segundos, en cada put y al
+    cerrar (un worker de un pool que se termina sin cerrar pierde como mucho
+    sus últimas lecturas en los contadores).
+    """
+
+    def __init__(self, path: str, version: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.version = version
+        self.max_bytes = max_bytes
+        self._init_state()
+
+    def _init_state(self) -> None:
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+        self._pending = {'hits': 0, 'misses': 0}
+        self._touched: Dict[str, float] = {}
+        self._flushed_at = time.monotonic()
+
+    def __getstate__(self):
+        return {name: self.__dict__[name] for name in ('path', 'version', 'max_bytes')}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_state()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # Cada hilo usa solo la suya; check_same_thread=False es para que close() las cierre todas
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _bump(self, name: str, delta: int = 1) -> None:
+        self.conn.execute('UPDATE counters SET value = value + ? WHERE name = ?', (delta, name))
+
+    def _write_pending(self) -> None:
+        """Escribe las lecturas acumuladas (dentro de la transacción del llamador)"""
+        with self._lock:
+            pending, touched = self._pending, self._touched
+            self._pending, self._touched = {'hits': 0, 'misses': 0}, {}
+            self._flushed_at = time.monotonic()
+        self.conn.executemany('UPDATE entries SET last_access = ? WHERE key = ?',
+                              ((accessed, key) for key, accessed in touched.items()))
+        for name, delta in pending.items():
+            if delta:
+                self._bump(name, delta)
+
+    def flush(self) -> None:
+        """Guarda los contadores y last_access acumulados por las lecturas"""
+        with self._lock:
+            if not self._touched and not any(self._pending.values()):
+                return
+        conn = self.conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._write_pending()
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def get(self, normalized_text: str, variant: str = '') -> Optional[Dict[str, Any]]:
+        """
+        Devuelve el resultado guardado para este texto normalizado, o None.
+        variant separa resultados de la misma versión que no son
+        intercambiables (p.ej. los de otro motor)
+        """
+        key = cache_key(self.version + variant, normalized_text)
+        row = self.conn.execute('SELECT value FROM entries WHERE key = ?', (key,)).fetchone()
+        with self._lock:
+            if row is None:
+                self._pending['misses'] += 1
+            else:
+                self._pending['hits'] += 1
+                self._touched[key] = time.time()
+            due = (sum(self._pending.values()) >= FLUSH_EVERY
+                   or time.monotonic() - self._flushed_at >= FLUSH_INTERVAL_S)
+        if due:
+            self.flush()
+        return None if row is None else json.loads(row[0])
+
+    def put(self, normalized_text: str, result: Dict[str, Any], variant: str = '') -> None:
+        """Guarda un resultado (con su variant, ver get) y desaloja entradas si se supera max_bytes"""
+        key = cache_key(self.version + variant, normalized_text)
+        value = json.dumps(result, ensure_ascii=True, separators=(',', ':'))
+        now = time.time()
+        conn = self.conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Las lecturas pendientes primero, para que el desalojo vea el last_access al día
+            self._write_pending()
+            old = conn.execute('SELECT size FROM entries WHERE key = ?', (key,)).fetchone()
+            conn.execute(
+                'INSERT OR REPLACE INTO entries (key, version, value, size, created_at, last_access) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, self.version, value, len(value), now, now)
+            )
+            self._bump('total_bytes', len(value) - (old[0] if old else 0))
+            self._evict()
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _evict(self) -> None:
+        """Borra entradas de otras versiones primero y luego las menos usadas hasta caber en max_bytes"""
+        total = self.conn.execute("SELECT value FROM counters WHERE name = 'total_bytes'").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.conn.execute(
+            'SELECT key, size FROM entries ORDER BY version = ?, last_access',
+            (self.version,)
+        )
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append(key)
+            total -= size
+        self.conn.executemany('DELETE FROM entries WHERE key = ?', ((key,) for key in evicted))
+        self.conn.execute("UPDATE counters SET value = ? WHERE name = 'total_bytes'", (total,))
+        self._bump('evictions', len(evicted))
+
+    def stats(self) -> Dict[str, Any]:
+        """Entradas, bytes y contadores de aciertos/fallos/desalojos"""
+        self.flush()
+        counters = dict(self.conn.execute('SELECT name, value FROM counters'))
+        entries, current = self.conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(version = ?), 0) FROM entries', (self.version,)
+        ).fetchone()
+        lookups = counters['hits'] + counters['misses']
+        return {
+            "path": self.path,
+            "version": self.version,
+            "entries": entries,
+            "current_version_entries": current,
+            "bytes": counters['total_bytes'],
+            "max_bytes": self.max_bytes,
+            "hits": counters['hits'],
+            "misses": counters['misses'],
+            "evictions": counters['evictions'],
+            "hit_rate": round(counters['hits'] / lookups, 4) if lookups else None,
+        }
+
+    def clear(self) -> None:
+        """Vacía el cache y reinicia los contadores"""
+        with self._lock:
+            self._pending, self._touched = {'hits': 0, 'misses': 0}, {}
+        self.conn.execute('DELETE FROM entries')
+        self.conn.execute('UPDATE counters SET value = 0')
+
+    def close(self) -> None:
+        """Guarda las lecturas pendientes y cierra las conexiones de todos los hilos"""
+        if self._connections:
+            self.flush()
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pipeline asyncio para la carga masiva de documentos
+Etapas: carga de texto -> normalización -> clasificación -> extracción ->
+consolidación, unidas por colas acotadas (backpressure) y con concurrencia
+configurable por etapa; las etapas de CPU se ejecutan en un pool de procesos
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import functools
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Optional, Dict, Any, Callable, List, Tuple
+
+from extract_property_data_improved import clean_input, collect_batch_paths, extract_data, normalize_text
+from consolidate_properties import DEFAULT_MIN_CONFIDENCE, candidate_rank
+from document_classifier import classify_text
+from document_fingerprints import DEFAULT_THRESHOLD, FingerprintIndex, text_signature
+
+STAGES = ('load', 'normalize', 'classify', 'extract', 'consolidate')
+
+# Concurrencia por defecto: la carga es E/S, normalizar y extraer usan el pool de procesos
+DEFAULT_CONCURRENCY = {
+    'load': 4,
+    'normalize': os.cpu_count() or 2,
+    'classify': 2,
+    'extract': os.cpu_count() or 2,
+    'consolidate': 1,
+}
+DEFAULT_QUEUE_SIZE = 16
+
+# Lambda para la propiedad de un documento: Documents/<propiedad>/processed/doc.json o <propiedad>/doc.pdf
+property_of = lambda path: os.path.basename(os.path.dirname(
+    os.path.dirname(path) if os.path.basename(os.path.dirname(path)) == 'processed' else path
+))
+
+def collect_ingest_paths(source: str) -> List[str]:
+    """Documentos de la carga: los de --batch (.txt, processed/*.json) más los .pdf del directorio"""
+    paths = collect_batch_paths(source)
+    if os.path.isdir(source):
+        paths += [
+            os.path.join(root, name)
+            for root, _, files in os.walk(source)
+            for name in files
+            if name.lower().endswith('.pdf')
+        ]
+    return sorted(paths)
+
+def load_document(path: str) -> Dict[str, Any]:
+    """
+    Lee el texto de un documento: PDF (requiere pypdf), JSON procesado
+    (raw_text y, si la trae, su clasificación) o texto plano
+    """
+    if path.lower().endswith('.pdf'):
+        from pypdf import PdfReader
+        return {"text": '\n'.join(page.extract_text() or '' for page in PdfReader(path).pages)}
+    if path.endswith('.json'):
+        with open(path, encoding='utf-8') as f:
+            doc = json.load(f)
+        return {
+            "text": doc.get('raw_text') or '',
+            "document_type": doc.get('document_type'),
+            "classification_confidence": doc.get('classification_confidence'),
+        }
+    with open(path, encoding='utf-8', errors='ignore') as f:
+        return {"text": f.read()}
+
+def normalize_document(text: str) -> str:
+    """Etapa de normalización; función de módulo para que el pool de procesos pueda serializarla"""
+    return normalize_text(clean_input(text))
+
+class StageStats:
+    """Contadores de una etapa: elementos, errores, tiempo ocupado y profundidad máxima de su cola"""
+
+    __slots__ = ('items', 'errors', 'busy_s', 'max_queue')
+
+    def __init__(self):
+        self.items = 0
+        self.errors = 0
+        self.busy_s = 0.0
+        self.max_queue = 0
+
+    def as_dict(self, elapsed_s: float, workers: int) -> Dict[str, Any]:
+        return {
+            "workers": workers,
+            "items": self.items,
+            "errors": self.errors,
+            "busy_s": round(self.busy_s, 3),
+            "items_per_sec": round(self.items / elapsed_s, 2) if elapsed_s else None,
+            "utilization": round(self.busy_s / (elapsed_s * workers), 3) if elapsed_s else None,
+            "max_queue": self.max_queue,
+        }
+
+class IngestPipeline:
+    """
+    Pipeline de ingesta por etapas con colas acotadas entre ellas.
+
+    Cada etapa tiene su número de workers; cuando la cola siguiente está
+    llena la etapa espera, así que nunca hay más de queue_size documentos
+    esperando entre dos etapas. Los documentos con error siguen el flujo
+    sin procesarse y se escriben con su error al final. Con store (un
+    PortfolioStore), cada documento extraído se añade también al almacén columnar.
+    Con fingerprints (un FingerprintIndex), tras normalizar se busca cada
+    documento entre los ya procesados y los anteriores de la carga: si su
+    texto normalizado es idéntico a otro se salta el resto de etapas
+    (duplicate_of), y si solo es parecido se extrae igual y se informa
+    (near_duplicates). Las huellas de la carga se guardan en el índice al terminar.
+    """
+
+    def __init__(self, writer, concurrency: Optional[Dict[str, int]] = None, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 executor: Optional[Executor] = None, extractor: Callable[..., Dict[str, Any]] = extract_data,
+                 classifier: Optional[Callable[[str], Tuple[str, float]]] = None,
+                 min_confidence: float = DEFAULT_MIN_CONFIDENCE, store=None, fingerprints=None,
+                 duplicate_threshold: float = DEFAULT_THRESHOLD):
+        self.writer = writer
+        self.concurrency = {**DEFAULT_CONCURRENCY, **(concurrency or {})}
+        self.queue_size = queue_size
+        self.executor = executor
+        self.extractor = functools.partial(extractor, normalized=True, debug=False)
+        self.classifier = classifier
+        self.min_confidence = min_confidence
+        self.store = store
+        self.fingerprints = fingerprints
+        self.duplicate_threshold = duplicate_threshold
+        self.duplicates = 0
+        self.stats = {stage: StageStats() for stage in STAGES}
+        self.properties: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    async def _run_cpu(self, func: Callable, *args):
+        """Ejecuta una tarea de CPU en el executor (pool de procesos) sin bloquear el bucle"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def load(self, item: Dict[str, Any]) -> None:
+        # Parsear un PDF es CPU; leer texto o JSON es E/S y basta con un hilo
+        if item["path"].lower().endswith('.pdf'):
+            item.update(await self._run_cpu(load_document, item["path"]))
+        else:
+            item.update(await asyncio.to_thread(load_document, item["path"]))
+
+    async def normalize(self, item: Dict[str, Any]) -> None:
+        item["text"] = await self._run_cpu(normalize_document, item["text"])
+        if self.fingerprints is not None:
+            signature, text_hash = await self._run_cpu(text_signature, item["text"], True)
+            # Consulta y alta sin await de por medio: de dos copias en la misma carga, la primera es la original
+            key = self.fingerprints.key_for(item["path"])
+            matches = self.fingerprints.query(signature, text_hash, self.duplicate_threshold, exclude=key)
+            duplicate = bool(matches) and matches[0]["identical"]
+            self.fingerprints.add(key, signature, text_hash, property=property_of(item["path"]),
+                                  duplicate_of=matches[0]["key"] if duplicate else None)
+            if duplicate:
+                item.pop("text")
+                item["duplicate_of"] = matches[0]
+                self.duplicates += 1
+            elif matches:
+                item["near_duplicates"] = matches
+
+    async def classify(self, item: Dict[str, Any]) -> None:
+        # Un JSON procesado ya trae su tipo; el resto pasa por el clasificador (si hay)
+        if item.get("document_type") or self.classifier is None:
+            item["document_type"] = item.get("document_type") or 'unknown'
+            item["classification_confidence"] = item.get("classification_confidence") or 0.0
+            return
+        item["document_type"], item["classification_confidence"] = await self._run_cpu(self.classifier, item["text"])
+
+    async def extract(self, item: Dict[str, Any]) -> None:
+        item["result"] = await self._run_cpu(self.extractor, item.pop("text"))
+
+    async def consolidate(self, item: Dict[str, Any]) -> None:
+        """Funde el resultado en su propiedad: un candidato por campo "grupo.clave" con valor"""
+        best = self.properties.setdefault(property_of(item["path"]), {})
+        if self.store is not None:
+            self.store.append(property_of(item["path"]), item["path"], item["result"])
+        for group, values in item["result"].items():
+            if group.startswith('_'):
+                continue
+            for key, value in values.items():
+                if value is None:
+                    continue
+                field = f"{group}.{key}"
+                candidate = {
+                    "value": value,
+                    "confidence": float(item["classification_confidence"] or 0),
+                    "document_type": item["document_type"],
+                    "path": item["path"],
+                    "processed_at": None,
+                }
+                current = best.get(field)
+                if current is None or candidate_rank(field, candidate, self.min_confidence) > candidate_rank(field, current, self.min_confidence):
+                    best[field] = candidate
+
+    def emit(self, item: Dict[str, Any]) -> None:
+        record = {
+            "type": "document",
+            "path": item["path"],
+            "ok": "error" not in item,
+            "property": property_of(item["path"]),
+        }
+        if "error" in item:
+            record["error"] = item["error"]
+        elif "duplicate_of" in item:
+            record["duplicate_of"] = item["duplicate_of"]
+        else:
+            record["document_type"] = item["document_type"]
+            record["classification_confidence"] = item["classification_confidence"]
+            record["result"] = item["result"]
+            if "near_duplicates" in item:
+                record["near_duplicates"] = item["near_duplicates"]
+        self.writer.write(json.dumps(record, ensure_ascii=True) + '\n')
+
+    async def _stage(self, name: str, inbox: asyncio.Queue, outbox: Optional[asyncio.Queue]) -> None:
+        """Workers de una etapa; al terminar todos, avisa a la etapa siguiente con un None por worker"""
+        handler = getattr(self, name)
+        stats = self.stats[name]
+
+        async def worker():
+            while True:
+                item = await inbox.get()
+                if item is None:
+                    return
+                if "error" not in item and "duplicate_of" not in item:
+                    started = time.perf_counter()
+                    try:
+                        await handler(item)
+                        stats.items += 1
+                    except Exception as e:
+                        stats.errors += 1
+                        item.pop("text", None)
+                        item["error"] = f"{name}: {type(e).__name__}: {e}"
+                    stats.busy_s += time.perf_counter() - started
+                if outbox is not None:
+                    stats.max_queue = max(stats.max_queue, outbox.qsize())
+                    await outbox.put(item)
+                else:
+                    self.emit(item)
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency[name])))
+        if outbox is not None:
+            next_stage = STAGES[STAGES.index(name) + 1]
+            for _ in range(self.concurrency[next_stage]):
+                await outbox.put(None)
+
+    async def run(self, paths: List[str]) -> Dict[str, Any]:
+        """Procesa todos los documentos y escribe sus registros y luego uno por propiedad consolidada"""
+        started = time.perf_counter()
+        queues = [asyncio.Queue(self.queue_size) for _ in STAGES]
+        stages = [
+            asyncio.create_task(self._stage(name, queues[index], queues[index + 1] if index + 1 < len(STAGES) else None))
+            for index, name in enumerate(STAGES)
+        ]
+        # La entrada también es una cola acotada: no se crean más elementos de los que caben
+        for path in paths:
+            await queues[0].put({"path": path})
+        for _ in range(self.concurrency[STAGES[0]]):
+            await queues[0].put(None)
+        await asyncio.gather(*stages)
+
+        for name, fields in sorted(self.properties.items()):
+            consolidated = {
+                field: {key: value for key, value in candidate.items() if key != 'processed_at'}
+                for field, candidate in fields.items()
+            }
+            self.writer.write(json.dumps({"type": "property", "property": name, "fields": consolidated}, ensure_ascii=True) + '\n')
+        self.writer.flush()
+        if self.store is not None:
+            self.store.flush()
+        if self.fingerprints is not None:
+            self.fingerprints.save()
+
+        elapsed = time.perf_counter() - started
+        errors = sum(stats.errors for stats in self.stats.values())
+        return {
+            "documents": len(paths),
+            "ok": len(paths) - errors,
+            "errors": errors,
+            "duplicates": self.duplicates,
+            "properties": len(self.properties),
+            "elapsed_s": round(elapsed, 3),
+            "docs_per_sec": round(len(paths) / elapsed, 2) if elapsed else None,
+            "stages": {name: self.stats[name].as_dict(elapsed, self.concurrency[name]) for name in STAGES},
+        }
+
+def parse_concurrency(spec: str) -> Dict[str, int]:
+    """'load=8,extract=4' -> {'load': 8, 'extract': 4}"""
+    concurrency = {}
+    for part in filter(None, spec.split(',')):
+        name, _, value = part.partition('=')
+        if name not in STAGES or not value.isdigit() or int(value) < 1:
+            raise ValueError(f"Invalid stage concurrency '{part}' (stages: {', '.join(STAGES)})")
+        concurrency[name] = int(value)
+    return concurrency
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Ingesta masiva de documentos por etapas con colas acotadas')
+    parser.add_argument('source', help='Directorio (.pdf, .txt y processed/*.json) o manifiesto con una ruta por línea')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Procesos del pool para las etapas de CPU (por defecto, todos los cores)')
+    parser.add_argument('--concurrency', default='', metavar='STAGE=N,...',
+                        help=f"Workers por etapa ({', '.join(STAGES)}), p.ej. load=8,extract=4")
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help='Documentos máximos en espera entre dos etapas')
+    parser.add_argument('--output', metavar='FILE',
+                        help='Escribe el JSON Lines en este archivo en lugar de stdout')
+    parser.add_argument('--store', metavar='DIR',
+                        help='Añade cada documento extraído al almacén columnar de la cartera (ver portfolio_store.py)')
+    parser.add_argument('--dedupe', metavar='ROOT',
+                        help='Salta los documentos con el mismo texto que uno ya procesado según las huellas del almacén ROOT '
+                             '(ver document_fingerprints.py) e informa de los casi duplicados')
+    parser.add_argument('--duplicate-threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Jaccard estimado mínimo para informar de un casi duplicado')
+    args = parser.parse_args()
+
+    try:
+        concurrency = parse_concurrency(args.concurrency)
+    except ValueError as e:
+        parser.error(str(e))
+
+    store = None
+    if args.store:
+        from portfolio_store import PortfolioStore
+        store = PortfolioStore(args.store)
+
+    fingerprints = None
+    if args.dedupe:
+        fingerprints = FingerprintIndex(args.dedupe)
+
+    paths = collect_ingest_paths(args.source)
+    with ProcessPoolExecutor(args.workers) as executor, \
+            (open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout) as out:
+        pipeline = IngestPipeline(out, concurrency, args.queue_size, executor, classifier=classify_text, store=store,
+                                  fingerprints=fingerprints, duplicate_threshold=args.duplicate_threshold)
+        stats = asyncio.run(pipeline.run(paths))
+    print(json.dumps(stats), file=sys.stderr)
+    sys.exit(1 if stats["errors"] else 0)
@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Amortización y flujo de caja de toda la cartera con operaciones sobre arrays
+Reproduce backend/utils/mortgage-calculator.js (mismo orden de operaciones y
+mismo redondeo que Math.round) pero calcula todos los préstamos a la vez:
+cada mes es un paso vectorizado sobre la cartera en lugar de un bucle por préstamo
+"""
+
+import sys
+import json
+import argparse
+from typing import Optional, Dict, Any, List, Sequence, Union
+
+import numpy as np
+
+DEFAULT_TAX_BRACKET = 0.15
+
+# Fecha base de los seriales de Excel (excelSerialToDate en el calculador JS)
+EXCEL_EPOCH = np.datetime64('1899-12-30', 'D')
+
+def js_round(values, places: int = 2) -> np.ndarray:
+    """Math.round(x * 10^places) / 10^places de JS (medios hacia +infinito, no al par)"""
+    scale = 10 ** places
+    scaled = np.multiply(values, scale, dtype=float)
+    rounded = np.floor(scaled)
+    scaled -= rounded
+    rounded += scaled >= 0.5
+    rounded /= scale
+    return rounded
+
+def to_date(value: Union[str, int, float, None]) -> np.datetime64:
+    """Fecha de primer pago: ISO 'YYYY-MM-DD', serial de Excel o None (NaT)"""
+    if value is None or value == '':
+        return np.datetime64('NaT', 'D')
+    if isinstance(value, (int, float)):
+        return EXCEL_EPOCH + int(np.floor(value))
+    return np.datetime64(str(value)[:10], 'D')
+
+def add_months(dates: np.ndarray, months: Union[int, np.ndarray]) -> np.ndarray:
+    """addMonths del JS: mismo día del mes, desbordando al mes siguiente como Date.setMonth"""
+    month_start = dates.astype('datetime64[M]')
+    day_offset = dates - month_start.astype('datetime64[D]')
+    return (month_start + months).astype('datetime64[D]') + day_offset
+
+class LoanBatch:
+    """
+    Cartera de préstamos como arrays paralelos (un elemento por préstamo).
+
+    annual_interest_rate va en decimal (0.075 = 7.5%), como en el calculador
+    JS. Los préstamos sin importe, tipo o plazo quedan marcados como no
+    válidos y dan NaN, donde el JS lanzaría una excepción.
+    """
+
+    def __init__(self, loan_amount: Sequence[float], annual_interest_rate: Sequence[float],
+                 term_years: Sequence[float], yearly_property_taxes: Union[float, Sequence[float]] = 0,
+                 yearly_hoi: Union[float, Sequence[float]] = 0, monthly_pmi: Union[float, Sequence[float]] = 0,
+                 monthly_rent: Union[float, Sequence[float]] = 0, home_value: Optional[Sequence[Optional[float]]] = None,
+                 first_payment_date: Optional[Sequence[Union[str, int, float, None]]] = None,
+                 ids: Optional[Sequence[Any]] = None):
+        as_array = lambda values: np.array([np.nan if v is None else v for v in values], dtype=float)
+        self.loan_amount = as_array(loan_amount)
+        size = len(self.loan_amount)
+        fill = lambda values: np.broadcast_to(as_array(np.atleast_1d(values)), (size,)).copy()
+        self.annual_interest_rate = as_array(annual_interest_rate)
+        # parseInt(termYears) en el JS
+        self.term_years = np.trunc(as_array(term_years))
+        self.yearly_property_taxes = np.nan_to_num(fill(yearly_property_taxes))
+        self.yearly_hoi = np.nan_to_num(fill(yearly_hoi))
+        self.monthly_pmi = np.nan_to_num(fill(monthly_pmi))
+        self.monthly_rent = np.nan_to_num(fill(monthly_rent))
+        self.home_value = fill([np.nan] * size if home_value is None else home_value)
+        self.first_payment_date = np.array(
+            [to_date(v) for v in (first_payment_date if first_payment_date is not None else [None] * size)],
+            dtype='datetime64[D]'
+        )
+        self.ids = list(ids) if ids is not None else list(range(size))
+        # Mismo criterio que "!loanAmount || !annualInterestRate || !termYears" en el JS
+        self.valid = (
+            np.nan_to_num(self.loan_amount) != 0
+        ) & (np.nan_to_num(self.annual_interest_rate) != 0) & (np.nan_to_num(self.term_years) != 0)
+
+    def __len__(self) -> int:
+        return len(self.loan_amount)
+
+    @classmethod
+    def from_results(cls, results: Sequence[Dict[str, Any]], ids: Optional[Sequence[Any]] = None,
+                     first_payment_date: Optional[Sequence[Union[str, int, float, None]]] = None) -> 'LoanBatch':
+        """
+        Cartera a partir de resultados de extract_data (o registros de --batch
+        con "result"); interest_rate del extractor viene en porcentaje
+        """
+        results = [record.get('result', record) for record in results]
+        group = lambda result, name, key: (result.get(name) or {}).get(key)
+        rates = [group(r, 'loan', 'interest_rate') for r in results]
+        return cls(
+            loan_amount=[group(r, 'loan', 'amount') for r in results],
+            annual_interest_rate=[rate / 100 if rate is not None else None for rate in rates],
+            term_years=[group(r, 'loan', 'term_years') for r in results],
+            yearly_property_taxes=[group(r, 'taxes', 'annual_amount') for r in results],
+            yearly_hoi=[group(r, 'insurance', 'annual_premium') for r in results],
+            monthly_rent=[group(r, 'lease', 'monthly_rent') for r in results],
+            first_payment_date=first_payment_date,
+            ids=ids,
+        )
+
+def monthly_payment(loan_amount: np.ndarray, annual_interest_rate: np.ndarray, term_years: np.ndarray) -> np.ndarray:
+    """calculateMonthlyPayment vectorizado: M = P × [r(1 + r)^n] / [(1 + r)^n - 1], redondeado a centavos"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        monthly_rate = annual_interest_rate / 12
+        factor = np.power(1 + monthly_rate, term_years * 12)
+        payment = loan_amount * (monthly_rate * factor) / (factor - 1)
+    return js_round(payment)
+
+def piti(monthly_payment_pi: np.ndarray, yearly_property_taxes=0, yearly_hoi=0, monthly_pmi=0) -> np.ndarray:
+    """calculatePITI vectorizado"""
+    return js_round(monthly_payment_pi + yearly_property_taxes / 12 + yearly_hoi / 12 + monthly_pmi)
+
+def batch_monthly_payment(batch: LoanBatch) -> np.ndarray:
+    """Cuota P+I de cada préstamo (NaN en los no válidos)"""
+    payment = monthly_payment(batch.loan_amount, batch.annual_interest_rate, batch.term_years)
+    return np.where(batch.valid, payment, np.nan)
+
+def amortize(batch: LoanBatch, tax_bracket: float = DEFAULT_TAX_BRACKET,
+             extra_payment: Union[float, np.ndarray] = 0, extra_payment_start_at: Union[int, np.ndarray] = 1) -> Dict[str, Any]:
+    """
+    generateAmortizationSchedule para toda la cartera.
+
+    Devuelve matrices (meses × préstamos) con los mismos campos y redondeos
+    que cada fila del schedule JS (NaN donde el préstamo ya no tiene pago) y
+    el resumen de cada préstamo como arrays.
+    """
+    size = len(batch)
+    rate = batch.annual_interest_rate
+    payment = batch_monthly_payment(batch)
+    # Los préstamos no válidos avanzan con ceros (x + 0.0 == x) y quedan fuera por la máscara
+    monthly_rate = np.where(batch.valid, rate / 12, 0.0)
+    loop_payment = np.nan_to_num(payment)
+    number_of_payments = np.where(batch.valid, batch.term_years * 12, 0).astype(int)
+    extra_payment = np.broadcast_to(np.asarray(extra_payment, dtype=float), (size,))
+    extra_payment_start_at = np.broadcast_to(np.asarray(extra_payment_start_at), (size,))
+    months = int(number_of_payments.max()) if size else 0
+
+    columns = ('interest_due', 'principal_paid', 'balance', 'extra_payments', 'tax_returned', 'cumulative_tax_returned')
+    raw = {name: np.empty((months, size)) for name in columns}
+    paid = np.zeros((months, size), dtype=bool)
+    balance = np.where(batch.valid, batch.loan_amount, 0.0)
+    active = batch.valid.copy()
+    cumulative_tax = np.zeros(size)
+    total_interest = np.zeros(size)
+    total_principal = np.zeros(size)
+
+    # Un paso por mes sobre todos los préstamos (misma aritmética que el bucle JS)
+    for month in range(1, months + 1):
+        active &= (month <= number_of_payments) & (balance > 0)
+        if not active.any():
+            months = month - 1
+            break
+        row = month - 1
+        paid[row] = active
+        interest_due = np.multiply(balance, monthly_rate, out=raw['interest_due'][row])
+        extra_amount = np.multiply(extra_payment, month >= extra_payment_start_at, out=raw['extra_payments'][row])
+        principal_paid = np.subtract(loop_payment, interest_due, out=raw['principal_paid'][row])
+        principal_paid += extra_amount
+        np.minimum(principal_paid, balance, out=principal_paid)
+        np.subtract(balance, principal_paid, out=raw['balance'][row])
+        tax_returned = np.multiply(interest_due, tax_bracket, out=raw['tax_returned'][row])
+
+        cumulative_tax += tax_returned * active
+        raw['cumulative_tax_returned'][row] = cumulative_tax
+        total_interest += interest_due * active
+        total_principal += principal_paid * active
+        balance -= principal_paid * active
+
+    paid = paid[:months]
+    payments_made = paid.sum(axis=0)
+    schedule = {}
+    for name, values in raw.items():
+        schedule[name] = js_round(values[:months])
+        np.copyto(schedule[name], np.nan, where=~paid)
+    # "homeValue ? ... : null" y "ltv ? round : null": sin valor o con LTV 0 queda vacío
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ltv = raw['balance'][:months] / batch.home_value
+    schedule['ltv'] = js_round(ltv, 6)
+    np.copyto(schedule['ltv'], np.nan, where=~paid | (ltv == 0) | (np.nan_to_num(batch.home_value) == 0))
+    schedule['payment_due'] = np.where(paid, js_round(payment), np.nan)
+    schedule['payment_year'] = np.ceil(np.arange(1, months + 1) / 12).astype(int)
+
+    last_payment = np.maximum(payments_made - 1, 0)
+    summary = {
+        "loan_amount": batch.loan_amount,
+        "interest_rate": rate,
+        "term_years": batch.term_years,
+        "monthly_payment_pi": payment,
+        "home_value": batch.home_value,
+        "total_payments": js_round(total_interest + total_principal),
+        "total_interest": js_round(total_interest),
+        "total_principal": js_round(total_principal),
+        "tax_bracket": tax_bracket,
+        "total_tax_returned": js_round(cumulative_tax),
+        "effective_interest_rate": rate * (1 - tax_bracket),
+        "actual_number_of_payments": payments_made,
+        "first_payment_date": batch.first_payment_date,
+        "last_payment_date": add_months(batch.first_payment_date, last_payment),
+    }
+    for name in ('total_payments', 'total_interest', 'total_principal', 'total_tax_returned', 'effective_interest_rate'):
+        summary[name] = np.where(batch.valid, summary[name], np.nan)
+    return {"schedule": schedule, "summary": summary, "months": months, "paid": paid}
+
+def balance_at_year(batch: LoanBatch, at_year: Union[int, np.ndarray]) -> Dict[str, np.ndarray]:
+    """calculateBalanceAtYear para toda la cartera (at_year escalar o uno por préstamo)"""
+    size = len(batch)
+    monthly_rate = batch.annual_interest_rate / 12
+    payment = batch_monthly_payment(batch)
+    number_of_payments = np.where(batch.valid, batch.term_years * 12, 0)
+    limit = np.minimum(np.broadcast_to(np.asarray(at_year) * 12, (size,)), number_of_payments).astype(int)
+
+    balance = np.where(batch.valid, batch.loan_amount, 0.0)
+    total_interest = np.zeros(size)
+    total_principal = np.zeros(size)
+    for month in range(1, int(limit.max(initial=0)) + 1):
+        step = month <= limit
+        interest_due = balance * monthly_rate
+        principal_paid = payment - interest_due
+        balance = np.where(step, balance - principal_paid, balance)
+        total_interest = np.where(step, total_interest + interest_due, total_interest)
+        total_principal = np.where(step, total_principal + principal_paid, total_principal)
+
+    invalid = lambda values: np.where(batch.valid, values, np.nan)
+    return {
+        "balance": invalid(js_round(balance)),
+        "interest_paid": invalid(js_round(total_interest)),
+        "principal_paid": invalid(js_round(total_principal)),
+    }
+
+def yearly_summary(amortization: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """
+    calculateYearlySummary para toda la cartera: matrices (años × préstamos).
+    Las sumas son secuenciales sobre los valores ya redondeados, como en el JS.
+    """
+    schedule = amortization["schedule"]
+    months = amortization["months"]
+    paid = amortization["paid"]
+    size = paid.shape[1]
+    years = -(-months // 12)
+
+    def padded(values: np.ndarray) -> np.ndarray:
+        """Meses agrupados por año (años × 12 × préstamos) con 0 donde no hay pago"""
+        out = np.zeros((years * 12, size), dtype=values.dtype)
+        np.copyto(out[:months], values, where=paid)
+        return out.reshape(years, 12, size)
+
+    def yearly_total(values: np.ndarray) -> np.ndarray:
+        """Suma mes a mes en orden, como el += del JS (sum usaría suma por pares)"""
+        by_month = padded(values)
+        total = np.zeros((years, size))
+        for month in range(12):
+            total += by_month[:, month]
+        return total
+
+    payments = padded(paid).sum(axis=1)
+    last_index = np.arange(1, years + 1)[:, None] * 12 - 1
+    last_index = np.minimum(last_index, amortization["summary"]["actual_number_of_payments"][None, :] - 1)
+    ending_balance = np.take_along_axis(
+        np.concatenate([schedule['balance'], np.full((1, size), np.nan)]), np.where(payments > 0, last_index, months), axis=0
+    )
+    has_payments = payments > 0
+    with_payments = lambda values: np.where(has_payments, js_round(values), np.nan)
+    return {
+        "year": np.arange(1, years + 1),
+        "payments": payments,
+        "total_interest": with_payments(yearly_total(schedule['interest_due'])),
+        "total_principal": with_payments(yearly_total(schedule['principal_paid'])),
+        "total_payment": with_payments(yearly_total(schedule['payment_due'])),
+        "ending_balance": with_payments(ending_balance),
+        "tax_returned": with_payments(yearly_total(schedule['tax_returned'])),
+    }
+
+def rate_scenarios(batch: LoanBatch, rate_deltas: Sequence[float]) -> Dict[str, np.ndarray]:
+    """Escenarios "what-if" de tipo: cuota P+I, PITI y flujo mensual (escenarios × préstamos)"""
+    deltas = np.asarray(rate_deltas, dtype=float)[:, None]
+    payment = monthly_payment(batch.loan_amount, batch.annual_interest_rate + deltas, batch.term_years)
+    payment = np.where(batch.valid, payment, np.nan)
+    scenario_piti = piti(payment, batch.yearly_property_taxes, batch.yearly_hoi, batch.monthly_pmi)
+    cash_flow = js_round(batch.monthly_rent - scenario_piti)
+    return {
+        "rate_delta": deltas[:, 0],
+        "monthly_payment_pi": payment,
+        "piti": scenario_piti,
+        "monthly_cash_flow": cash_flow,
+        "portfolio_monthly_cash_flow": np.nansum(cash_flow, axis=1),
+    }
+
+def portfolio_cash_flow(batch: LoanBatch) -> Dict[str, Any]:
+    """PITI y flujo mensual (renta - PITI) por préstamo y totales de la cartera"""
+    payment = batch_monthly_payment(batch)
+    loan_piti = piti(payment, batch.yearly_property_taxes, batch.yearly_hoi, batch.monthly_pmi)
+    cash_flow = js_round(batch.monthly_rent - loan_piti)
+    return {
+        "monthly_payment_pi": payment,
+        "piti": loan_piti,
+        "monthly_cash_flow": cash_flow,
+        "totals": {
+            "loans": len(batch),
+            "valid_loans": int(batch.valid.sum()),
+            "loan_amount": float(np.nansum(np.where(batch.valid, batch.loan_amount, np.nan))),
+            "monthly_piti": float(js_round(np.nansum(loan_piti))),
+            "monthly_rent": float(js_round(batch.monthly_rent.sum())),
+            "monthly_cash_flow": float(js_round(np.nansum(cash_flow))),
+        },
+    }
+
+# Lambda para pasar arrays a JSON (NaN/NaT -> null)
+to_json_value = lambda value: (
+    None if value is None or (isinstance(value, float) and np.isnan(value)) or (isinstance(value, np.datetime64) and np.isnat(value))
+    else str(value) if isinstance(value, np.datetime64)
+    else value.item() if isinstance(value, np.generic)
+    else value
+)
+
+def schedule_rows(batch: LoanBatch, amortization: Dict[str, Any], index: int) -> List[Dict[str, Any]]:
+    """Filas del schedule de un préstamo con las claves del JS (para guardar en mortgage_payment_schedule)"""
+    schedule = amortization["schedule"]
+    count = int(amortization["summary"]["actual_number_of_payments"][index])
+    dates = add_months(np.full(count, batch.first_payment_date[index]), np.arange(count))
+    return [
+        {
+            "payment_number": month + 1,
+            "payment_date": to_json_value(dates[month]),
+            "payment_year": int(schedule['payment_year'][month]),
+            "interest_rate": to_json_value(batch.annual_interest_rate[index]),
+            "interest_due": to_json_value(schedule['interest_due'][month, index]),
+            "payment_due": to_json_value(schedule['payment_due'][month, index]),
+            "extra_payments": to_json_value(schedule['extra_payments'][month, index]),
+            "principal_paid": to_json_value(schedule['principal_paid'][month, index]),
+            "balance": to_json_value(schedule['balance'][month, index]),
+            "ltv": to_json_value(schedule['ltv'][month, index]),
+            "tax_returned": to_json_value(schedule['tax_returned'][month, index]),
+            "cumulative_tax_returned": to_json_value(schedule['cumulative_tax_returned'][month, index]),
+        }
+        for month in range(count)
+    ]
+
+def portfolio_report(batch: LoanBatch, at_year: int = 5, rate_deltas: Sequence[float] = (),
+                     tax_bracket: float = DEFAULT_TAX_BRACKET, include_schedules: bool = False) -> Dict[str, Any]:
+    """Informe de cartera: por préstamo (PITI, flujo, saldo al año, totales) y escenarios de tipo"""
+    cash_flow = portfolio_cash_flow(batch)
+    amortization = amortize(batch, tax_bracket)
+    balances = balance_at_year(batch, at_year)
+    yearly = yearly_summary(amortization) if include_schedules else None
+    summary = amortization["summary"]
+
+    loans = []
+    for index, loan_id in enumerate(batch.ids):
+        loan = {
+            "id": loan_id,
+            "valid": bool(batch.valid[index]),
+            "monthly_payment_pi": to_json_value(cash_flow["monthly_payment_pi"][index]),
+            "piti": to_json_value(cash_flow["piti"][index]),
+            "monthly_cash_flow": to_json_value(cash_flow["monthly_cash_flow"][index]),
+            "balance_at_year": {key: to_json_value(values[index]) for key, values in balances.items()},
+            "total_interest": to_json_value(summary["total_interest"][index]),
+            "total_payments": to_json_value(summary["total_payments"][index]),
+        }
+        if include_schedules and batch.valid[index]:
+            loan["schedule"] = schedule_rows(batch, amortization, index)
+            loan["yearly_summary"] = [
+                {
+                    "year": int(year),
+                    **{key: to_json_value(yearly[key][row, index]) for key in yearly if key != 'year'},
+                }
+                for row, year in enumerate(yearly["year"])
+                if yearly["payments"][row, index]
+            ]
+        loans.append(loan)
+
+    report = {"at_year": at_year, "totals": cash_flow["totals"], "loans": loans}
+    if len(rate_deltas):
+        scenarios = rate_scenarios(batch, rate_deltas)
+        report["rate_scenarios"] = [
+            {
+                "rate_delta": float(delta),
+                "portfolio_monthly_cash_flow": float(js_round(scenarios["portfolio_monthly_cash_flow"][row])),
+                "monthly_payment_pi": [to_json_value(value) for value in scenarios["monthly_payment_pi"][row]],
+            }
+            for row, delta in enumerate(scenarios["rate_delta"])
+        ]
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='PITI, amortización y flujo de caja de una cartera de resultados extraídos')
+    parser.add_argument('--at-year', type=int, default=5, help='Año para el saldo pendiente de cada préstamo')
+    parser.add_argument('--rate-deltas', default='',
+                        help='Escenarios de tipo separados por coma, en puntos decimales (p.ej. -0.01,0.01)')
+    parser.add_argument('--tax-bracket', type=float, default=DEFAULT_TAX_BRACKET, help='Tramo fiscal para tax_returned')
+    parser.add_argument('--schedules', action='store_true', help='Incluye schedule y resumen anual completos por préstamo')
+    args = parser.parse_args()
+
+    # Entrada: JSON Lines de resultados de extract_data o de registros de --batch
+    records = [json.loads(line) for line in sys.stdin if line.strip()]
+    records = [record for record in records if record.get('ok', True)]
+    batch = LoanBatch.from_results(records, ids=[record.get('path', record.get('id', i)) for i, record in enumerate(records)])
+    deltas = [float(delta) for delta in args.rate_deltas.split(',') if delta]
+    print(json.dumps(portfolio_report(batch, args.at_year, deltas, args.tax_bracket, args.schedules), indent=2))
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Almacén columnar de la cartera a partir de los resultados de extracción
+Una fila por documento extraído: código de propiedad, clave del documento y
+una columna float64 por campo numérico del extractor, cada columna en su
+propio archivo binario que se amplía al añadir documentos y se lee con
+np.memmap, así que una consulta solo toca las columnas que usa
+"""
+
+import os
+import sys
+import json
+import argparse
+from typing import Optional, Dict, Any, Iterable, List, Tuple
+
+import numpy as np
+
+from extract_property_data_improved import RESULT_LAYOUT, ExtractionResult
+from portfolio_analytics import piti, to_json_value
+from reextract_processed import load_index, write_json_atomic
+
+STORE_DIR = '.portfolio_store'
+MANIFEST_NAME = 'manifest.json'
+STORE_VERSION = 1
+
+# Columnas numéricas: "grupo.clave" de los campos float/int de ExtractionResult (NaN = sin valor)
+NUMERIC_COLUMNS = tuple(
+    f"{group}.{key}"
+    for group, layout in RESULT_LAYOUT.items()
+    for key, attr in layout
+    if ExtractionResult.__annotations__[attr] in (Optional[float], Optional[int])
+)
+VALUE_DTYPE = np.dtype('<f8')
+PROPERTY_DTYPE = np.dtype('<i4')
+OFFSET_DTYPE = np.dtype('<u8')
+
+# Archivos de las columnas clave: código de propiedad (diccionario en properties.txt)
+# y clave del documento (fin de cada clave en document.off, texto utf-8 en document.txt)
+PROPERTY_FILE = 'property.i4'
+PROPERTY_NAMES_FILE = 'properties.txt'
+DOCUMENT_OFFSETS_FILE = 'document.off'
+DOCUMENT_KEYS_FILE = 'document.txt'
+
+# Código de propiedad de una fila sustituida por otra posterior del mismo documento (sus valores quedan en NaN)
+TOMBSTONE = -1
+
+# Filas que se acumulan en memoria antes de escribirlas
+DEFAULT_FLUSH_ROWS = 1024
+
+# Lambda para el archivo de una columna numérica
+column_file = lambda name: f"{name}.f8"
+
+class PortfolioStore:
+    """
+    Almacén columnar en un directorio, de un solo escritor.
+
+    append() acumula filas y flush() las añade al final de cada archivo de
+    columna y después reescribe el manifiesto (vía archivo temporal): el
+    manifiesto dice cuántas filas son válidas, así que un flush interrumpido
+    deja bytes de más que se ignoran al leer y se recortan al reabrir.
+
+    Cada clave de documento tiene una sola fila vigente: volver a añadir una
+    clave ya guardada añade una fila nueva al final (así sigue siendo el
+    último documento añadido, ver latest) y la anterior queda como tombstone
+    (propiedad TOMBSTONE y valores NaN); una que aún está pendiente sustituye
+    a la pendiente. Las filas se marcan después de guardar el manifiesto, y
+    si un flush se interrumpe antes, se marcan al reabrir.
+    """
+
+    def __init__(self, directory: str = STORE_DIR, flush_rows: int = DEFAULT_FLUSH_ROWS):
+        self.directory = directory
+        self.flush_rows = flush_rows
+        os.makedirs(directory, exist_ok=True)
+        self.manifest_path = os.path.join(directory, MANIFEST_NAME)
+        manifest = load_index(self.manifest_path)
+        if manifest.get('version') != STORE_VERSION or manifest.get('columns') != list(NUMERIC_COLUMNS):
+            manifest = {}
+        self.rows: int = manifest.get('rows', 0)
+        self.document_bytes: int = manifest.get('document_bytes', 0)
+        self.property_names: List[str] = self._read_property_names(manifest.get('properties', 0))
+        self.saved_properties = len(self.property_names)
+        self.property_codes = {name: code for code, name in enumerate(self.property_names)}
+        self._repair()
+        self.document_rows: Dict[str, int] = self._read_document_rows()
+        self.tombstones = int(np.count_nonzero(self.column('property') == TOMBSTONE))
+        self.pending: List[Tuple[int, bytes, List[float]]] = []
+        self.pending_rows: Dict[str, int] = {}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _read_property_names(self, count: int) -> List[str]:
+        try:
+            with open(self._path(PROPERTY_NAMES_FILE), encoding='utf-8') as f:
+                return [line.rstrip('\n') for _, line in zip(range(count), f)]
+        except OSError:
+            return []
+
+    def _repair(self) -> None:
+        """Recorta cada archivo al tamaño que dice el manifiesto (restos de un flush interrumpido)"""
+        sizes = {
+            PROPERTY_FILE: self.rows * PROPERTY_DTYPE.itemsize,
+            DOCUMENT_OFFSETS_FILE: self.rows * OFFSET_DTYPE.itemsize,
+            DOCUMENT_KEYS_FILE: self.document_bytes,
+            PROPERTY_NAMES_FILE: sum(len(name.encode('utf-8')) + 1 for name in self.property_names),
+            **{column_file(name): self.rows * VALUE_DTYPE.itemsize for name in NUMERIC_COLUMNS},
+        }
+        for name, size in sizes.items():
+            path = self._path(name)
+            if not os.path.exists(path):
+                open(path, 'wb').close()
+            if os.path.getsize(path) != size:
+                os.truncate(path, size)
+
+    def _read_document_rows(self) -> Dict[str, int]:
+        """
+        Fila vigente (la última) de cada clave de documento confirmada; las
+        anteriores que aún no son tombstone (flush interrumpido) se marcan ahora
+        """
+        if not self.rows:
+            return {}
+        ends = np.fromfile(self._path(DOCUMENT_OFFSETS_FILE), dtype=OFFSET_DTYPE, count=self.rows).tolist()
+        with open(self._path(DOCUMENT_KEYS_FILE), 'rb') as f:
+            data = f.read(self.document_bytes)
+        rows: Dict[str, int] = {}
+        replaced = []
+        for row, (start, end) in enumerate(zip([0] + ends, ends)):
+            key = data[start:end].decode('utf-8')
+            if key in rows:
+                replaced.append(rows[key])
+            rows[key] = row
+        codes = self.column('property')
+        self._bury([row for row in replaced if codes[row] != TOMBSTONE])
+        return rows
+
+    def _bury(self, rows: List[int]) -> None:
+        """Marca esas filas confirmadas como tombstone: propiedad TOMBSTONE y NaN en cada columna"""
+        if not rows:
+            return
+        rows = np.array(rows)
+        for name, dtype, value in [(PROPERTY_FILE, PROPERTY_DTYPE, TOMBSTONE)] + [
+                (column_file(name), VALUE_DTYPE, np.nan) for name in NUMERIC_COLUMNS]:
+            column = np.memmap(self._path(name), dtype=dtype, mode='r+', shape=(self.rows,))
+            column[rows] = value
+            column.flush()
+            del column
+
+    def append(self, property_name: str, document: str, result: Dict[str, Any]) -> bool:
+        """
+        Añade la fila de un documento con los campos numéricos de un resultado
+        de extract_data, sustituyendo la que ya tuviera. Devuelve True si el
+        documento es nuevo
+        """
+        property_name = property_name.replace('\n', ' ')
+        code = self.property_codes.get(property_name)
+        if code is None:
+            code = self.property_codes[property_name] = len(self.property_names)
+            self.property_names.append(property_name)
+        values = []
+        for name in NUMERIC_COLUMNS:
+            group, key = name.split('.')
+            value = (result.get(group) or {}).get(key)
+            values.append(np.nan if value is None else float(value))
+        added = document not in self.document_rows and document not in self.pending_rows
+        entry = (code, document.encode('utf-8'), values)
+        if document in self.pending_rows:
+            self.pending[self.pending_rows[document]] = entry
+        else:
+            self.pending_rows[document] = len(self.pending)
+            self.pending.append(entry)
+        if len(self.pending) >= self.flush_rows:
+            self.flush()
+        return added
+
+    def flush(self) -> None:
+        """
+        Escribe las filas pendientes al final de cada columna y después el
+        manifiesto; por último marca como tombstone las filas que sustituyen
+        """
+        if not self.pending:
+            return
+        replaced = [self.document_rows[document] for document in self.pending_rows if document in self.document_rows]
+        codes, keys, values = zip(*self.pending)
+        offsets = self.document_bytes + np.cumsum([len(key) for key in keys], dtype=OFFSET_DTYPE)
+        matrix = np.array(values, dtype=VALUE_DTYPE)
+
+        with open(self._path(PROPERTY_FILE), 'ab') as f:
+            f.write(np.array(codes, dtype=PROPERTY_DTYPE).tobytes())
+        with open(self._path(DOCUMENT_OFFSETS_FILE), 'ab') as f:
+            f.write(offsets.tobytes())
+        with open(self._path(DOCUMENT_KEYS_FILE), 'ab') as f:
+            f.write(b''.join(keys))
+        with open(self._path(PROPERTY_NAMES_FILE), 'a', encoding='utf-8') as f:
+            f.writelines(name + '\n' for name in self.property_names[self.saved_properties:])
+        for index, name in enumerate(NUMERIC_COLUMNS):
+            with open(self._path(column_file(name)), 'ab') as f:
+                f.write(np.ascontiguousarray(matrix[:, index]).tobytes())
+
+        self.document_rows.update((document, self.rows + index) for document, index in self.pending_rows.items())
+        self.rows += len(self.pending)
+        self.document_bytes = int(offsets[-1])
+        self.saved_properties = len(self.property_names)
+        self.pending, self.pending_rows = [], {}
+        self.save()
+        self._bury(replaced)
+        self.tombstones += len(replaced)
+
+    def save(self) -> None:
+        write_json_atomic(self.manifest_path, {
+            "version": STORE_VERSION,
+            "rows": self.rows,
+            "properties": len(self.property_names),
+            "document_bytes": self.document_bytes,
+            "columns": list(NUMERIC_COLUMNS),
+        })
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Columna numérica (o 'property' con los códigos, TOMBSTONE en las filas
+        sustituidas) mapeada en memoria, solo las filas confirmadas
+        """
+        if name == 'property':
+            path, dtype = PROPERTY_FILE, PROPERTY_DTYPE
+        elif name in NUMERIC_COLUMNS:
+            path, dtype = column_file(name), VALUE_DTYPE
+        else:
+            raise KeyError(f"Unknown column '{name}' (columns: property, {', '.join(NUMERIC_COLUMNS)})")
+        if not self.rows:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._path(path), dtype=dtype, mode='r', shape=(self.rows,))
+
+    def document(self, row: int) -> str:
+        """Clave del documento de una fila"""
+        offsets = np.memmap(self._path(DOCUMENT_OFFSETS_FILE), dtype=OFFSET_DTYPE, mode='r', shape=(self.rows,))
+        start = int(offsets[row - 1]) if row else 0
+        with open(self._path(DOCUMENT_KEYS_FILE), 'rb') as f:
+            f.seek(start)
+            return f.read(int(offsets[row]) - start).decode('utf-8')
+
+    def latest(self, columns: Iterable[str]) -> Dict[str, np.ndarray]:
+        """
+        Valor por propiedad de cada columna: el del último documento añadido
+        que lo trae (NaN si ninguno). Arrays indexados por código de propiedad.
+        """
+        codes = self.column('property')
+        latest = {}
+        for name in columns:
+            values = self.column(name)
+            rows = np.flatnonzero(~np.isnan(values))[::-1]
+            # np.unique da la primera aparición: sobre las filas invertidas, la última añadida
+            properties, first = np.unique(codes[rows], return_index=True)
+            out = np.full(len(self.property_names), np.nan)
+            out[properties] = values[rows[first]]
+            latest[name] = out
+        return latest
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Indicadores de cartera: deuda total (importe original de los préstamos),
+        tipo medio (en porcentaje, como lo extrae el parser), impuestos sobre
+        precio de compra y renta frente a PITI, con el último valor de cada propiedad
+        """
+        latest = self.latest(('loan.amount', 'loan.interest_rate', 'loan.monthly_payment', 'financial.purchase_price',
+                              'taxes.annual_amount', 'insurance.annual_premium', 'lease.monthly_rent'))
+        amount, rate = latest['loan.amount'], latest['loan.interest_rate']
+        with_rate = ~np.isnan(amount) & ~np.isnan(rate)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            tax_to_value = latest['taxes.annual_amount'] / latest['financial.purchase_price']
+        tax_to_value = tax_to_value[np.isfinite(tax_to_value)]
+
+        # PITI con la cuota P+I extraída; impuestos y seguro que falten cuentan como 0
+        payment, rent = latest['loan.monthly_payment'], latest['lease.monthly_rent']
+        comparable = ~np.isnan(payment) & ~np.isnan(rent)
+        property_piti = piti(payment[comparable], np.nan_to_num(latest['taxes.annual_amount'][comparable]),
+                             np.nan_to_num(latest['insurance.annual_premium'][comparable]))
+        cash_flow = rent[comparable] - property_piti
+        return {
+            "documents": self.rows - self.tombstones,
+            "properties": len(self.property_names),
+            "loans": int(np.count_nonzero(~np.isnan(amount))),
+            "total_loan_amount": to_json_value(float(np.nansum(amount))),
+            "average_interest_rate": to_json_value(float(np.mean(rate[with_rate]))) if with_rate.any() else None,
+            "weighted_interest_rate": (
+                to_json_value(float(np.average(rate[with_rate], weights=amount[with_rate])))
+                if with_rate.any() and amount[with_rate].sum() else None
+            ),
+            "tax_to_value": {
+                "properties": len(tax_to_value),
+                "mean": to_json_value(float(np.mean(tax_to_value))) if len(tax_to_value) else None,
+                "median": to_json_value(float(np.median(tax_to_value))) if len(tax_to_value) else None,
+            },
+            "rent_vs_piti": {
+                "properties": int(comparable.sum()),
+                "covered": int(np.count_nonzero(cash_flow >= 0)),
+                "monthly_rent": to_json_value(float(rent[comparable].sum())),
+                "monthly_piti": to_json_value(float(property_piti.sum())),
+                "monthly_cash_flow": to_json_value(float(cash_flow.sum())),
+            },
+        }
+
+    def describe(self) -> Dict[str, Any]:
+        """Filas (y cuántas están sustituidas), propiedades y valores no vacíos por columna"""
+        return {
+            "directory": self.directory,
+            "rows": self.rows,
+            "replaced_rows": self.tombstones,
+            "properties": len(self.property_names),
+            "columns": {name: int(np.count_nonzero(~np.isnan(self.column(name)))) for name in NUMERIC_COLUMNS},
+        }
+
+def append_records(store: PortfolioStore, records: Iterable[Dict[str, Any]]) -> int:
+    """
+    Añade registros JSON Lines de la extracción: los "document" de
+    ingest_pipeline o los de extract_property_data_improved.py --batch
+    (la propiedad sale de la ruta). Devuelve las filas añadidas; un
+    documento que ya estaba en el almacén sustituye su fila y no cuenta.
+    """
+    from ingest_pipeline import property_of
+
+    added = 0
+    for record in records:
+        if record.get('type', 'document') != 'document' or not record.get('ok', True) or 'result' not in record:
+            continue
+        path = record.get('path') or record.get('id') or ''
+        added += store.append(record.get('property') or property_of(path), path, record['result'])
+    return added
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Almacén columnar de la cartera (un archivo por campo numérico)')
+    parser.add_argument('store', nargs='?', default=STORE_DIR, help='Directorio del almacén')
+    parser.add_argument('--append', nargs='?', const='-', metavar='NDJSON',
+                        help='Añade los registros JSON Lines de ingest_pipeline o de --batch (por defecto, stdin)')
+    parser.add_argument('--describe', action='store_true', help='Filas, propiedades y valores por columna')
+    args = parser.parse_args()
+
+    with PortfolioStore(args.store) as store:
+        if args.append:
+            with (open(args.append, encoding='utf-8') if args.append != '-' else sys.stdin) as source:
+                added = append_records(store, (json.loads(line) for line in source if line.strip()))
+            store.flush()
+            print(json.dumps({"appended": added, "rows": store.rows}), file=sys.stderr)
+        print(json.dumps(store.describe() if args.describe else store.summary(), indent=2))
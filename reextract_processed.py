@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Re-extracción incremental del almacén de documentos procesados
+Cada Documents/*/processed/doc_*.json guarda en "regex_extraction" los campos
+extraídos con la huella del patrón que produjo cada uno; al cambiar un patrón
+solo se re-ejecutan esos campos y solo en los documentos afectados
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from typing import Optional, Dict, Any, List, Tuple
+
+from extract_property_data_improved import (
+    FIELD_PATTERNS,
+    FIELD_FINGERPRINTS,
+    RESULT_SCHEMA_VERSION,
+    build_result,
+    clean_input,
+    collect_batch_paths,
+    normalize_text,
+    scan_fields,
+)
+
+# Sección del JSON procesado donde se guarda la extracción por patrones
+SECTION = 'regex_extraction'
+
+# Índice por almacén: ruta -> (mtime, tamaño, huellas) para no abrir documentos al día
+INDEX_NAME = '.reextract_index.json'
+
+# Lambda para la huella del texto normalizado (si cambia, se re-extrae todo el documento)
+text_fingerprint = lambda text: hashlib.sha256(text.encode('utf-8', errors='ignore')).hexdigest()[:16]
+
+def load_index(path: str) -> Dict[str, Dict[str, Any]]:
+    """Índice guardado por la ejecución anterior (vacío si no existe o está corrupto)"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return index if isinstance(index, dict) else {}
+
+def write_json_atomic(path: str, data: Any, **dump_args) -> None:
+    """Reescribe un JSON en su sitio vía archivo temporal + os.replace"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, **dump_args)
+    os.replace(tmp_path, path)
+
+def index_is_current(entry: Optional[Dict[str, Any]], stat: os.stat_result) -> bool:
+    """El documento no cambió desde la última ejecución y todas sus huellas siguen vigentes"""
+    return (
+        entry is not None
+        and entry.get('mtime_ns') == stat.st_mtime_ns
+        and entry.get('size') == stat.st_size
+        and entry.get('schema_version') == RESULT_SCHEMA_VERSION
+        and entry.get('fingerprints') == FIELD_FINGERPRINTS
+    )
+
+def stale_fields(section: Optional[Dict[str, Any]], text_hash: str) -> List[str]:
+    """Campos a re-extraer: todos si no hay extracción previa o cambió el texto; si no, los de patrón cambiado"""
+    if (not isinstance(section, dict)
+            or section.get('schema_version') != RESULT_SCHEMA_VERSION
+            or section.get('text_fingerprint') != text_hash):
+        return list(FIELD_PATTERNS)
+    fingerprints = section.get('fingerprints') or {}
+    fields = section.get('fields') or {}
+    return [key for key in FIELD_PATTERNS if key not in fields or fingerprints.get(key) != FIELD_FINGERPRINTS[key]]
+
+def reextract_document(path: str, full: bool = False, dry_run: bool = False) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    Re-extrae los campos obsoletos de un documento procesado y lo reescribe.
+    Devuelve los campos re-extraídos y los que cambiaron de valor.
+    """
+    with open(path, encoding='utf-8') as f:
+        doc = json.load(f)
+
+    text = normalize_text(clean_input(doc.get('raw_text') or ''))
+    text_hash = text_fingerprint(text)
+    section = doc.get(SECTION)
+    keys = list(FIELD_PATTERNS) if full else stale_fields(section, text_hash)
+    if not keys:
+        return [], {}
+
+    # En una re-extracción parcial los campos no obsoletos se conservan tal cual
+    previous = {} if len(keys) == len(FIELD_PATTERNS) else section['fields']
+    fresh = scan_fields(text, keys=keys)
+    changed = {key: fresh[key] for key in keys if fresh[key] != previous.get(key)}
+    if dry_run:
+        return keys, changed
+
+    extracted = {key: fresh[key] if key in fresh else previous.get(key) for key in FIELD_PATTERNS}
+    doc[SECTION] = {
+        "schema_version": RESULT_SCHEMA_VERSION,
+        "text_fingerprint": text_hash,
+        "fingerprints": dict(FIELD_FINGERPRINTS),
+        "fields": extracted,
+        "result": build_result(extracted, len(text), '', debug=False),
+        "updated_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    # Mismo formato que escribe el pipeline de Node (JSON.stringify(result, null, 2))
+    write_json_atomic(path, doc, ensure_ascii=False, indent=2)
+    return keys, changed
+
+def reextract_store(source: str, full: bool = False, dry_run: bool = False) -> Dict[str, Any]:
+    """Re-extracción incremental de todo un almacén (directorio o manifiesto de rutas)"""
+    started = time.perf_counter()
+    root = source if os.path.isdir(source) else os.path.dirname(os.path.abspath(source))
+    index_path = os.path.join(root, INDEX_NAME)
+    index = {} if full else load_index(index_path)
+    paths = [path for path in collect_batch_paths(source) if path.endswith('.json')]
+
+    stats = {"documents": len(paths), "skipped": 0, "updated": 0, "errors": 0, "fields": {}, "changed_values": 0}
+    for path in paths:
+        rel_path = os.path.relpath(path, root)
+        try:
+            if index_is_current(index.get(rel_path), os.stat(path)):
+                stats["skipped"] += 1
+                continue
+            keys, changed = reextract_document(path, full, dry_run)
+        # Un JSON mal formado (raw_text o secciones con otro tipo) no debe parar el lote
+        except Exception as e:
+            stats["errors"] += 1
+            print(json.dumps({"path": path, "error": f"{type(e).__name__}: {e}"}), file=sys.stderr)
+            continue
+
+        if keys:
+            stats["updated"] += 1
+            stats["changed_values"] += len(changed)
+            for key in keys:
+                stats["fields"][key] = stats["fields"].get(key, 0) + 1
+        else:
+            stats["skipped"] += 1
+        if not dry_run:
+            stat = os.stat(path)
+            index[rel_path] = {
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "schema_version": RESULT_SCHEMA_VERSION,
+                "fingerprints": dict(FIELD_FINGERPRINTS),
+            }
+
+    if not dry_run:
+        live = {os.path.relpath(path, root) for path in paths}
+        write_json_atomic(index_path, {key: value for key, value in index.items() if key in live}, indent=2)
+    stats["elapsed_s"] = round(time.perf_counter() - started, 3)
+    return stats
+
+if __name__ == "__main__":
+    default_store = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Documents')
+    parser = argparse.ArgumentParser(description='Re-extrae solo los campos cuyo patrón cambió en los documentos procesados')
+    parser.add_argument('source', nargs='?', default=default_store,
+                        help='Directorio del almacén (busca processed/*.json) o manifiesto con una ruta por línea')
+    parser.add_argument('--full', action='store_true', help='Ignora huellas e índice y re-extrae todo')
+    parser.add_argument('--dry-run', action='store_true', help='Solo informa qué campos y documentos se re-extraerían')
+    args = parser.parse_args()
+
+    stats = reextract_store(args.source, args.full, args.dry_run)
+    print(json.dumps(stats, indent=2))
+    sys.exit(1 if stats["errors"] else 0)
@@ -0,0 +1,673 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extracción de componentes de React a frontend/src/views/
+Tokeniza cada archivo una sola vez (cadenas, plantillas, comentarios, regex y
+JSX), localiza las declaraciones de primer nivel por llaves y saca los
+componentes pedidos a su propio archivo con los imports que usan; puede
+recorrer todo frontend/src en paralelo y enseñar el diff sin escribir nada
+"""
+
+import os
+import re
+import sys
+import difflib
+import argparse
+from multiprocessing import Pool
+from typing import Optional, Dict, Any, List, Tuple
+
+DEFAULT_SOURCE = os.path.join('frontend', 'src', 'App.js')
+SOURCE_EXTENSIONS = ('.js', '.jsx')
+SKIP_DIRS = ('node_modules', 'build')
+
+IDENT_START = re.compile(r'[A-Za-z_$]')
+IDENT = re.compile(r'[A-Za-z_$][\w$]*')
+NUMBER = re.compile(r'\d[\w.]*|\.\d[\w]*')
+JSX_NAME = re.compile(r'[A-Za-z_$][\w$.:-]*')
+JSX_ATTR = re.compile(r'[A-Za-z_$][\w$:-]*')
+PUNCTUATORS = ('===', '!==', '...', '**=', '=>', '==', '!=', '<=', '>=', '&&', '||', '??', '?.', '++', '--',
+               '+=', '-=', '*=', '/=', '%=', '**')
+
+# Después de estos tokens, "<" abre JSX y "/" abre una regex (no son operadores binarios)
+EXPRESSION_START = {None, '(', ',', '=', ':', '?', '[', '{', '}', ';', '!', '&&', '||', '??', '=>', '+', '-',
+                    '*', '%', '==', '===', '!=', '!==', '<', '>', '<=', '>=', 'return', 'typeof', 'case',
+                    'default', 'in', 'of', 'new', 'delete', 'void', 'throw', 'yield', 'await', 'else', 'do'}
+# Un salto de línea antes de estos tokens no termina la declaración (la expresión sigue)
+CONTINUATIONS = {'.', '?.', '?', ':', '=>', '=', ',', '(', '[', ')', ']', '}', '+', '-', '*', '/', '%', '&&', '||',
+                 '??', '==', '===', '!=', '!==', '<', '>', '<=', '>=', 'instanceof', 'in'}
+BLANK_LINE = re.compile(r'^[ \t]*\n', re.M)
+OPENERS = {'(': ')', '[': ']', '{': '}'}
+DECLARATIONS = ('function', 'const', 'let', 'var', 'class')
+
+# Lambda para saber si un nombre es de componente (PascalCase; las constantes EN_MAYÚSCULAS no)
+is_component_name = lambda name: name[:1].isupper() and not name.isupper()
+
+class ScanError(ValueError):
+    """Código que el escáner no sabe cerrar (llave, cadena o JSX sin terminar)"""
+
+class Token:
+    """Token de código: tipo (ident, punct, string, template, regex, number, jsx_attr), texto, posición y profundidad"""
+
+    __slots__ = ('kind', 'value', 'start', 'end', 'depth')
+
+    def __init__(self, kind: str, value: str, start: int, end: int, depth: int):
+        self.kind = kind
+        self.value = value
+        self.start = start
+        self.end = end
+        self.depth = depth
+
+class Scanner:
+    """
+    Tokenizador de JavaScript con JSX en una sola pasada.
+
+    Ignora comentarios y el texto de JSX (donde un apóstrofo no abre una
+    cadena), entra en las expresiones ${...} de las plantillas y en las
+    {...} del JSX, y anota en cada token cuántos paréntesis, corchetes o
+    llaves lo rodean: los de profundidad 0 son el primer nivel del archivo.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+        self.depth = 0
+        self.tokens: List[Token] = []
+
+    def scan(self) -> List[Token]:
+        self.scan_js(None)
+        return self.tokens
+
+    def error(self, message: str, pos: int):
+        line = self.text.count('\n', 0, pos) + 1
+        raise ScanError(f"{message} at line {line}")
+
+    def add(self, kind: str, start: int, end: int) -> Token:
+        token = Token(kind, self.text[start:end], start, end, self.depth)
+        self.tokens.append(token)
+        self.pos = end
+        return token
+
+    def previous(self) -> Optional[str]:
+        if not self.tokens:
+            return None
+        token = self.tokens[-1]
+        return token.value if token.kind in ('punct', 'ident') else '<value>'
+
+    def skip_trivia(self) -> None:
+        text, length = self.text, len(self.text)
+        while self.pos < length:
+            char = text[self.pos]
+            if char in ' \t\r\n﻿':
+                self.pos += 1
+            elif text.startswith('//', self.pos):
+                end = text.find('\n', self.pos)
+                self.pos = length if end < 0 else end
+            elif text.startswith('/*', self.pos):
+                end = text.find('*/', self.pos + 2)
+                if end < 0:
+                    self.error('Unterminated comment', self.pos)
+                self.pos = end + 2
+            else:
+                return
+
+    def scan_js(self, closer: Optional[str]) -> None:
+        """Tokens de código hasta el cierre `closer` sin emparejar (None: hasta el final)"""
+        text, length = self.text, len(self.text)
+        stack: List[str] = []
+        while True:
+            self.skip_trivia()
+            if self.pos >= length:
+                if closer is not None or stack:
+                    self.error(f"Missing '{stack[-1] if stack else closer}'", length)
+                return
+            start, char = self.pos, text[self.pos]
+            if char == closer and not stack:
+                self.pos += 1
+                return
+            if char in OPENERS:
+                self.add('punct', start, start + 1)
+                stack.append(OPENERS[char])
+                self.depth += 1
+            elif char in ')]}':
+                if not stack or stack[-1] != char:
+                    self.error(f"Unexpected '{char}'", start)
+                stack.pop()
+                self.depth -= 1
+                self.add('punct', start, start + 1)
+            elif char in '\'"':
+                self.add('string', start, self.string_end(start))
+            elif char == '`':
+                self.scan_template(start)
+            elif IDENT_START.match(char):
+                self.add('ident', start, IDENT.match(text, start).end())
+            elif char.isdigit() or (char == '.' and text[start + 1:start + 2].isdigit()):
+                self.add('number', start, NUMBER.match(text, start).end())
+            elif char == '<' and self.previous() in EXPRESSION_START and re.match(r'<[A-Za-z>]', text[start:start + 2]):
+                self.scan_jsx_element(start)
+            elif char == '/' and self.previous() in EXPRESSION_START:
+                self.add('regex', start, self.regex_end(start))
+            else:
+                punct = next((p for p in PUNCTUATORS if text.startswith(p, start)), char)
+                self.add('punct', start, start + len(punct))
+
+    def string_end(self, start: int) -> int:
+        quote, text, pos = self.text[start], self.text, start + 1
+        while pos < len(text):
+            char = text[pos]
+            if char == '\\':
+                pos += 2
+                continue
+            if char == quote:
+                return pos + 1
+            if char == '\n':
+                break
+            pos += 1
+        self.error('Unterminated string', start)
+
+    def regex_end(self, start: int) -> int:
+        text, pos, in_class = self.text, start + 1, False
+        while pos < len(text) and text[pos] != '\n':
+            char = text[pos]
+            if char == '\\':
+                pos += 2
+                continue
+            if char == '[':
+                in_class = True
+            elif char == ']':
+                in_class = False
+            elif char == '/' and not in_class:
+                return IDENT.match(text, pos + 1).end() if IDENT_START.match(text[pos + 1:pos + 2]) else pos + 1
+            pos += 1
+        self.error('Unterminated regular expression', start)
+
+    def scan_template(self, start: int) -> None:
+        """Plantilla `...` con sus expresiones ${...} tokenizadas como código"""
+        text, pos = self.text, start + 1
+        while pos < len(text):
+            char = text[pos]
+            if char == '\\':
+                pos += 2
+            elif char == '`':
+                self.add('template', start, pos + 1)
+                return
+            elif text.startswith('${', pos):
+                self.add('template', start, pos + 2)
+                self.depth += 1
+                self.scan_js('}')
+                self.depth -= 1
+                start = pos = self.pos - 1
+                pos += 1
+            else:
+                pos += 1
+        self.error('Unterminated template literal', start)
+
+    def scan_jsx_expression(self) -> None:
+        """{...} dentro de JSX: código hasta la llave que la cierra"""
+        self.add('punct', self.pos, self.pos + 1)
+        self.depth += 1
+        self.scan_js('}')
+        self.depth -= 1
+
+    def scan_jsx_element(self, start: int) -> None:
+        """Elemento JSX completo (etiqueta, atributos e hijos); el nombre de la etiqueta es un identificador"""
+        text = self.text
+        self.pos = start + 1
+        self.depth += 1
+        self.tokens.append(Token('punct', '<', start, start + 1, self.depth - 1))
+        name = JSX_NAME.match(text, self.pos)
+        if name:
+            self.add('ident', name.start(), name.end())
+        # Atributos hasta ">" o "/>"
+        while True:
+            self.skip_trivia()
+            if self.pos >= len(text):
+                self.error('Unterminated JSX tag', start)
+            char = text[self.pos]
+            if text.startswith('/>', self.pos):
+                self.pos += 2
+                self.depth -= 1
+                return
+            if char == '>':
+                self.pos += 1
+                break
+            if char == '{':
+                self.scan_jsx_expression()
+            elif char in '\'"':
+                self.add('string', self.pos, self.jsx_string_end(self.pos))
+            elif char == '=':
+                self.pos += 1
+            elif char == '<':
+                self.scan_jsx_element(self.pos)
+            else:
+                attr = JSX_ATTR.match(text, self.pos)
+                if not attr:
+                    self.error(f"Unexpected '{char}' in JSX tag", self.pos)
+                self.add('jsx_attr', attr.start(), attr.end())
+        # Hijos: texto libre, {expresiones} y elementos hasta la etiqueta de cierre
+        while self.pos < len(text):
+            char = text[self.pos]
+            if text.startswith('</', self.pos):
+                end = text.find('>', self.pos)
+                if end < 0:
+                    break
+                closing = JSX_NAME.match(text, self.pos + 2)
+                if closing:
+                    self.add('ident', closing.start(), closing.end())
+                self.pos = end + 1
+                self.depth -= 1
+                return
+            if char == '<':
+                self.scan_jsx_element(self.pos)
+            elif char == '{':
+                self.scan_jsx_expression()
+            else:
+                self.pos += 1
+        self.error('Unterminated JSX element', start)
+
+    def jsx_string_end(self, start: int) -> int:
+        # Las cadenas de atributos JSX no tienen escapes y pueden ocupar varias líneas
+        end = self.text.find(self.text[start], start + 1)
+        if end < 0:
+            self.error('Unterminated JSX attribute', start)
+        return end + 1
+
+class Statement:
+    """Sentencia de primer nivel: tramo [start, end), tokens, tipo y nombres que declara"""
+
+    __slots__ = ('start', 'end', 'tokens', 'kind', 'names', 'exported')
+
+    def __init__(self, tokens: List[Token]):
+        self.tokens = tokens
+        self.start = tokens[0].start
+        self.end = tokens[-1].end
+        values = [token.value for token in tokens[:5]]
+        self.exported = values[0] == 'export'
+        head = values[1:] if self.exported else values
+        if head[:1] == ['default']:
+            head = head[1:]
+        if head[:1] == ['async']:
+            head = head[1:]
+        self.kind = head[0] if head and head[0] in DECLARATIONS + ('import',) else 'other'
+        self.names: List[str] = []
+        if self.kind in DECLARATIONS:
+            index = next(i for i, token in enumerate(tokens) if token.value == self.kind) + 1
+            if index < len(tokens) and tokens[index].kind == 'ident':
+                self.names.append(tokens[index].value)
+
+def split_statements(tokens: List[Token], text: str) -> List[Statement]:
+    """
+    Agrupa los tokens en sentencias de primer nivel: terminan en ";" de
+    profundidad 0, al cerrar el cuerpo de una function/class, o en un salto
+    de línea que no continúa la expresión (inserción automática de ";").
+    """
+    statements, current = [], []
+    for index, token in enumerate(tokens):
+        if current and token.depth == 0 and token.value not in CONTINUATIONS and '\n' in text[current[-1].end:token.start]:
+            last = current[-1]
+            if last.kind != 'punct' or last.value in (')', ']', '}'):
+                if last.value != '}' or not block_continues(current):
+                    statements.append(Statement(current))
+                    current = []
+        current.append(token)
+        if token.depth == 0 and token.value == ';':
+            statements.append(Statement(current))
+            current = []
+        elif token.depth == 0 and token.value == '}' and is_block_declaration(current):
+            statements.append(Statement(current))
+            current = []
+    if current:
+        statements.append(Statement(current))
+    return statements
+
+def is_block_declaration(tokens: List[Token]) -> bool:
+    """Una function o class de primer nivel (no una expresión) termina con su llave de cierre"""
+    values = [token.value for token in tokens[:4] if token.depth == 0]
+    while values and values[0] in ('export', 'default', 'async'):
+        values = values[1:]
+    return bool(values) and values[0] in ('function', 'class')
+
+def block_continues(tokens: List[Token]) -> bool:
+    # `const X = {...}` sin ";" termina en el salto de línea; un if/for/while de primer nivel no
+    return tokens[0].value in ('if', 'for', 'while', 'else', 'try', 'catch', 'finally', 'switch')
+
+def has_jsx(tokens: List[Token]) -> bool:
+    """Si hay algún elemento JSX (un "<" seguido del nombre de etiqueta, un nivel más adentro)"""
+    return any(
+        token.value == '<' and token.kind == 'punct' and index + 1 < len(tokens)
+        and tokens[index + 1].kind == 'ident' and tokens[index + 1].depth > token.depth
+        for index, token in enumerate(tokens)
+    )
+
+def used_identifiers(tokens: List[Token]) -> set:
+    """Identificadores leídos por unos tokens: todos menos las propiedades (a.b) y los atributos JSX"""
+    used, previous = set(), None
+    for token in tokens:
+        if token.kind == 'ident' and previous not in ('.', '?.'):
+            used.add(token.value.split('.')[0])
+        previous = token.value
+    return used
+
+class SourceFile:
+    """Archivo de código tokenizado: texto (sin BOM y con \\n), estilo de línea y sentencias"""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            raw = f.read()
+        self.path = path
+        self.raw = raw
+        self.bom = raw.startswith(b'\xef\xbb\xbf')
+        text = raw.decode('utf-8-sig')
+        self.newline = '\r\n' if '\r\n' in text else '\n'
+        self.text = text.replace('\r\n', '\n')
+        self.tokens = Scanner(self.text).scan()
+        self.statements = split_statements(self.tokens, self.text)
+        self.imports = [parse_import(statement) for statement in self.statements if statement.kind == 'import']
+        self.declared = {name: statement for statement in self.statements for name in statement.names}
+        self.default_export = next((
+            statement.tokens[2].value for statement in self.statements
+            if [token.value for token in statement.tokens[:2]] == ['export', 'default'] and len(statement.tokens) > 2
+        ), None)
+
+    def components(self) -> List[str]:
+        """Componentes extraíbles: funciones (o const con una función) PascalCase no exportadas"""
+        return [
+            name for name, statement in self.declared.items()
+            if is_component_name(name) and not statement.exported and name != self.default_export
+            and (statement.kind in ('function', 'class') or any(token.value in ('=>', 'function') for token in statement.tokens))
+        ]
+
+    def encode(self, text: str) -> bytes:
+        return (('﻿' if self.bom else '') + text.replace('\n', self.newline)).encode('utf-8')
+
+def parse_import(statement: Statement) -> Dict[str, Any]:
+    """import default, { a as b }, * as ns from 'x' -> {source, default, named [(importado, local)], namespace}"""
+    values = [token.value for token in statement.tokens if token.value != ';']
+    result = {"statement": statement, "source": None, "default": None, "named": [], "namespace": None}
+    strings = [token.value for token in statement.tokens if token.kind == 'string']
+    result["source"] = strings[-1][1:-1] if strings else None
+    index = 1
+    while index < len(values) and values[index] != 'from' and values[index][:1] not in '\'"':
+        value = values[index]
+        if value == '*':
+            result["namespace"] = values[index + 2]
+            index += 3
+        elif value == '{':
+            index += 1
+            while values[index] != '}':
+                imported = values[index]
+                if values[index + 1] == 'as':
+                    result["named"].append((imported, values[index + 2]))
+                    index += 3
+                else:
+                    result["named"].append((imported, imported))
+                    index += 1
+                if values[index] == ',':
+                    index += 1
+            index += 1
+        elif value == ',':
+            index += 1
+        else:
+            result["default"] = value
+            index += 1
+    return result
+
+# Lambda para los nombres locales que introduce un import
+import_locals = lambda spec: [name for name in [spec["default"], spec["namespace"]] if name] + [local for _, local in spec["named"]]
+
+def format_import(spec: Dict[str, Any], keep: set, source: str) -> str:
+    """Sentencia import con solo los nombres de keep (en una línea)"""
+    parts = []
+    if spec["default"] in keep:
+        parts.append(spec["default"])
+    if spec["namespace"] in keep:
+        parts.append(f"* as {spec['namespace']}")
+    named = [imported if imported == local else f"{imported} as {local}" for imported, local in spec["named"] if local in keep]
+    if named:
+        parts.append('{ ' + ', '.join(named) + ' }')
+    return f"import {', '.join(parts)} from '{source}';"
+
+def rebase_import(source: str, from_dir: str, to_dir: str) -> str:
+    """Ruta relativa de un import vista desde otro directorio (los paquetes no cambian)"""
+    if not source.startswith('.'):
+        return source
+    rebased = os.path.relpath(os.path.normpath(os.path.join(from_dir, source)), to_dir).replace(os.sep, '/')
+    return rebased if rebased.startswith('.') else './' + rebased
+
+def statement_extent(source: SourceFile, statement: Statement) -> Tuple[int, int]:
+    """Tramo a cortar: la sentencia con sus comentarios pegados encima y el resto de su última línea"""
+    text = source.text
+    index = source.statements.index(statement)
+    previous_end = source.statements[index - 1].end if index else 0
+    line_start = text.rfind('\n', 0, statement.start) + 1
+    # Comentarios entre la última línea vacía (o la línea de la sentencia anterior) y esta
+    gap_start = text.find('\n', previous_end, line_start) + 1 if index else 0
+    blanks = list(BLANK_LINE.finditer(text, gap_start, line_start))
+    start = blanks[-1].end() if blanks else gap_start
+    end = text.find('\n', statement.end)
+    return start, len(text) if end < 0 else end + 1
+
+def plan_file(path: str, names: Optional[List[str]], views_dir: str, min_lines: int = 0,
+              overwrite: bool = False) -> Dict[str, Any]:
+    """
+    Planifica la extracción de un archivo sin escribir nada.
+
+    names son los componentes a sacar (None: todos los extraíbles con al
+    menos min_lines líneas). Devuelve {path, components, writes: {ruta:
+    (antes, después)}, error}; un componente que usa otra declaración de
+    primer nivel que se queda en el archivo no se puede sacar sin exportarla,
+    así que es un error (hay que sacarlas juntas).
+    """
+    try:
+        source = SourceFile(path)
+    except (OSError, UnicodeDecodeError, ScanError) as e:
+        return {"path": path, "components": [], "writes": {}, "error": f"{type(e).__name__}: {e}"}
+
+    available = source.components()
+    if names is None:
+        names = [
+            name for name in available
+            if source.text.count('\n', source.declared[name].start, source.declared[name].end) + 1 >= min_lines
+        ]
+    else:
+        # Al recorrer un árbol, cada archivo saca solo los componentes pedidos que declara
+        names = [name for name in names if name in available]
+    if not names:
+        return {"path": path, "components": [], "writes": {}, "error": None}
+
+    source_dir = os.path.dirname(os.path.abspath(path))
+    views_dir = os.path.abspath(views_dir)
+    extracted = set(names)
+    import_names = {name: spec for spec in source.imports for name in import_locals(spec)}
+    writes: Dict[str, Tuple[bytes, bytes]] = {}
+    cut: List[Tuple[int, int]] = []
+
+    for name in names:
+        statement = source.declared[name]
+        target = os.path.join(views_dir, name + '.js')
+        if os.path.exists(target) and not overwrite:
+            return {"path": path, "components": [], "writes": {}, "error": f"{target} already exists (use --force)"}
+        used = used_identifiers(statement.tokens) - {name}
+        local = sorted(used & set(source.declared) - extracted)
+        if local:
+            return {"path": path, "components": [], "writes": {},
+                    "error": f"{name} uses {', '.join(local)} from {path}; extract them together"}
+
+        lines = []
+        uses_jsx = has_jsx(statement.tokens)
+        for spec in source.imports:
+            if spec["source"] is None or not import_locals(spec):
+                continue
+            keep = used & set(import_locals(spec))
+            if spec["source"] == 'react' and uses_jsx and spec["default"]:
+                keep.add(spec["default"])
+            if keep:
+                lines.append(format_import(spec, keep, rebase_import(spec["source"], source_dir, views_dir)))
+        lines += [f"import {other} from './{other}';" for other in sorted(used & extracted)]
+
+        start, end = statement_extent(source, statement)
+        cut.append((start, end))
+        block = source.text[start:end].rstrip('\n')
+        content = '\n'.join(lines) + '\n\n' + block + f"\n\nexport default {name};\n"
+        if os.path.exists(target):
+            with open(target, 'rb') as f:
+                writes[target] = (f.read(), source.encode(content))
+        else:
+            writes[target] = (b'', source.encode(content))
+
+    # Archivo original sin los componentes, con sus imports y sin los nombres que ya no usa
+    cut.sort()
+    remaining, position = [], 0
+    for start, end in cut:
+        remaining.append(source.text[position:start])
+        position = end
+    remaining.append(source.text[position:])
+    kept_tokens = [token for statement in source.statements
+                   if not any(start <= statement.start < end for start, end in cut)
+                   for token in statement.tokens if statement.kind != 'import']
+    still_used = used_identifiers(kept_tokens)
+    if has_jsx(kept_tokens):
+        still_used.add('React')
+    moved_used = set().union(*(used_identifiers(source.declared[name].tokens) for name in names))
+
+    text = ''.join(remaining)
+    replacements = []
+    for spec in source.imports:
+        locals_ = set(import_locals(spec))
+        orphaned = locals_ & moved_used - still_used
+        if not orphaned:
+            continue
+        statement = spec["statement"]
+        keep = locals_ - orphaned
+        replacements.append((statement.start, statement.end,
+                             format_import(spec, keep, spec["source"]) if keep else ''))
+    new_imports = []
+    for name in names:
+        if name in still_used:
+            relative = os.path.relpath(os.path.join(views_dir, name), source_dir).replace(os.sep, '/')
+            new_imports.append(f"import {name} from '{relative if relative.startswith('.') else './' + relative}';")
+    text = apply_replacements(source, text, cut, replacements, new_imports)
+    writes[path] = (source.raw, source.encode(text))
+    return {"path": path, "components": names, "writes": writes, "error": None}
+
+def apply_replacements(source: SourceFile, text: str, cut: List[Tuple[int, int]],
+                       replacements: List[Tuple[int, int, str]], new_imports: List[str]) -> str:
+    """Reescribe los imports (antes de los cortes, así que sus posiciones siguen valiendo) y colapsa líneas vacías"""
+    # Lambda para trasladar una posición del texto original al texto ya cortado
+    shift = lambda position: position - sum(end - start for start, end in cut if end <= position)
+    imports = [spec["statement"] for spec in source.imports]
+    anchor = shift(source.text.find('\n', imports[-1].end) + 1) if imports else 0
+    edits = [(shift(start), shift(end), value) for start, end, value in replacements]
+    if new_imports:
+        edits.append((anchor, anchor, '\n'.join(new_imports) + '\n'))
+    for start, end, value in sorted(edits, key=lambda edit: (edit[0], edit[1]), reverse=True):
+        if not value and text[end:end + 1] == '\n':
+            end += 1
+        text = text[:start] + value + text[end:]
+    return re.sub(r'\n{3,}', '\n\n', text)
+
+def collect_sources(paths: List[str]) -> List[str]:
+    """Archivos .js/.jsx de las rutas (los directorios se recorren enteros)"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += [
+                os.path.join(root, name)
+                for root, dirs, names in os.walk(path)
+                if not any(part in SKIP_DIRS for part in root.split(os.sep))
+                for name in names
+                if name.endswith(SOURCE_EXTENSIONS)
+            ]
+        else:
+            files.append(path)
+    return sorted(files)
+
+def default_views_dir(path: str) -> str:
+    """views/ del directorio src más cercano (o junto al archivo)"""
+    directory = os.path.abspath(path if os.path.isdir(path) else os.path.dirname(path))
+    probe = directory
+    while os.path.basename(probe) != 'src' and os.path.dirname(probe) != probe:
+        probe = os.path.dirname(probe)
+    return os.path.join(probe if os.path.basename(probe) == 'src' else directory, 'views')
+
+def plan_worker(job: Tuple[str, Optional[List[str]], str, int, bool]) -> Dict[str, Any]:
+    """Worker del pool (función de módulo para poder serializarla)"""
+    return plan_file(*job)
+
+def render_diff(path: str, before: bytes, after: bytes) -> str:
+    old = before.decode('utf-8-sig').replace('\r\n', '\n').splitlines(keepends=True)
+    new = after.decode('utf-8-sig').replace('\r\n', '\n').splitlines(keepends=True)
+    label = os.path.relpath(path)
+    return ''.join(difflib.unified_diff(old, new, 'a/' + label if before else '/dev/null', 'b/' + label))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Extrae componentes de React a su propio archivo en views/')
+    parser.add_argument('paths', nargs='*', default=[DEFAULT_SOURCE],
+                        help=f'Archivos o directorios (p.ej. frontend/src); por defecto {DEFAULT_SOURCE}')
+    parser.add_argument('--components', default='', metavar='NAME,...',
+                        help='Componentes a extraer (p.ej. ReportsView,SettingsView)')
+    parser.add_argument('--all', action='store_true',
+                        help='Extrae todos los componentes de primer nivel no exportados')
+    parser.add_argument('--min-lines', type=int, default=0,
+                        help='Con --all, solo los componentes de al menos estas líneas')
+    parser.add_argument('--views-dir', default=None,
+                        help='Directorio de destino (por defecto, src/views)')
+    parser.add_argument('--list', action='store_true',
+                        help='Solo lista los componentes extraíbles de cada archivo')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Muestra el diff sin escribir nada')
+    parser.add_argument('--force', action='store_true',
+                        help='Sobrescribe los archivos de views/ que ya existan')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Procesos para analizar los archivos (por defecto, todos los cores)')
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.components.split(',') if name.strip()] or None
+    if not args.list and names is None and not args.all:
+        parser.error('Indica --components, --all o --list')
+    views_dir = args.views_dir or default_views_dir(args.paths[0])
+    files = collect_sources(args.paths)
+
+    if args.list:
+        for path in files:
+            try:
+                source = SourceFile(path)
+            except (OSError, UnicodeDecodeError, ScanError) as e:
+                print(f"{path}: {type(e).__name__}: {e}", file=sys.stderr)
+                continue
+            for name in source.components():
+                statement = source.declared[name]
+                print(f"{path}\t{name}\t{source.text.count(chr(10), statement.start, statement.end) + 1} lines")
+        sys.exit(0)
+
+    jobs = [(path, names, views_dir, args.min_lines, args.force) for path in files]
+    if len(jobs) > 1:
+        with Pool(args.workers) as pool:
+            plans = pool.map(plan_worker, jobs, chunksize=max(1, len(jobs) // 32))
+    else:
+        plans = [plan_worker(job) for job in jobs]
+
+    errors = [plan for plan in plans if plan["error"]]
+    for plan in errors:
+        print(f"{plan['path']}: {plan['error']}", file=sys.stderr)
+    plans = [plan for plan in plans if plan["components"]]
+    targets: Dict[str, str] = {}
+    for plan in plans:
+        for target in plan["writes"]:
+            if target != plan["path"] and targets.setdefault(target, plan["path"]) != plan["path"]:
+                print(f"{target}: extracted from both {targets[target]} and {plan['path']}", file=sys.stderr)
+                sys.exit(1)
+    extracted = {name for plan in plans for name in plan["components"]}
+    if names:
+        for name in sorted(set(names) - extracted):
+            print(f"{name}: not found as an extractable component", file=sys.stderr)
+
+    for plan in plans:
+        print(f"{plan['path']}: {', '.join(plan['components'])}", file=sys.stderr)
+        for target, (before, after) in plan["writes"].items():
+            if args.dry_run:
+                sys.stdout.write(render_diff(target, before, after))
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, 'wb') as f:
+                    f.write(after)
+    sys.exit(1 if errors else 0)